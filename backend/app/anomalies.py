@@ -0,0 +1,296 @@
+import math
+import os
+import threading
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+
+from . import models, query_cache
+from .database import Base, SessionLocal, engine
+from .pagination import Page, paginate
+
+# Load environment variables
+load_dotenv()
+
+# |z| at which a value is flagged, and at which the flag is high severity
+ANOMALY_Z_THRESHOLD = float(os.getenv("ANOMALY_Z_THRESHOLD", "3.0"))
+ANOMALY_Z_HIGH = float(os.getenv("ANOMALY_Z_HIGH", "5.0"))
+# Observations a statistic needs before it is used to flag anything
+ANOMALY_MIN_SAMPLES = int(os.getenv("ANOMALY_MIN_SAMPLES", "10"))
+# Weight of each new observation once past the warm-up (~ the last 1/x observations count)
+ANOMALY_DECAY = float(os.getenv("ANOMALY_DECAY", "0.02"))
+# Standard deviation floor as a fraction of the mean, so constant prices don't make every change infinite
+ANOMALY_MIN_STD_FRACTION = float(os.getenv("ANOMALY_MIN_STD_FRACTION", "0.05"))
+# A manual stock adjustment removing at least this share of stock (and this many units) is a sudden drop
+ANOMALY_SUDDEN_DROP_FRACTION = float(os.getenv("ANOMALY_SUDDEN_DROP_FRACTION", "0.5"))
+ANOMALY_SUDDEN_DROP_MIN_UNITS = int(os.getenv("ANOMALY_SUDDEN_DROP_MIN_UNITS", "10"))
+# Flag items whose stock covers fewer days than this at the current burn rate
+ANOMALY_STOCKOUT_DAYS = float(os.getenv("ANOMALY_STOCKOUT_DAYS", "7"))
+# Days of order history replayed into the statistics at startup
+ANOMALY_BOOTSTRAP_DAYS = int(os.getenv("ANOMALY_BOOTSTRAP_DAYS", "90"))
+# Longest run of idle days fed into a burn rate as zero-demand days
+ANOMALY_MAX_IDLE_DAYS = int(os.getenv("ANOMALY_MAX_IDLE_DAYS", "30"))
+
+ANOMALY_TYPES = ("order_quantity", "unit_price", "burn_rate", "stockout_risk", "sudden_drop")
+ANOMALY_SORT_COLUMNS = {"id": models.Anomaly.id, "detected_at": models.Anomaly.detected_at}
+
+
+class RollingStats:
+    """
+    Mean and variance updated in O(1) per observation. The first observations
+    are weighted 1/n (Welford's exact running mean and variance); after that
+    the weight stays at ANOMALY_DECAY so the statistics follow recent behaviour.
+    """
+
+    __slots__ = ("count", "mean", "variance")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.variance = 0.0
+
+    def update(self, value: float):
+        self.count += 1
+        weight = max(1.0 / self.count, ANOMALY_DECAY)
+        delta = value - self.mean
+        self.mean += weight * delta
+        self.variance = (1 - weight) * (self.variance + weight * delta * delta)
+
+    def zscore(self, value: float) -> Optional[float]:
+        if self.count < ANOMALY_MIN_SAMPLES:
+            return None
+        std = max(math.sqrt(self.variance), ANOMALY_MIN_STD_FRACTION * abs(self.mean), 1e-9)
+        return (value - self.mean) / std
+
+
+class BurnRate:
+    """
+    Units consumed per day for one item: a running total for the current day
+    and rolling statistics over completed days
+    """
+
+    __slots__ = ("day", "today", "daily")
+
+    def __init__(self):
+        self.day: Optional[date] = None
+        self.today = 0.0
+        self.daily = RollingStats()
+
+    def _roll(self, day: date):
+        if self.day is None:
+            self.day = day
+        elif day > self.day:
+            self.daily.update(self.today)
+            # Days without any consumption count as zero demand
+            for _ in range(min((day - self.day).days - 1, ANOMALY_MAX_IDLE_DAYS)):
+                self.daily.update(0.0)
+            self.day = day
+            self.today = 0.0
+
+    def total_for(self, day: date) -> float:
+        return self.today if self.day == day else 0.0
+
+    def add(self, units: float, day: date):
+        self._roll(day)
+        if day == self.day:
+            self.today += units
+
+
+_lock = threading.Lock()
+_order_quantity: Dict[int, RollingStats] = defaultdict(RollingStats)
+_item_price: Dict[int, RollingStats] = defaultdict(RollingStats)
+_supplier_price: Dict[Tuple[int, int], RollingStats] = defaultdict(RollingStats)
+_adjustment_drop: Dict[int, RollingStats] = defaultdict(RollingStats)
+_burn: Dict[int, BurnRate] = defaultdict(BurnRate)
+# (anomaly type, inventory id) -> day last flagged, for the once-a-day flags
+_flagged_on: Dict[Tuple[str, int], date] = {}
+
+
+def _severity(score: float) -> str:
+    return "high" if abs(score) >= ANOMALY_Z_HIGH else "medium"
+
+
+class AnomalyEvents:
+    """
+    Order lines and stock changes written by one transaction. `detect` scores
+    them against the current statistics and adds any anomalies to the session
+    before commit; `record` folds them into the statistics once committed
+    and drops cached reads of the anomalies table when any were found.
+    """
+
+    def __init__(self):
+        self.order_lines: List[tuple] = []
+        self.consumption: List[tuple] = []
+        self.adjustments: List[tuple] = []
+        self.found: List[models.Anomaly] = []
+        self.when = datetime.utcnow()
+
+    def add_order_line(self, order_id: int, inventory_id: int, supplier_id: Optional[int], quantity: int, unit_price: float):
+        self.order_lines.append((order_id, inventory_id, supplier_id, quantity, unit_price))
+
+    def add_consumption(self, inventory_id: int, units: int, stock_after: int):
+        """Stock taken by orders"""
+        self.consumption.append((inventory_id, units, stock_after))
+
+    def add_adjustment(self, inventory_id: int, before: Optional[int], after: Optional[int]):
+        """Stock changed directly on the inventory item"""
+        if before is not None and after is not None and after != before:
+            self.adjustments.append((inventory_id, before, after))
+
+    def _anomaly(self, anomaly_type: str, severity: str, inventory_id: int, observed: float,
+                 expected: Optional[float], score: Optional[float], message: str,
+                 order_id: Optional[int] = None, supplier_id: Optional[int] = None) -> models.Anomaly:
+        return models.Anomaly(
+            detected_at=self.when, anomaly_type=anomaly_type, severity=severity, inventory_id=inventory_id,
+            supplier_id=supplier_id, order_id=order_id, observed=observed, expected=expected,
+            score=score, message=message
+        )
+
+    def _once_today(self, anomaly_type: str, inventory_id: int) -> bool:
+        return _flagged_on.get((anomaly_type, inventory_id)) != self.when.date()
+
+    def detect(self, db: Session) -> List[models.Anomaly]:
+        found = []
+        today = self.when.date()
+        with _lock:
+            for order_id, inventory_id, supplier_id, quantity, unit_price in self.order_lines:
+                stats = _order_quantity.get(inventory_id)
+                score = stats.zscore(quantity) if stats else None
+                if score is not None and score >= ANOMALY_Z_THRESHOLD:
+                    found.append(self._anomaly(
+                        "order_quantity", _severity(score), inventory_id, quantity, stats.mean, score,
+                        f"Order {order_id} asks for {quantity} units of item {inventory_id}; typical is {stats.mean:.1f}",
+                        order_id, supplier_id
+                    ))
+
+                # Compare with this supplier's usual price for the item, else the item's usual price
+                stats = _supplier_price.get((inventory_id, supplier_id))
+                if stats is None or stats.count < ANOMALY_MIN_SAMPLES:
+                    stats = _item_price.get(inventory_id)
+                score = stats.zscore(unit_price) if stats else None
+                if score is not None and abs(score) >= ANOMALY_Z_THRESHOLD:
+                    found.append(self._anomaly(
+                        "unit_price", _severity(score), inventory_id, unit_price, stats.mean, score,
+                        f"Order {order_id} prices item {inventory_id} at {unit_price:.2f}; typical is {stats.mean:.2f}",
+                        order_id, supplier_id
+                    ))
+
+            consumed = defaultdict(float)
+            stock_after = {}
+            for inventory_id, units, after in self.consumption:
+                consumed[inventory_id] += units
+                stock_after[inventory_id] = after
+            for inventory_id, units in consumed.items():
+                burn = _burn.get(inventory_id)
+                if burn is None:
+                    continue
+                total = burn.total_for(today) + units
+                score = burn.daily.zscore(total)
+                if score is not None and score >= ANOMALY_Z_THRESHOLD and self._once_today("burn_rate", inventory_id):
+                    found.append(self._anomaly(
+                        "burn_rate", _severity(score), inventory_id, total, burn.daily.mean, score,
+                        f"Item {inventory_id} has used {total:.0f} units today; typical is {burn.daily.mean:.1f} a day"
+                    ))
+                    _flagged_on[("burn_rate", inventory_id)] = today
+                if burn.daily.count >= ANOMALY_MIN_SAMPLES and burn.daily.mean > 0:
+                    cover = stock_after[inventory_id] / burn.daily.mean
+                    if cover < ANOMALY_STOCKOUT_DAYS and self._once_today("stockout_risk", inventory_id):
+                        found.append(self._anomaly(
+                            "stockout_risk", "high" if cover < ANOMALY_STOCKOUT_DAYS / 2 else "medium",
+                            inventory_id, stock_after[inventory_id], burn.daily.mean * ANOMALY_STOCKOUT_DAYS, None,
+                            f"Item {inventory_id} has {stock_after[inventory_id]} units left, about {cover:.1f} days at the current burn rate"
+                        ))
+                        _flagged_on[("stockout_risk", inventory_id)] = today
+
+            for inventory_id, before, after in self.adjustments:
+                drop = before - after
+                if drop <= 0:
+                    continue
+                stats = _adjustment_drop.get(inventory_id)
+                score = stats.zscore(drop) if stats else None
+                large_share = before > 0 and drop / before >= ANOMALY_SUDDEN_DROP_FRACTION and drop >= ANOMALY_SUDDEN_DROP_MIN_UNITS
+                if large_share or (score is not None and score >= ANOMALY_Z_THRESHOLD):
+                    found.append(self._anomaly(
+                        "sudden_drop", "high" if (score or 0) >= ANOMALY_Z_HIGH or after == 0 else "medium",
+                        inventory_id, after, before, score,
+                        f"Stock of item {inventory_id} dropped from {before} to {after} in one update"
+                    ))
+
+        if found:
+            db.add_all(found)
+        self.found = found
+        return found
+
+    def record(self):
+        """Update the statistics; call after the transaction has committed"""
+        today = self.when.date()
+        with _lock:
+            for _, inventory_id, supplier_id, quantity, unit_price in self.order_lines:
+                _order_quantity[inventory_id].update(quantity)
+                _item_price[inventory_id].update(unit_price)
+                _supplier_price[(inventory_id, supplier_id)].update(unit_price)
+            for inventory_id, units, _ in self.consumption:
+                _burn[inventory_id].add(units, today)
+            for inventory_id, before, after in self.adjustments:
+                if after < before:
+                    _adjustment_drop[inventory_id].update(before - after)
+        if self.found:
+            query_cache.invalidate_tables(models.Anomaly.__tablename__)
+
+
+def warm_up() -> None:
+    """
+    Create the anomalies table if missing and replay the last
+    ANOMALY_BOOTSTRAP_DAYS of order lines into the statistics, the only time
+    order history is read
+    """
+    db = SessionLocal()
+    try:
+        Base.metadata.create_all(bind=engine, tables=[models.Anomaly.__table__])
+        since = datetime.utcnow() - timedelta(days=ANOMALY_BOOTSTRAP_DAYS)
+        rows = (
+            db.query(
+                models.Order.order_date, models.Order.supplier_id, models.OrderItem.inventory_id,
+                models.OrderItem.quantity, models.OrderItem.unit_price
+            )
+            .join(models.Order, models.Order.id == models.OrderItem.order_id)
+            .filter(models.Order.order_date >= since)
+            .filter(func.coalesce(models.Order.status, "") != "cancelled")
+            .order_by(models.Order.order_date)
+            .yield_per(5000)
+        )
+        replayed = 0
+        with _lock:
+            for order_date, supplier_id, inventory_id, quantity, unit_price in rows:
+                if inventory_id is None or quantity is None or unit_price is None:
+                    continue
+                _order_quantity[inventory_id].update(quantity)
+                _item_price[inventory_id].update(unit_price)
+                _supplier_price[(inventory_id, supplier_id)].update(unit_price)
+                _burn[inventory_id].add(quantity, order_date.date())
+                replayed += 1
+        print(f"Anomaly statistics primed from {replayed} order lines")
+    except Exception as e:
+        print(f"Could not prime anomaly statistics: {str(e)}")
+    finally:
+        db.close()
+
+
+def get_anomalies(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+                  sort_by: str = "id", descending: bool = True, anomaly_type: Optional[str] = None,
+                  severity: Optional[str] = None, inventory_id: Optional[int] = None,
+                  since: Optional[datetime] = None) -> Page:
+    query = db.query(models.Anomaly)
+    if anomaly_type is not None:
+        query = query.filter(models.Anomaly.anomaly_type == anomaly_type)
+    if severity is not None:
+        query = query.filter(models.Anomaly.severity == severity)
+    if inventory_id is not None:
+        query = query.filter(models.Anomaly.inventory_id == inventory_id)
+    if since is not None:
+        query = query.filter(models.Anomaly.detected_at >= since)
+    return paginate(query, models.Anomaly, ANOMALY_SORT_COLUMNS, sort_by, descending, cursor, limit, skip)
@@ -0,0 +1,153 @@
+from typing import List, Optional, Union
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.routing import APIRoute
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import crud, crud_async, models, schemas
+from .auth import get_current_active_user
+from .database import get_async_db
+from .pagination import paged_response
+
+# Async versions of the CRUD endpoints in main.py, served instead of them when
+# ASYNC_DATABASE_ENABLED is set. Handlers await the database on the event loop
+# rather than each holding a threadpool thread for the length of the request.
+router = APIRouter()
+
+# User management endpoints
+@router.post("/users/", response_model=schemas.User, status_code=status.HTTP_201_CREATED)
+async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    db_user = await crud_async.get_user_by_email(db, email=user.email)
+    if db_user:
+        raise HTTPException(
+            status_code=400,
+            detail="Email already registered"
+        )
+    return await crud_async.create_user(db, user=user)
+
+@router.put("/users/{user_id}", response_model=schemas.User)
+async def update_user(user_id: int, user: schemas.UserUpdate, db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_active_user)):
+    # There are no admin roles; users may only change their own account
+    if current_user.id != user_id:
+        raise HTTPException(status_code=403, detail="Not allowed to update another user")
+    db_user = await crud_async.get_user(db, user_id=user_id)
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    if user.email is not None and user.email != db_user.email and await crud_async.get_user_by_email(db, email=user.email):
+        raise HTTPException(status_code=400, detail="Email already registered")
+    return await crud_async.update_user(db, user_id=user_id, user=user, actor_id=current_user.id)
+
+@router.get("/users/", response_model=List[schemas.User])
+async def read_users(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, sort_by: str = "id", order: str = Query("asc", pattern="^(asc|desc)$"), db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_active_user)):
+    page = await crud_async.get_users(db, skip=skip, limit=limit, cursor=cursor, sort_by=sort_by, descending=order == "desc")
+    return paged_response(response, page)
+
+# Inventory endpoints
+@router.get("/inventory/", response_model=List[schemas.Inventory])
+async def read_inventory(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, sort_by: str = "id", order: str = Query("asc", pattern="^(asc|desc)$"), category: Optional[str] = None, location: Optional[str] = None, db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_active_user)):
+    page = await crud_async.get_inventory(db, skip=skip, limit=limit, cursor=cursor, sort_by=sort_by, descending=order == "desc", category=category, location=location)
+    return paged_response(response, page)
+
+@router.get("/inventory/{inventory_id}", response_model=schemas.Inventory)
+async def read_inventory_item(inventory_id: int, db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_active_user)):
+    db_inventory = await crud_async.get_inventory_item(db, inventory_id=inventory_id)
+    if db_inventory is None:
+        raise HTTPException(status_code=404, detail="Inventory item not found")
+    return db_inventory
+
+@router.post("/inventory/", response_model=schemas.Inventory, status_code=status.HTTP_201_CREATED)
+async def create_inventory_item(inventory: schemas.InventoryCreate, db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_active_user)):
+    return await crud_async.create_inventory_item(db, inventory=inventory, user_id=current_user.id)
+
+@router.put("/inventory/{inventory_id}", response_model=schemas.Inventory)
+async def update_inventory_item(inventory_id: int, inventory: schemas.InventoryUpdate, db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_active_user)):
+    db_inventory = await crud_async.get_inventory_item(db, inventory_id=inventory_id)
+    if db_inventory is None:
+        raise HTTPException(status_code=404, detail="Inventory item not found")
+    return await crud_async.update_inventory_item(db, inventory_id=inventory_id, inventory=inventory, user_id=current_user.id)
+
+# Supplier endpoints
+@router.get("/suppliers/", response_model=List[schemas.Supplier])
+async def read_suppliers(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, sort_by: str = "id", order: str = Query("asc", pattern="^(asc|desc)$"), db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_active_user)):
+    page = await crud_async.get_suppliers(db, skip=skip, limit=limit, cursor=cursor, sort_by=sort_by, descending=order == "desc")
+    return paged_response(response, page)
+
+@router.get("/suppliers/{supplier_id}", response_model=schemas.Supplier)
+async def read_supplier(supplier_id: int, db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_active_user)):
+    db_supplier = await crud_async.get_supplier(db, supplier_id=supplier_id)
+    if db_supplier is None:
+        raise HTTPException(status_code=404, detail="Supplier not found")
+    return db_supplier
+
+@router.post("/suppliers/", response_model=schemas.Supplier, status_code=status.HTTP_201_CREATED)
+async def create_supplier(supplier: schemas.SupplierCreate, db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_active_user)):
+    return await crud_async.create_supplier(db, supplier=supplier, user_id=current_user.id)
+
+@router.put("/suppliers/{supplier_id}", response_model=schemas.Supplier)
+async def update_supplier(supplier_id: int, supplier: schemas.SupplierUpdate, db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_active_user)):
+    db_supplier = await crud_async.get_supplier(db, supplier_id=supplier_id)
+    if db_supplier is None:
+        raise HTTPException(status_code=404, detail="Supplier not found")
+    return await crud_async.update_supplier(db, supplier_id=supplier_id, supplier=supplier, user_id=current_user.id)
+
+# Order endpoints
+@router.get("/orders/", response_model=Union[List[schemas.Order], List[schemas.OrderSummary]])
+async def read_orders(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, sort_by: str = "id", order: str = Query("asc", pattern="^(asc|desc)$"), status: Optional[str] = None, supplier_id: Optional[int] = None, include_items: bool = True, db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_active_user)):
+    page = await crud_async.get_orders(db, skip=skip, limit=limit, cursor=cursor, sort_by=sort_by, descending=order == "desc", status=status, supplier_id=supplier_id, include_items=include_items)
+    if not include_items:
+        page.items = [schemas.OrderSummary.model_validate(db_order, from_attributes=True) for db_order in page.items]
+    return paged_response(response, page)
+
+@router.get("/orders/{order_id}", response_model=Union[schemas.Order, schemas.OrderSummary])
+async def read_order(order_id: int, include_items: bool = True, db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_active_user)):
+    db_order = await crud_async.get_order(db, order_id=order_id, include_items=include_items)
+    if db_order is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+    if not include_items:
+        return schemas.OrderSummary.model_validate(db_order, from_attributes=True)
+    return db_order
+
+@router.post("/orders/", response_model=schemas.Order, status_code=status.HTTP_201_CREATED)
+async def create_order(order: schemas.OrderCreate, db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_active_user)):
+    try:
+        return await crud_async.create_order(db, order=order, user_id=current_user.id)
+    except crud.InsufficientStockError as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "shortages": e.shortages})
+
+@router.post("/orders/bulk", response_model=schemas.OrderBulkResult, status_code=status.HTTP_201_CREATED)
+async def create_orders_bulk(payload: schemas.OrderBulkCreate, db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_active_user)):
+    if not payload.orders:
+        raise HTTPException(status_code=400, detail="orders must not be empty")
+    if len(payload.orders) > crud.ORDERS_BULK_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {crud.ORDERS_BULK_MAX} orders per request")
+    try:
+        order_ids, rejected = await crud_async.create_orders_bulk(db, orders=payload.orders, user_id=current_user.id)
+    except crud.InsufficientStockError as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "shortages": e.shortages})
+    created = [
+        schemas.OrderSummary.model_validate(db_order, from_attributes=True)
+        for db_order in await crud_async.get_orders_by_ids(db, order_ids)
+    ]
+    return {"created": created, "rejected": rejected}
+
+@router.put("/orders/{order_id}", response_model=schemas.Order)
+async def update_order(order_id: int, order: schemas.OrderUpdate, db: AsyncSession = Depends(get_async_db), current_user: models.User = Depends(get_current_active_user)):
+    db_order = await crud_async.get_order(db, order_id=order_id)
+    if db_order is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return await crud_async.update_order(db, order_id=order_id, order=order, user_id=current_user.id)
+
+
+def install(app):
+    """
+    Replace the sync routes in `app` that have an async version here
+    """
+    replaced = {
+        (route.path, method) for route in router.routes if isinstance(route, APIRoute) for method in route.methods
+    }
+    app.router.routes = [
+        route for route in app.router.routes
+        if not (isinstance(route, APIRoute) and any((route.path, method) in replaced for method in route.methods))
+    ]
+    app.include_router(router)
+    print(f"Async database routes enabled for {len(router.routes)} endpoints")
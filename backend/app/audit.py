@@ -0,0 +1,202 @@
+import asyncio
+import os
+import threading
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import event, exc, insert
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+
+from . import models, query_cache
+from .database import SessionLocal
+
+# Load environment variables
+load_dotenv()
+
+# Buffered entries are written once this many are queued or the interval passes
+AUDIT_FLUSH_SIZE = int(os.getenv("AUDIT_FLUSH_SIZE", "500"))
+AUDIT_FLUSH_INTERVAL_SECONDS = float(os.getenv("AUDIT_FLUSH_INTERVAL_SECONDS", "1.0"))
+# Past this many queued entries (e.g. while the database is down) callers flush inline
+AUDIT_MAX_BUFFERED = int(os.getenv("AUDIT_MAX_BUFFERED", "50000"))
+# Consecutive failed flushes (database unreachable) after which the queued entries are dropped
+AUDIT_MAX_FLUSH_ATTEMPTS = int(os.getenv("AUDIT_MAX_FLUSH_ATTEMPTS", "60"))
+
+_buffer: List[dict] = []
+_buffer_lock = threading.Lock()
+# Serialises flushes so entries are written in the order they were queued
+_flush_lock = threading.Lock()
+_failed_flushes = 0
+_writer_task: Optional[asyncio.Task] = None
+_writer_loop: Optional[asyncio.AbstractEventLoop] = None
+_wakeup: Optional[asyncio.Event] = None
+
+
+def record(action: str, entity_type: str, entity_id: Optional[int] = None, details: Optional[str] = None,
+           user_id: Optional[int] = None, must_persist: bool = False, db: Optional[Session] = None):
+    """
+    Add an entry to the audit trail (activity_logs).
+
+    By default the entry is queued in memory and written with other entries in
+    one multi-row INSERT by the background writer, so a request only pays for
+    an append. Entries are timestamped here, not when written.
+
+    With must_persist the entry is written before this returns: inside the
+    caller's transaction when `db` is given (it commits or rolls back with the
+    change it describes, and cached activity_logs reads are dropped once the
+    caller commits), otherwise in its own transaction.
+    """
+    row = {
+        "user_id": user_id,
+        "action": action,
+        "entity_type": entity_type,
+        "entity_id": entity_id,
+        "details": details,
+        "timestamp": datetime.utcnow(),
+    }
+    if must_persist:
+        if db is not None:
+            db.add(models.ActivityLog(**row))
+            event.listen(db, "after_commit", _invalidate_after_commit, once=True)
+            return
+        _write([row])
+        query_cache.invalidate_tables("activity_logs")
+        return
+
+    with _buffer_lock:
+        _buffer.append(row)
+        queued = len(_buffer)
+    if _writer_task is None or queued >= AUDIT_MAX_BUFFERED:
+        # No background writer in this process (scripts, tests) or it is falling behind
+        _flush_now()
+    elif queued == AUDIT_FLUSH_SIZE:
+        _writer_loop.call_soon_threadsafe(_wakeup.set)
+
+
+def _flush_now():
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    if loop is None:
+        flush()
+    else:
+        # Called on the event loop thread (async CRUD through AsyncSession.run_sync);
+        # flush() does blocking database I/O, so it runs in a worker thread
+        loop.run_in_executor(None, flush)
+
+
+def _invalidate_after_commit(session: Session):
+    query_cache.invalidate_tables("activity_logs")
+
+
+def _write(rows: List[dict]):
+    db = SessionLocal()
+    try:
+        # Executed as multi-row INSERT ... VALUES batches by SQLAlchemy
+        db.execute(insert(models.ActivityLog.__table__), rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _is_transient(error: Exception) -> bool:
+    """
+    Connection-level failures, after which every entry would fail alike
+    """
+    return isinstance(error, (exc.OperationalError, exc.InterfaceError)) or (
+        isinstance(error, exc.DBAPIError) and error.connection_invalidated
+    )
+
+
+def _write_isolating(rows: List[dict]) -> Tuple[int, List[dict]]:
+    """
+    Write the rows, bisecting a batch the database rejects so one bad entry
+    cannot hold back the others; an entry rejected on its own is dropped.
+    Returns the number written and the rows to retry after a transient failure.
+    """
+    try:
+        _write(rows)
+        return len(rows), []
+    except Exception as e:
+        if _is_transient(e):
+            print(f"Could not write {len(rows)} audit entries: {str(e)}")
+            return 0, rows
+        if len(rows) == 1:
+            print(f"Dropping audit entry the database rejected: {rows[0]!r}: {str(e)}")
+            return 0, []
+    middle = len(rows) // 2
+    written_first, retry_first = _write_isolating(rows[:middle])
+    written_second, retry_second = _write_isolating(rows[middle:])
+    return written_first + written_second, retry_first + retry_second
+
+
+def flush() -> int:
+    """
+    Write every queued entry now. Entries the database rejects are dropped;
+    after a connection failure the rest go back to the front of the queue,
+    until AUDIT_MAX_FLUSH_ATTEMPTS flushes in a row have failed. Returns the
+    number written.
+    """
+    global _failed_flushes
+    with _flush_lock:
+        with _buffer_lock:
+            rows = list(_buffer)
+            _buffer.clear()
+        if not rows:
+            return 0
+        written, retry = _write_isolating(rows)
+        if retry:
+            _failed_flushes += 1
+            if _failed_flushes >= AUDIT_MAX_FLUSH_ATTEMPTS:
+                print(f"Dropping {len(retry)} audit entries after {_failed_flushes} failed flushes")
+                _failed_flushes = 0
+            else:
+                with _buffer_lock:
+                    _buffer[:0] = retry
+        else:
+            _failed_flushes = 0
+    if written:
+        query_cache.invalidate_tables("activity_logs")
+    return written
+
+
+def pending() -> int:
+    with _buffer_lock:
+        return len(_buffer)
+
+
+async def _write_periodically():
+    while True:
+        try:
+            await asyncio.wait_for(_wakeup.wait(), AUDIT_FLUSH_INTERVAL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+        if pending():
+            await run_in_threadpool(flush)
+
+
+def start_writer():
+    global _writer_task, _writer_loop, _wakeup
+    if _writer_task is None:
+        _writer_loop = asyncio.get_running_loop()
+        _wakeup = asyncio.Event()
+        _writer_task = _writer_loop.create_task(_write_periodically())
+
+
+async def stop_writer():
+    """
+    Stop the background writer and write whatever is still queued
+    """
+    global _writer_task
+    if _writer_task is not None:
+        _writer_task.cancel()
+        _writer_task = None
+    written = await run_in_threadpool(flush)
+    if written:
+        print(f"Wrote {written} queued audit entries on shutdown")
@@ -0,0 +1,268 @@
+import asyncio
+import os
+import re
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import column, delete, func, insert, select, table, text, union_all
+from sqlalchemy.orm import Session, aliased
+from dotenv import load_dotenv
+
+from . import models, query_cache
+from .database import SessionLocal, engine
+
+# Load environment variables
+load_dotenv()
+
+# Months of activity logs kept; older partitions are dropped (0 keeps everything).
+# The order status changes in them are the only record of when orders completed,
+# so supplier delivery scores and the order_cycle_time report lose older orders.
+ACTIVITY_LOG_RETENTION_MONTHS = int(os.getenv("ACTIVITY_LOG_RETENTION_MONTHS", "0"))
+# PostgreSQL: monthly partitions created ahead of time so inserts never hit the default partition
+ACTIVITY_LOG_PREMAKE_MONTHS = int(os.getenv("ACTIVITY_LOG_PREMAKE_MONTHS", "2"))
+# SQLite: months kept in activity_logs itself before rows move to per-month archive tables
+ACTIVITY_LOG_HOT_MONTHS = int(os.getenv("ACTIVITY_LOG_HOT_MONTHS", "12"))
+# Seconds between partition maintenance runs
+ACTIVITY_LOG_MAINTENANCE_SECONDS = int(os.getenv("ACTIVITY_LOG_MAINTENANCE_SECONDS", "86400"))
+
+PARENT_TABLE = models.ActivityLog.__table__
+# activity_logs_YYYYMM: a PostgreSQL partition or a SQLite archive table
+_PARTITION_PATTERN = re.compile(r"^activity_logs_(\d{4})(\d{2})$")
+
+_maintenance_lock = threading.Lock()
+_maintenance_task: Optional[asyncio.Task] = None
+
+
+def _month_start(moment: datetime) -> datetime:
+    return datetime(moment.year, moment.month, 1)
+
+
+def _add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f"activity_logs_{month:%Y%m}"
+
+
+def _partition_month(name: str) -> Optional[datetime]:
+    match = _PARTITION_PATTERN.match(name)
+    return datetime(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+def _dialect(db: Session) -> str:
+    return db.get_bind().dialect.name
+
+
+def _archive_table(name: str):
+    # Same columns and types as activity_logs, so rows load as ActivityLog
+    return table(name, *(column(col.name, col.type) for col in PARENT_TABLE.columns))
+
+
+def _list_partitions(db: Session) -> Dict[datetime, str]:
+    """
+    Monthly partitions (PostgreSQL) or archive tables (SQLite) by month
+    """
+    if _dialect(db) == "postgresql":
+        names = db.execute(text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass('activity_logs')"
+        )).scalars()
+    else:
+        names = db.execute(text(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'activity_logs_%'"
+        )).scalars()
+    partitions = {}
+    for name in names:
+        month = _partition_month(name)
+        if month is not None:
+            partitions[month] = name
+    return partitions
+
+
+def _is_partitioned(db: Session) -> bool:
+    return db.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass('activity_logs')")).scalar() == "p"
+
+
+def _retention_cutoff() -> Optional[datetime]:
+    """
+    Start of the oldest month kept. Entries before it are deleted for good,
+    including the status_change history supplier metrics and cycle-time
+    reports are computed from.
+    """
+    if ACTIVITY_LOG_RETENTION_MONTHS <= 0:
+        return None
+    return _add_months(_month_start(datetime.utcnow()), -(ACTIVITY_LOG_RETENTION_MONTHS - 1))
+
+
+def _maintain_postgresql(db: Session) -> Dict[str, List[str]]:
+    created, dropped = [], []
+    if not _is_partitioned(db):
+        print("activity_logs is not partitioned; recreate it from postgresql_setup.sql to enable partition maintenance")
+        return {"created": created, "dropped": dropped}
+
+    existing = _list_partitions(db)
+    current = _month_start(datetime.utcnow())
+    for offset in range(ACTIVITY_LOG_PREMAKE_MONTHS + 1):
+        month = _add_months(current, offset)
+        if month in existing:
+            continue
+        name = partition_name(month)
+        try:
+            db.execute(text(
+                f"CREATE TABLE {name} PARTITION OF activity_logs "
+                f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{_add_months(month, 1):%Y-%m-%d}')"
+            ))
+            db.commit()
+            created.append(name)
+        except Exception as e:
+            # Typically rows for that month already sit in the default partition
+            db.rollback()
+            print(f"Could not create activity log partition {name}: {str(e)}")
+
+    cutoff = _retention_cutoff()
+    if cutoff is not None:
+        for month, name in sorted(existing.items()):
+            if month < cutoff:
+                db.execute(text(f"DROP TABLE {name}"))
+                db.commit()
+                dropped.append(name)
+    return {"created": created, "dropped": dropped}
+
+
+def _maintain_sqlite(db: Session) -> Dict[str, List[str]]:
+    """
+    Move rows older than the hot window out of activity_logs into one archive
+    table per month, then drop archives past retention
+    """
+    created, dropped = [], []
+    cutoff = _retention_cutoff()
+    hot_start = _add_months(_month_start(datetime.utcnow()), -(max(ACTIVITY_LOG_HOT_MONTHS, 1) - 1))
+    existing = _list_partitions(db)
+    if cutoff is not None:
+        db.execute(delete(PARENT_TABLE).where(PARENT_TABLE.c.timestamp < cutoff))
+        db.commit()
+
+    months = db.execute(
+        select(func.strftime("%Y%m", PARENT_TABLE.c.timestamp)).distinct()
+        .where(PARENT_TABLE.c.timestamp < hot_start)
+    ).scalars().all()
+    for label in sorted(months):
+        month = datetime(int(label[:4]), int(label[4:]), 1)
+        in_month = (PARENT_TABLE.c.timestamp >= month) & (PARENT_TABLE.c.timestamp < _add_months(month, 1))
+        name = partition_name(month)
+        if month not in existing:
+            db.execute(text(f"CREATE TABLE {name} AS SELECT * FROM activity_logs WHERE 0"))
+            db.execute(text(f"CREATE INDEX ix_{name}_entity_history ON {name} (entity_type, entity_id, timestamp)"))
+            db.execute(text(f"CREATE INDEX ix_{name}_user_time ON {name} (user_id, timestamp)"))
+            db.execute(text(f"CREATE INDEX ix_{name}_timestamp ON {name} (timestamp)"))
+            existing[month] = name
+            created.append(name)
+        archive = _archive_table(name)
+        db.execute(insert(archive).from_select([col.name for col in PARENT_TABLE.columns], select(PARENT_TABLE).where(in_month)))
+        db.execute(delete(PARENT_TABLE).where(in_month))
+        db.commit()
+
+    if cutoff is not None:
+        for month, name in sorted(existing.items()):
+            if month < cutoff:
+                db.execute(text(f"DROP TABLE {name}"))
+                db.commit()
+                dropped.append(name)
+    return {"created": created, "dropped": dropped}
+
+
+def maintain(db: Session) -> Dict[str, List[str]]:
+    """
+    Create upcoming partitions (PostgreSQL) or roll old rows into archive
+    tables (SQLite), and drop whole partitions older than the retention window
+    """
+    with _maintenance_lock:
+        try:
+            if _dialect(db) == "postgresql":
+                result = _maintain_postgresql(db)
+            elif _dialect(db) == "sqlite":
+                result = _maintain_sqlite(db)
+            else:
+                result = {"created": [], "dropped": []}
+        except Exception:
+            db.rollback()
+            raise
+    if result["created"] or result["dropped"]:
+        query_cache.invalidate_tables("activity_logs")
+        print(f"Activity log partitions created: {result['created'] or 'none'}, dropped: {result['dropped'] or 'none'}")
+    return result
+
+
+def maintain_safely():
+    db = SessionLocal()
+    try:
+        maintain(db)
+    except Exception as e:
+        print(f"Could not maintain activity log partitions: {str(e)}")
+    finally:
+        db.close()
+
+
+def warm_up() -> None:
+    """
+    Add the audit query indexes to an existing activity_logs table and run
+    partition maintenance once
+    """
+    if ACTIVITY_LOG_RETENTION_MONTHS > 0:
+        print(f"Activity logs older than {ACTIVITY_LOG_RETENTION_MONTHS} months are deleted; "
+              "supplier delivery scores and cycle-time reports will not include orders completed before then")
+    try:
+        for index in PARENT_TABLE.indexes:
+            index.create(bind=engine, checkfirst=True)
+    except Exception as e:
+        print(f"Could not create activity log indexes: {str(e)}")
+    maintain_safely()
+
+
+async def _maintain_periodically():
+    while True:
+        await asyncio.sleep(ACTIVITY_LOG_MAINTENANCE_SECONDS)
+        await run_in_threadpool(maintain_safely)
+
+
+def start_maintainer():
+    global _maintenance_task
+    if _maintenance_task is None and ACTIVITY_LOG_MAINTENANCE_SECONDS > 0:
+        _maintenance_task = asyncio.get_running_loop().create_task(_maintain_periodically())
+
+
+def stop_maintainer():
+    global _maintenance_task
+    if _maintenance_task is not None:
+        _maintenance_task.cancel()
+        _maintenance_task = None
+
+
+def log_entity(db: Session, conditions: Callable[[object], list],
+               since: Optional[datetime] = None, until: Optional[datetime] = None):
+    """
+    ActivityLog entity to query for entries in [since, until). `conditions`
+    returns the filters for a table's columns; they are applied inside each
+    partition so its indexes are used. On PostgreSQL the planner prunes
+    partitions from the time bounds; on SQLite only archive tables
+    overlapping the range are read.
+    """
+    def bounded(source):
+        where = conditions(source)
+        if since is not None:
+            where.append(source.c.timestamp >= since)
+        if until is not None:
+            where.append(source.c.timestamp < until)
+        return select(source).where(*where)
+
+    selects = [bounded(PARENT_TABLE)]
+    if _dialect(db) == "sqlite":
+        for month, name in sorted(_list_partitions(db).items()):
+            if (since is None or _add_months(month, 1) > since) and (until is None or month < until):
+                selects.append(bounded(_archive_table(name)))
+    source = selects[0] if len(selects) == 1 else union_all(*selects)
+    return aliased(models.ActivityLog, source.subquery("activity_logs_range"))
@@ -1,14 +1,24 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from sqlalchemy.orm import Session
+from dotenv import load_dotenv
 
 from . import models, schemas
 from .database import get_db
+from .query_cache import TTLCache
+
+# Load environment variables
+load_dotenv()
 
 # to get a string like this run:
 # openssl rand -hex 32
@@ -16,7 +26,28 @@ SECRET_KEY = "09d25e094faa6ca2556c818166b7a9563b93f7099f6f0f4caa6cf63b88e8d3e7"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Verified tokens are remembered until they expire (capped by the TTL below)
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "4096"))
+AUTH_TOKEN_CACHE_MAX_TTL_SECONDS = int(os.getenv("AUTH_TOKEN_CACHE_MAX_TTL_SECONDS", str(ACCESS_TOKEN_EXPIRE_MINUTES * 60)))
+# Active users are remembered briefly so most requests skip the users lookup
+AUTH_PRINCIPAL_CACHE_SIZE = int(os.getenv("AUTH_PRINCIPAL_CACHE_SIZE", "1024"))
+AUTH_PRINCIPAL_CACHE_TTL_SECONDS = int(os.getenv("AUTH_PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+
+# token -> subject (email)
+token_cache = TTLCache(AUTH_TOKEN_CACHE_SIZE, AUTH_TOKEN_CACHE_MAX_TTL_SECONDS)
+# email -> detached snapshot of the active user
+principal_cache = TTLCache(AUTH_PRINCIPAL_CACHE_SIZE, AUTH_PRINCIPAL_CACHE_TTL_SECONDS)
+
+# bcrypt work factor for new hashes (each +1 doubles hashing time); existing hashes keep their own
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Threads available for bcrypt; the C implementation releases the GIL so these run in parallel
+AUTH_HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", str(os.cpu_count() or 4)))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+# Dedicated, bounded pool so a login burst queues here instead of stalling the
+# event loop or starving the request threadpool
+_hash_executor = ThreadPoolExecutor(max_workers=AUTH_HASH_WORKERS, thread_name_prefix="bcrypt")
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
@@ -26,14 +57,41 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+def _get_user_by_email(db: Session, email: str):
+    return db.query(models.User).filter(models.User.email == email).first()
+
 def authenticate_user(db: Session, username: str, password: str):
-    user = db.query(models.User).filter(models.User.email == username).first()
+    user = _get_user_by_email(db, username)
     if not user:
         return False
     if not verify_password(password, user.hashed_password):
         return False
     return user
 
+async def verify_password_async(plain_password, hashed_password):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_executor, verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_executor, get_password_hash, password)
+
+async def authenticate_user_async(db: Session, username: str, password: str):
+    """
+    authenticate_user for async routes: the user lookup runs in the request
+    threadpool and the bcrypt check in the bounded hashing pool, so neither
+    blocks the event loop
+    """
+    user = await run_in_threadpool(_get_user_by_email, db, username)
+    if not user:
+        return False
+    if not await verify_password_async(password, user.hashed_password):
+        return False
+    return user
+
+def shutdown_hash_pool():
+    _hash_executor.shutdown(wait=False)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -44,23 +102,65 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def _verify_token(token: str) -> Optional[str]:
+    """
+    Return the subject of a valid token, or None. Successful verifications are
+    cached until the token's own expiry so the signature is checked once.
+    """
+    email = token_cache.get(token)
+    if email is not None:
+        return email
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    email = payload.get("sub")
+    if email is None:
+        return None
+    expires_at = payload.get("exp")
+    ttl_seconds = expires_at - time.time() if expires_at is not None else None
+    if ttl_seconds is None or ttl_seconds > 0:
+        token_cache.set(token, email, ttl_seconds)
+    return email
+
+def _principal_snapshot(user: models.User) -> models.User:
+    """
+    Session-independent copy of a user that is safe to share between requests
+    """
+    return models.User(id=user.id, email=user.email, full_name=user.full_name, is_active=user.is_active)
+
+def invalidate_principal(*emails: str):
+    """
+    Forget cached users; call after a user is updated or deactivated
+    """
+    for email in emails:
+        if email:
+            principal_cache.delete(email)
+
+def get_auth_cache_stats():
+    return {"tokens": token_cache.stats(), "principals": principal_cache.stats()}
+
 async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-        token_data = schemas.TokenData(email=email)
-    except JWTError:
+    email = _verify_token(token)
+    if email is None:
         raise credentials_exception
-    user = db.query(models.User).filter(models.User.email == token_data.email).first()
+    token_data = schemas.TokenData(email=email)
+
+    cached_user = principal_cache.get(token_data.email)
+    if cached_user is not None:
+        return cached_user
+    # Sync session: keep the lookup off the event loop
+    user = await run_in_threadpool(_get_user_by_email, db, token_data.email)
     if user is None:
         raise credentials_exception
+    if user.is_active:
+        # Inactive users are not cached so reactivation takes effect immediately
+        principal_cache.set(user.email, _principal_snapshot(user))
     return user
 
 async def get_current_active_user(current_user: models.User = Depends(get_current_user)):
@@ -1,7 +1,15 @@
-from sqlalchemy.orm import Session
-from . import models, schemas
-from .auth import get_password_hash
-from typing import List, Optional
+from sqlalchemy import case, insert, update
+from sqlalchemy.orm import Session, noload, selectinload
+from . import models, schemas, query_cache, dashboard, forecast, anomalies, audit, audit_partitions, inventory_history
+from .pagination import Page, paginate
+from .auth import get_password_hash, invalidate_principal
+import os
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+def _describe_changes(update_data: Dict[str, Any]) -> str:
+    return ", ".join(f"{key}={value}" for key, value in sorted(update_data.items()))
 
 # User CRUD operations
 def get_user(db: Session, user_id: int):
@@ -10,11 +18,15 @@ def get_user(db: Session, user_id: int):
 def get_user_by_email(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
 
-def get_users(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.User).offset(skip).limit(limit).all()
+USER_SORT_COLUMNS = {"id": models.User.id, "email": models.User.email}
+
+def get_users(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+              sort_by: str = "id", descending: bool = False) -> Page:
+    query = db.query(models.User)
+    return paginate(query, models.User, USER_SORT_COLUMNS, sort_by, descending, cursor, limit, skip)
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = get_password_hash(user.password)
+def create_user(db: Session, user: schemas.UserCreate, hashed_password: Optional[str] = None):
+    hashed_password = hashed_password or get_password_hash(user.password)
     db_user = models.User(
         email=user.email,
         hashed_password=hashed_password,
@@ -22,18 +34,60 @@ def create_user(db: Session, user: schemas.UserCreate):
         is_active=True
     )
     db.add(db_user)
+    db.flush()
+    # Account changes are compliance-critical: written in the same transaction
+    audit.record("create", "user", db_user.id, f"email={db_user.email}", user_id=db_user.id, must_persist=True, db=db)
+    db.commit()
+    query_cache.invalidate_tables("users")
+    db.refresh(db_user)
+    return db_user
+
+def update_user(db: Session, user_id: int, user: schemas.UserUpdate, hashed_password: Optional[str] = None,
+                actor_id: Optional[int] = None):
+    db_user = get_user(db, user_id)
+    previous_email = db_user.email
+
+    update_data = user.dict(exclude_unset=True)
+    password = update_data.pop("password", None)
+    if hashed_password is None and password is not None:
+        hashed_password = get_password_hash(password)
+    if hashed_password is not None:
+        db_user.hashed_password = hashed_password
+    for key, value in update_data.items():
+        setattr(db_user, key, value)
+
+    changes = _describe_changes(update_data)
+    if hashed_password is not None:
+        changes = ", ".join(part for part in (changes, "password changed") if part)
+    audit.record("update", "user", db_user.id, changes, user_id=actor_id, must_persist=True, db=db)
     db.commit()
+    query_cache.invalidate_tables("users")
+    invalidate_principal(previous_email, db_user.email)
     db.refresh(db_user)
     return db_user
 
 # Inventory CRUD operations
-def get_inventory(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Inventory).offset(skip).limit(limit).all()
+INVENTORY_SORT_COLUMNS = {
+    "id": models.Inventory.id,
+    "product_name": models.Inventory.product_name,
+    "category": models.Inventory.category,
+    "location": models.Inventory.location,
+}
+
+def get_inventory(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+                  sort_by: str = "id", descending: bool = False,
+                  category: Optional[str] = None, location: Optional[str] = None) -> Page:
+    query = db.query(models.Inventory)
+    if category is not None:
+        query = query.filter(models.Inventory.category == category)
+    if location is not None:
+        query = query.filter(models.Inventory.location == location)
+    return paginate(query, models.Inventory, INVENTORY_SORT_COLUMNS, sort_by, descending, cursor, limit, skip)
 
 def get_inventory_item(db: Session, inventory_id: int):
     return db.query(models.Inventory).filter(models.Inventory.id == inventory_id).first()
 
-def create_inventory_item(db: Session, inventory: schemas.InventoryCreate):
+def create_inventory_item(db: Session, inventory: schemas.InventoryCreate, user_id: Optional[int] = None):
     db_inventory = models.Inventory(
         product_name=inventory.product_name,
         description=inventory.description,
@@ -43,80 +97,320 @@ def create_inventory_item(db: Session, inventory: schemas.InventoryCreate):
         location=inventory.location
     )
     db.add(db_inventory)
+    db.flush()
+    kpi_delta = dashboard.KpiDelta()
+    kpi_delta.add_inventory(db_inventory.category, db_inventory.location, db_inventory.quantity, db_inventory.unit_price)
+    kpi_delta.apply(db)
+    stock_changes = inventory_history.StockChanges()
+    stock_changes.add(db_inventory.id, db_inventory.location, db_inventory.quantity or 0, "create")
+    stock_changes.write(db)
     db.commit()
+    query_cache.invalidate_tables("inventory", "inventory_history")
     db.refresh(db_inventory)
+    audit.record("create", "inventory", db_inventory.id, f"quantity={db_inventory.quantity}", user_id=user_id)
     return db_inventory
 
-def update_inventory_item(db: Session, inventory_id: int, inventory: schemas.InventoryUpdate):
-    db_inventory = get_inventory_item(db, inventory_id)
+def update_inventory_item(db: Session, inventory_id: int, inventory: schemas.InventoryUpdate, user_id: Optional[int] = None):
+    # Locked so the KPI and history deltas are computed from the row this
+    # transaction overwrites; populate_existing replaces a copy the caller
+    # may have loaded before the lock was taken
+    db_inventory = (
+        db.query(models.Inventory)
+        .filter(models.Inventory.id == inventory_id)
+        .populate_existing()
+        .with_for_update()
+        .first()
+    )
+    kpi_delta = dashboard.KpiDelta()
+    kpi_delta.add_inventory(db_inventory.category, db_inventory.location, db_inventory.quantity, db_inventory.unit_price, sign=-1)
+    previous_quantity = db_inventory.quantity
+    previous_location = db_inventory.location
     
     update_data = inventory.dict(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_inventory, key, value)
     
+    kpi_delta.add_inventory(db_inventory.category, db_inventory.location, db_inventory.quantity, db_inventory.unit_price)
+    kpi_delta.apply(db)
+    anomaly_events = anomalies.AnomalyEvents()
+    anomaly_events.add_adjustment(db_inventory.id, previous_quantity, db_inventory.quantity)
+    anomaly_events.detect(db)
+    stock_changes = inventory_history.StockChanges()
+    stock_changes.add_update(db_inventory.id, previous_location, previous_quantity, db_inventory.location, db_inventory.quantity)
+    stock_changes.write(db)
     db.commit()
+    anomaly_events.record()
+    query_cache.invalidate_tables("inventory", "inventory_history")
     db.refresh(db_inventory)
+    audit.record("update", "inventory", db_inventory.id, _describe_changes(update_data), user_id=user_id)
     return db_inventory
 
 # Order CRUD operations
-def get_orders(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Order).offset(skip).limit(limit).all()
+ORDER_SORT_COLUMNS = {
+    "id": models.Order.id,
+    "order_date": models.Order.order_date,
+    "status": models.Order.status,
+}
 
-def get_order(db: Session, order_id: int):
-    return db.query(models.Order).filter(models.Order.id == order_id).first()
+def get_orders(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+               sort_by: str = "id", descending: bool = False,
+               status: Optional[str] = None, supplier_id: Optional[int] = None,
+               include_items: bool = True) -> Page:
+    # Load every page's items in one extra IN query instead of one query per order
+    loader = selectinload(models.Order.order_items) if include_items else noload(models.Order.order_items)
+    query = db.query(models.Order).options(loader)
+    if status is not None:
+        query = query.filter(models.Order.status == status)
+    if supplier_id is not None:
+        query = query.filter(models.Order.supplier_id == supplier_id)
+    return paginate(query, models.Order, ORDER_SORT_COLUMNS, sort_by, descending, cursor, limit, skip)
 
-def create_order(db: Session, order: schemas.OrderCreate):
-    # Calculate total amount from order items
-    total_amount = sum(item.unit_price * item.quantity for item in order.items)
-    
-    # Create order
-    db_order = models.Order(
-        supplier_id=order.supplier_id,
-        status=order.status,
-        total_amount=total_amount
-    )
-    db.add(db_order)
-    db.commit()
-    db.refresh(db_order)
-    
-    # Create order items
+def get_order(db: Session, order_id: int, include_items: bool = True):
+    loader = selectinload(models.Order.order_items) if include_items else noload(models.Order.order_items)
+    return db.query(models.Order).options(loader).filter(models.Order.id == order_id).first()
+
+# Maximum number of orders accepted by /orders/bulk
+ORDERS_BULK_MAX = int(os.getenv("ORDERS_BULK_MAX", "1000"))
+
+class InsufficientStockError(Exception):
+    """
+    Raised when an order asks for more stock than is on hand. `shortages` lists
+    {"inventory_id", "requested", "available"} for every offending item;
+    available is None when the inventory item does not exist.
+    """
+
+    def __init__(self, shortages: List[dict]):
+        super().__init__("Insufficient stock for one or more items")
+        self.shortages = shortages
+
+def _requested_quantities(order: schemas.OrderCreate) -> Dict[int, int]:
+    requested = defaultdict(int)
     for item in order.items:
-        db_item = models.OrderItem(
-            order_id=db_order.id,
-            inventory_id=item.inventory_id,
-            quantity=item.quantity,
-            unit_price=item.unit_price
+        requested[item.inventory_id] += item.quantity
+    return requested
+
+def _lock_inventory(db: Session, inventory_ids: List[int]) -> Dict[int, Any]:
+    """
+    Read current stock for the given items, row-locking them (FOR UPDATE) in id
+    order so concurrent orders always lock in the same sequence and can't deadlock
+    """
+    if not inventory_ids:
+        return {}
+    rows = (
+        db.query(
+            models.Inventory.id, models.Inventory.quantity, models.Inventory.unit_price,
+            models.Inventory.category, models.Inventory.location
         )
-        db.add(db_item)
-        
-        # Update inventory quantity
-        db_inventory = get_inventory_item(db, item.inventory_id)
-        if db_inventory:
-            db_inventory.quantity -= item.quantity
-    
-    db.commit()
-    db.refresh(db_order)
-    return db_order
+        .filter(models.Inventory.id.in_(inventory_ids))
+        .order_by(models.Inventory.id)
+        .with_for_update()
+        .all()
+    )
+    return {row.id: row for row in rows}
+
+def _reserve_stock(requested: Dict[int, int], available: Dict[int, int]) -> List[dict]:
+    """
+    Deduct requested quantities from the in-memory stock snapshot, or return the
+    shortages and leave the snapshot untouched
+    """
+    shortages = [
+        {"inventory_id": inventory_id, "requested": quantity, "available": available.get(inventory_id)}
+        for inventory_id, quantity in sorted(requested.items())
+        if available.get(inventory_id) is None or available[inventory_id] < quantity
+    ]
+    if not shortages:
+        for inventory_id, quantity in requested.items():
+            available[inventory_id] -= quantity
+    return shortages
+
+def _decrement_inventory(db: Session, decrements: Dict[int, int]):
+    """
+    Subtract stock for every affected item in one UPDATE. The WHERE clause
+    re-checks quantity >= decrement so stock can never go negative, even on
+    databases without row locks.
+    """
+    amount = case(decrements, value=models.Inventory.id)
+    result = db.execute(
+        update(models.Inventory)
+        .where(models.Inventory.id.in_(list(decrements)))
+        .where(models.Inventory.quantity >= amount)
+        .values(quantity=models.Inventory.quantity - amount, last_updated=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != len(decrements):
+        current = dict(
+            db.query(models.Inventory.id, models.Inventory.quantity)
+            .filter(models.Inventory.id.in_(list(decrements)))
+            .all()
+        )
+        raise InsufficientStockError([
+            {"inventory_id": inventory_id, "requested": quantity, "available": current.get(inventory_id)}
+            for inventory_id, quantity in sorted(decrements.items())
+            if current.get(inventory_id) is None or current[inventory_id] < quantity
+        ])
+
+def create_orders_bulk(db: Session, orders: List[schemas.OrderCreate], user_id: Optional[int] = None):
+    """
+    Create many orders in a single transaction: lock the affected inventory once,
+    insert all orders and their items in batches, and decrement stock with one
+    UPDATE. Orders that would drive stock negative are skipped and reported as
+    {"index", "shortages"}; the rest are committed together.
+
+    Returns (created order ids, rejected orders).
+    """
+    inventory_ids = sorted({item.inventory_id for order in orders for item in order.items})
+    try:
+        locked_rows = _lock_inventory(db, inventory_ids)
+        available = {inventory_id: row.quantity or 0 for inventory_id, row in locked_rows.items()}
+
+        accepted = []
+        rejected = []
+        decrements = defaultdict(int)
+        for index, order in enumerate(orders):
+            requested = _requested_quantities(order)
+            shortages = _reserve_stock(requested, available)
+            if shortages:
+                rejected.append({"index": index, "shortages": shortages})
+                continue
+            accepted.append(order)
+            for inventory_id, quantity in requested.items():
+                decrements[inventory_id] += quantity
+
+        db_orders = [
+            models.Order(
+                supplier_id=order.supplier_id,
+                status=order.status,
+                total_amount=sum(item.unit_price * item.quantity for item in order.items)
+            )
+            for order in accepted
+        ]
+        db.add_all(db_orders)
+        db.flush()
+
+        item_rows = [
+            {
+                "order_id": db_order.id,
+                "inventory_id": item.inventory_id,
+                "quantity": item.quantity,
+                "unit_price": item.unit_price,
+            }
+            for db_order, order in zip(db_orders, accepted)
+            for item in order.items
+        ]
+        if item_rows:
+            db.execute(insert(models.OrderItem), item_rows)
+        if decrements:
+            _decrement_inventory(db, decrements)
+
+        kpi_delta = dashboard.KpiDelta()
+        for db_order in db_orders:
+            kpi_delta.add_order(db_order.status, db_order.supplier_id, db_order.total_amount)
+        for inventory_id, quantity in decrements.items():
+            row = locked_rows[inventory_id]
+            kpi_delta.add_inventory(row.category, row.location, row.quantity, row.unit_price, sign=-1)
+            kpi_delta.add_inventory(row.category, row.location, (row.quantity or 0) - quantity, row.unit_price)
+        kpi_delta.apply(db)
 
-def update_order(db: Session, order_id: int, order: schemas.OrderUpdate):
-    db_order = get_order(db, order_id)
+        anomaly_events = anomalies.AnomalyEvents()
+        for db_order, order in zip(db_orders, accepted):
+            for item in order.items:
+                anomaly_events.add_order_line(db_order.id, item.inventory_id, db_order.supplier_id, item.quantity, item.unit_price)
+        for inventory_id, quantity in decrements.items():
+            anomaly_events.add_consumption(inventory_id, quantity, (locked_rows[inventory_id].quantity or 0) - quantity)
+        anomaly_events.detect(db)
+
+        stock_changes = inventory_history.StockChanges()
+        for db_order, order in zip(db_orders, accepted):
+            for inventory_id, quantity in _requested_quantities(order).items():
+                stock_changes.add(inventory_id, locked_rows[inventory_id].location, -quantity, "order", order_id=db_order.id)
+        stock_changes.write(db)
+
+        order_ids = [db_order.id for db_order in db_orders]
+        # Read before commit expires the orders; afterwards each would cost a refresh SELECT
+        audit_entries = [
+            (db_order.id, f"status={db_order.status}, total_amount={db_order.total_amount}")
+            for db_order in db_orders
+        ]
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    anomaly_events.record()
+    if order_ids:
+        query_cache.invalidate_tables("orders", "order_items", "inventory", "inventory_history")
+    for order_id, details in audit_entries:
+        audit.record("create", "order", order_id, details, user_id=user_id)
+    return order_ids, rejected
+
+def get_orders_by_ids(db: Session, order_ids: List[int]):
+    if not order_ids:
+        return []
+    return (
+        db.query(models.Order).options(noload(models.Order.order_items))
+        .filter(models.Order.id.in_(order_ids))
+        .order_by(models.Order.id)
+        .all()
+    )
+
+def create_order(db: Session, order: schemas.OrderCreate, user_id: Optional[int] = None):
+    order_ids, rejected = create_orders_bulk(db, [order], user_id=user_id)
+    if rejected:
+        raise InsufficientStockError(rejected[0]["shortages"])
+    return get_order(db, order_ids[0])
+
+# Logged on every order status change; supplier metrics read completion times from it
+ORDER_STATUS_CHANGE_ACTION = "status_change"
+
+def update_order(db: Session, order_id: int, order: schemas.OrderUpdate, user_id: Optional[int] = None):
+    # Locked for the same reason as in update_inventory_item; the items are
+    # read by a separate IN query, so only the order row is locked
+    db_order = (
+        db.query(models.Order)
+        .options(selectinload(models.Order.order_items))
+        .filter(models.Order.id == order_id)
+        .populate_existing()
+        .with_for_update()
+        .first()
+    )
+    kpi_delta = dashboard.KpiDelta()
+    kpi_delta.add_order(db_order.status, db_order.supplier_id, db_order.total_amount, sign=-1)
+    previous_status = db_order.status
     
     update_data = order.dict(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_order, key, value)
     
+    kpi_delta.add_order(db_order.status, db_order.supplier_id, db_order.total_amount)
+    kpi_delta.apply(db)
+    status = db_order.status
+    if status != previous_status:
+        # Written with the change itself; supplier metrics and reports depend on it
+        audit.record(ORDER_STATUS_CHANGE_ACTION, "order", order_id, f"{previous_status} -> {status}",
+                     user_id=user_id, must_persist=True, db=db)
     db.commit()
+    query_cache.invalidate_tables("orders")
+    other_changes = {key: value for key, value in update_data.items() if key != "status"}
+    if other_changes:
+        audit.record("update", "order", order_id, _describe_changes(other_changes), user_id=user_id)
     db.refresh(db_order)
+    if (previous_status in forecast.EXCLUDED_STATUSES) != (status in forecast.EXCLUDED_STATUSES):
+        # The order's lines were added to or removed from demand already fitted
+        forecast.invalidate_items(item.inventory_id for item in db_order.order_items)
     return db_order
 
 # Supplier CRUD operations
-def get_suppliers(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Supplier).offset(skip).limit(limit).all()
+SUPPLIER_SORT_COLUMNS = {"id": models.Supplier.id, "name": models.Supplier.name}
+
+def get_suppliers(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+                  sort_by: str = "id", descending: bool = False) -> Page:
+    query = db.query(models.Supplier)
+    return paginate(query, models.Supplier, SUPPLIER_SORT_COLUMNS, sort_by, descending, cursor, limit, skip)
 
 def get_supplier(db: Session, supplier_id: int):
     return db.query(models.Supplier).filter(models.Supplier.id == supplier_id).first()
 
-def create_supplier(db: Session, supplier: schemas.SupplierCreate):
+def create_supplier(db: Session, supplier: schemas.SupplierCreate, user_id: Optional[int] = None):
     db_supplier = models.Supplier(
         name=supplier.name,
         contact_name=supplier.contact_name,
@@ -127,10 +421,12 @@ def create_supplier(db: Session, supplier: schemas.SupplierCreate):
     )
     db.add(db_supplier)
     db.commit()
+    query_cache.invalidate_tables("suppliers")
     db.refresh(db_supplier)
+    audit.record("create", "supplier", db_supplier.id, f"name={db_supplier.name}", user_id=user_id)
     return db_supplier
 
-def update_supplier(db: Session, supplier_id: int, supplier: schemas.SupplierUpdate):
+def update_supplier(db: Session, supplier_id: int, supplier: schemas.SupplierUpdate, user_id: Optional[int] = None):
     db_supplier = get_supplier(db, supplier_id)
     
     update_data = supplier.dict(exclude_unset=True)
@@ -138,11 +434,20 @@ def update_supplier(db: Session, supplier_id: int, supplier: schemas.SupplierUpd
         setattr(db_supplier, key, value)
     
     db.commit()
+    query_cache.invalidate_tables("suppliers")
     db.refresh(db_supplier)
+    audit.record("update", "supplier", db_supplier.id, _describe_changes(update_data), user_id=user_id)
     return db_supplier
 
 # Activity Log CRUD operations
-def create_activity_log(db: Session, log: schemas.ActivityLogCreate, user_id: int):
+def create_activity_log(db: Session, log: schemas.ActivityLogCreate, user_id: int, must_persist: bool = False):
+    """
+    Queue the entry for the buffered audit writer and return None, or with
+    must_persist write it now and return the stored row
+    """
+    if not must_persist:
+        audit.record(log.action, log.entity_type, log.entity_id, log.details, user_id=user_id)
+        return None
     db_log = models.ActivityLog(
         user_id=user_id,
         action=log.action,
@@ -152,8 +457,31 @@ def create_activity_log(db: Session, log: schemas.ActivityLogCreate, user_id: in
     )
     db.add(db_log)
     db.commit()
+    query_cache.invalidate_tables("activity_logs")
     db.refresh(db_log)
     return db_log
 
-def get_activity_logs(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.ActivityLog).offset(skip).limit(limit).all()
\ No newline at end of file
+def get_activity_logs(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+                      descending: bool = True, entity_type: Optional[str] = None, entity_id: Optional[int] = None,
+                      user_id: Optional[int] = None, action: Optional[str] = None,
+                      since: Optional[datetime] = None, until: Optional[datetime] = None) -> Page:
+    """
+    Audit entries in [since, until), newest first by default, keyset-paginated
+    on (timestamp, id). Entity and user filters are served by the composite
+    indexes and the time bounds limit which partitions are read.
+    """
+    def conditions(source):
+        where = []
+        if entity_type is not None:
+            where.append(source.c.entity_type == entity_type)
+        if entity_id is not None:
+            where.append(source.c.entity_id == entity_id)
+        if user_id is not None:
+            where.append(source.c.user_id == user_id)
+        if action is not None:
+            where.append(source.c.action == action)
+        return where
+
+    entity = audit_partitions.log_entity(db, conditions, since, until)
+    sort_columns = {"timestamp": entity.timestamp}
+    return paginate(db.query(entity), entity, sort_columns, "timestamp", descending, cursor, limit, skip)
\ No newline at end of file
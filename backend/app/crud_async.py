@@ -0,0 +1,61 @@
+from functools import wraps
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import crud, schemas
+from .auth import get_password_hash_async
+
+# Async counterparts of the functions in crud.py for the async routes.
+#
+# Each one runs the sync implementation on the async session's connection via
+# AsyncSession.run_sync, so every query, pagination rule and stock check is
+# shared with the sync stack while all I/O is awaited on the event loop.
+# Audit entries they record are queued, and any flush audit.record has to
+# trigger runs in a worker thread rather than on the loop.
+
+
+def _run_sync(function):
+    @wraps(function)
+    async def wrapper(db: AsyncSession, *args, **kwargs):
+        return await db.run_sync(function, *args, **kwargs)
+    return wrapper
+
+
+# Users
+get_user = _run_sync(crud.get_user)
+get_user_by_email = _run_sync(crud.get_user_by_email)
+get_users = _run_sync(crud.get_users)
+
+async def create_user(db: AsyncSession, user: schemas.UserCreate):
+    # bcrypt runs in the hashing pool, not inside the session's greenlet
+    hashed_password = await get_password_hash_async(user.password)
+    return await db.run_sync(crud.create_user, user, hashed_password)
+
+async def update_user(db: AsyncSession, user_id: int, user: schemas.UserUpdate, actor_id: Optional[int] = None):
+    hashed_password = await get_password_hash_async(user.password) if user.password is not None else None
+    return await db.run_sync(crud.update_user, user_id, user, hashed_password, actor_id)
+
+# Inventory
+get_inventory = _run_sync(crud.get_inventory)
+get_inventory_item = _run_sync(crud.get_inventory_item)
+create_inventory_item = _run_sync(crud.create_inventory_item)
+update_inventory_item = _run_sync(crud.update_inventory_item)
+
+# Orders
+get_orders = _run_sync(crud.get_orders)
+get_order = _run_sync(crud.get_order)
+get_orders_by_ids = _run_sync(crud.get_orders_by_ids)
+create_order = _run_sync(crud.create_order)
+create_orders_bulk = _run_sync(crud.create_orders_bulk)
+update_order = _run_sync(crud.update_order)
+
+# Suppliers
+get_suppliers = _run_sync(crud.get_suppliers)
+get_supplier = _run_sync(crud.get_supplier)
+create_supplier = _run_sync(crud.create_supplier)
+update_supplier = _run_sync(crud.update_supplier)
+
+# Activity logs
+create_activity_log = _run_sync(crud.create_activity_log)
+get_activity_logs = _run_sync(crud.get_activity_logs)
@@ -0,0 +1,284 @@
+import csv
+import io
+import os
+import zlib
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import Boolean, DateTime, Float, Integer, Numeric, select
+from dotenv import load_dotenv
+
+from . import audit_partitions, models
+from .database import ReadSessionLocal
+
+# Load environment variables
+load_dotenv()
+
+# Rows fetched from the server-side cursor per round trip (and per Parquet row group)
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+EXPORT_GZIP_LEVEL = int(os.getenv("EXPORT_GZIP_LEVEL", "6"))
+
+EXPORT_FORMATS = ("csv", "parquet")
+
+
+def _table_columns(model) -> Dict[str, Any]:
+    return {column.name: getattr(model, column.key) for column in model.__table__.columns}
+
+
+# entity_type -> exported columns, optional joins, the column since/until apply to, and row order.
+# Users are not exportable (password hashes).
+EXPORT_SOURCES: Dict[str, dict] = {
+    "inventory": {
+        "columns": _table_columns(models.Inventory),
+        "date_column": "last_updated",
+        "order_by": ["id"],
+    },
+    "suppliers": {
+        "columns": _table_columns(models.Supplier),
+        "date_column": None,
+        "order_by": ["id"],
+    },
+    "orders": {
+        "columns": _table_columns(models.Order),
+        "date_column": "order_date",
+        "order_by": ["id"],
+    },
+    "order_items": {
+        "columns": _table_columns(models.OrderItem),
+        "date_column": None,
+        "order_by": ["id"],
+    },
+    # Full order history: one row per order line with its order's header fields
+    "order_lines": {
+        "columns": {
+            "order_id": models.Order.id,
+            "order_date": models.Order.order_date,
+            "status": models.Order.status,
+            "supplier_id": models.Order.supplier_id,
+            "total_amount": models.Order.total_amount,
+            "item_id": models.OrderItem.id,
+            "inventory_id": models.OrderItem.inventory_id,
+            "quantity": models.OrderItem.quantity,
+            "unit_price": models.OrderItem.unit_price,
+        },
+        "joins": [(models.Order, models.OrderItem)],
+        "date_column": "order_date",
+        "order_by": ["order_id", "item_id"],
+    },
+    # Read across the monthly partitions / archive tables (see audit_partitions)
+    "activity_logs": {
+        "columns": _table_columns(models.ActivityLog),
+        "partitioned": True,
+        "date_column": "timestamp",
+        "order_by": ["id"],
+    },
+}
+
+
+class Export:
+    """
+    A validated export, ready to be streamed by iterating `chunks`
+    """
+
+    def __init__(self, filename: str, media_type: str, chunks: Iterator[bytes]):
+        self.filename = filename
+        self.media_type = media_type
+        self.chunks = chunks
+
+
+def _convert_filter_value(column, value: str):
+    if isinstance(column.type, Boolean):
+        lowered = value.lower()
+        if lowered not in ("true", "false", "1", "0"):
+            raise ValueError(f"'{value}' is not a boolean")
+        return lowered in ("true", "1")
+    if isinstance(column.type, Integer):
+        return int(value)
+    if isinstance(column.type, (Float, Numeric)):
+        return float(value)
+    if isinstance(column.type, DateTime):
+        return datetime.fromisoformat(value)
+    return value
+
+
+def build_statement(entity_type: str, columns: Optional[List[str]] = None,
+                    filters: Optional[Dict[str, List[str]]] = None,
+                    since: Optional[datetime] = None, until: Optional[datetime] = None):
+    """
+    Build the SELECT for an export. Column selection, equality filters
+    (repeated values become IN) and the since/until range all go into SQL
+    """
+    source = EXPORT_SOURCES[entity_type]
+    available = source["columns"]
+    if source.get("partitioned"):
+        db = ReadSessionLocal()
+        try:
+            entity = audit_partitions.log_entity(db, lambda table: [], since, until)
+        finally:
+            db.close()
+        available = {name: getattr(entity, column.key) for name, column in available.items()}
+
+    selected = columns or list(available)
+    unknown = [name for name in selected if name not in available]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}. Available: {', '.join(available)}")
+
+    statement = select(*[available[name].label(name) for name in selected])
+    for left, right in source.get("joins", []):
+        statement = statement.join_from(left, right)
+
+    for name, values in (filters or {}).items():
+        if name not in available:
+            raise ValueError(f"Cannot filter on '{name}'. Available: {', '.join(available)}")
+        column = available[name]
+        try:
+            converted = [_convert_filter_value(column, value) for value in values]
+        except ValueError as e:
+            raise ValueError(f"Invalid value for '{name}': {str(e)}")
+        statement = statement.where(column == converted[0] if len(converted) == 1 else column.in_(converted))
+
+    if since is not None or until is not None:
+        date_column_name = source["date_column"]
+        if date_column_name is None:
+            raise ValueError(f"{entity_type} has no date column to filter by since/until")
+        date_column = available[date_column_name]
+        if since is not None:
+            statement = statement.where(date_column >= since)
+        if until is not None:
+            statement = statement.where(date_column < until)
+
+    return statement.order_by(*[available[name] for name in source["order_by"]]), selected
+
+
+def _iter_batches(statement) -> Iterator[List[Any]]:
+    """
+    Fetch rows through a server-side cursor EXPORT_BATCH_SIZE at a time. The
+    session is owned by the generator so it lives exactly as long as the stream.
+    """
+    db = ReadSessionLocal()
+    try:
+        result = db.execute(statement.execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE))
+        for rows in result.partitions(EXPORT_BATCH_SIZE):
+            yield rows
+    finally:
+        db.close()
+
+
+def _format_csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _csv_chunks(statement, column_names: List[str]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(column_names)
+    for rows in _iter_batches(statement):
+        for row in rows:
+            writer.writerow([_format_csv_value(value) for value in row])
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only, when there were no rows
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _gzip_chunks(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(EXPORT_GZIP_LEVEL, zlib.DEFLATED, 31)  # 31 = gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    Write-only file object that hands written bytes back to a generator
+    """
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def _arrow_type(pa, column):
+    if isinstance(column.type, Boolean):
+        return pa.bool_()
+    if isinstance(column.type, Integer):
+        return pa.int64()
+    if isinstance(column.type, (Float, Numeric)):
+        return pa.float64()
+    if isinstance(column.type, DateTime):
+        return pa.timestamp("us")
+    return pa.string()
+
+
+def _parquet_chunks(pa, pq, statement, column_names: List[str], columns: Dict[str, Any]) -> Iterator[bytes]:
+    schema = pa.schema([(name, _arrow_type(pa, columns[name])) for name in column_names])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    try:
+        for rows in _iter_batches(statement):
+            # One row group per batch; only the current batch is held in memory
+            arrays = [pa.array([row[index] for row in rows], type=field.type) for index, field in enumerate(schema)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def prepare_export(entity_type: str, export_format: str = "csv", gzip: bool = False,
+                   columns: Optional[List[str]] = None, filters: Optional[Dict[str, List[str]]] = None,
+                   since: Optional[datetime] = None, until: Optional[datetime] = None) -> Export:
+    """
+    Validate an export request and return a lazy byte stream of its file.
+
+    Nothing touches the database until the stream is iterated, and rows are
+    then read in batches of EXPORT_BATCH_SIZE, so memory use is flat however
+    many rows are exported. Raises ValueError for bad columns, filters or a
+    missing optional dependency.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported format '{export_format}'. Supported: {', '.join(EXPORT_FORMATS)}")
+    statement, column_names = build_statement(entity_type, columns, filters, since, until)
+    stamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
+
+    if export_format == "parquet":
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Parquet export requires the pyarrow package")
+        # Parquet is compressed internally; gzip is ignored
+        return Export(
+            f"{entity_type}_{stamp}.parquet",
+            "application/vnd.apache.parquet",
+            _parquet_chunks(pa, pq, statement, column_names, EXPORT_SOURCES[entity_type]["columns"])
+        )
+
+    chunks = _csv_chunks(statement, column_names)
+    if gzip:
+        return Export(f"{entity_type}_{stamp}.csv.gz", "application/gzip", _gzip_chunks(chunks))
+    return Export(f"{entity_type}_{stamp}.csv", "text/csv", chunks)
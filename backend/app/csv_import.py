@@ -0,0 +1,361 @@
+import csv
+import io
+import os
+from datetime import datetime
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+
+from . import audit, crud, dashboard, inventory_history, models, schemas, query_cache
+
+# Load environment variables
+load_dotenv()
+
+# Rows (or orders) written per statement/transaction; bounds memory per import
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+# Only the first N row errors are returned; the rest are counted
+IMPORT_MAX_REPORTED_ERRORS = int(os.getenv("IMPORT_MAX_REPORTED_ERRORS", "1000"))
+# Load plain inserts with COPY ... FROM STDIN on PostgreSQL
+IMPORT_USE_COPY = os.getenv("IMPORT_USE_COPY", "true").lower() in ("1", "true", "yes")
+
+# entity_type -> (model, row schema, values every new row needs that the schema doesn't carry)
+TABLE_IMPORTS = {
+    "inventory": (models.Inventory, schemas.InventoryCreate, lambda: {"last_updated": datetime.utcnow()}),
+    "suppliers": (models.Supplier, schemas.SupplierCreate, lambda: {"is_active": True}),
+}
+
+# Columns of an orders CSV; rows sharing an order_ref are lines of one order
+ORDER_HEADER_COLUMNS = ("supplier_id", "status")
+ORDER_ITEM_COLUMNS = ("inventory_id", "quantity", "unit_price")
+ORDER_REQUIRED_COLUMNS = {"supplier_id", "inventory_id", "quantity", "unit_price"}
+
+ENTITY_TYPES = sorted(list(TABLE_IMPORTS) + ["orders"])
+
+
+class ImportReport:
+    """
+    Running totals for one import. Only the first IMPORT_MAX_REPORTED_ERRORS
+    errors are kept so memory stays flat however bad the file is.
+    """
+
+    def __init__(self, entity_type: str):
+        self.entity_type = entity_type
+        self.imported = 0
+        self.failed = 0
+        self.errors: List[dict] = []
+        self.errors_truncated = False
+
+    def add_error(self, line: int, message: str):
+        self.failed += 1
+        if len(self.errors) < IMPORT_MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": message})
+        else:
+            self.errors_truncated = True
+
+    def as_dict(self) -> dict:
+        return {
+            "entity_type": self.entity_type,
+            "imported": self.imported,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.errors_truncated,
+        }
+
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in detail['loc'])}: {detail['msg']}" for detail in error.errors()
+    )
+
+
+def _database_message(error: Exception) -> str:
+    message = str(getattr(error, "orig", None) or error).strip()
+    return message.splitlines()[0] if message else error.__class__.__name__
+
+
+def _clean_row(row: Dict[Optional[str], object]) -> Dict[str, str]:
+    """
+    Strip whitespace and drop empty cells so schema defaults apply to them
+    """
+    if None in row:
+        raise ValueError("Row has more values than the header")
+    cleaned = {}
+    for key, value in row.items():
+        if value is None:
+            continue
+        value = value.strip()
+        if value:
+            cleaned[key.strip()] = value
+    return cleaned
+
+
+def _iter_rows(reader: csv.DictReader, report: ImportReport) -> Iterator[Tuple[int, Dict[str, str]]]:
+    for row in reader:
+        line = reader.line_num
+        try:
+            yield line, _clean_row(row)
+        except ValueError as e:
+            report.add_error(line, str(e))
+
+
+def _batches(items: Iterable, size: int) -> Iterator[list]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _check_columns(fieldnames: Optional[List[str]], required: Iterable[str]):
+    if not fieldnames:
+        raise ValueError("CSV file is empty or has no header row")
+    missing = sorted(set(required) - {name.strip() for name in fieldnames if name})
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(missing)}")
+
+
+# Inventory and suppliers
+
+def _upsert_statement(table, columns: Iterable[str], dialect_name: str):
+    """
+    INSERT that updates the existing row when the id is already taken. Falls
+    back to a plain INSERT on databases without ON CONFLICT.
+    """
+    if dialect_name == "postgresql":
+        statement = postgresql.insert(table)
+    elif dialect_name == "sqlite":
+        statement = sqlite.insert(table)
+    else:
+        return insert(table)
+    return statement.on_conflict_do_update(
+        index_elements=[table.c.id],
+        set_={name: statement.excluded[name] for name in columns if name != "id"}
+    )
+
+
+def _copy_rows(db: Session, table, rows: List[dict]):
+    """
+    Stream a batch into PostgreSQL with COPY, the fastest bulk load path
+    """
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        # Empty unquoted fields are NULL in COPY's csv format
+        writer.writerow(["" if row[name] is None else row[name] for name in columns])
+    buffer.seek(0)
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+
+def _write_rows(db: Session, table, rows: List[dict]):
+    dialect_name = db.get_bind().dialect.name
+    inserts = [row for row in rows if "id" not in row]
+    upserts = [row for row in rows if "id" in row]
+    if inserts:
+        if dialect_name == "postgresql" and IMPORT_USE_COPY:
+            _copy_rows(db, table, inserts)
+        else:
+            # Executed as multi-row INSERT ... VALUES batches by SQLAlchemy
+            db.execute(insert(table), inserts)
+    if upserts:
+        db.execute(_upsert_statement(table, upserts[0], dialect_name), upserts)
+
+
+def _record_batch(entity_type: str, written: List[dict], user_id: Optional[int]):
+    """
+    One audit entry per committed batch. Rows carrying an id are counted as
+    upserted since the database decides whether they inserted or updated.
+    """
+    if not written:
+        return
+    upserted = sum(1 for values in written if "id" in values)
+    audit.record("import", entity_type, None, f"inserted={len(written) - upserted}, upserted={upserted}", user_id=user_id)
+
+
+def _write_table_batch(db: Session, entity_type: str, table, batch: List[Tuple[int, dict]], report: ImportReport,
+                       user_id: Optional[int] = None):
+    try:
+        _write_rows(db, table, [values for _, values in batch])
+        db.commit()
+        report.imported += len(batch)
+        _record_batch(entity_type, [values for _, values in batch], user_id)
+        return
+    except Exception:
+        db.rollback()
+
+    # Something in the batch was rejected by the database; isolate it row by row
+    written = []
+    for line, values in batch:
+        try:
+            with db.begin_nested():
+                _write_rows(db, table, [values])
+            report.imported += 1
+            written.append(values)
+        except Exception as e:
+            report.add_error(line, _database_message(e))
+    db.commit()
+    _record_batch(entity_type, written, user_id)
+
+
+def _sync_id_sequence(db: Session, table):
+    """
+    Move the PostgreSQL id sequence past ids loaded explicitly from the file
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    db.execute(
+        text(f"SELECT setval(pg_get_serial_sequence(:table_name, 'id'), COALESCE((SELECT MAX(id) FROM {table.name}), 1))"),
+        {"table_name": table.name}
+    )
+    db.commit()
+
+
+def _import_table(db: Session, entity_type: str, reader: csv.DictReader, report: ImportReport,
+                  user_id: Optional[int] = None):
+    model, schema, row_defaults = TABLE_IMPORTS[entity_type]
+    table = model.__table__
+    _check_columns(reader.fieldnames, [name for name, field in schema.model_fields.items() if field.is_required()])
+
+    def parsed_rows():
+        for line, row in _iter_rows(reader, report):
+            record_id = row.pop("id", None)
+            try:
+                values = schema(**row).model_dump()
+                if record_id is not None:
+                    values["id"] = int(record_id)
+            except ValidationError as e:
+                report.add_error(line, _validation_message(e))
+                continue
+            except ValueError:
+                report.add_error(line, f"id: '{record_id}' is not an integer")
+                continue
+            values.update(row_defaults())
+            yield line, values
+
+    explicit_ids = False
+    for batch in _batches(parsed_rows(), IMPORT_BATCH_SIZE):
+        explicit_ids = explicit_ids or any("id" in values for _, values in batch)
+        _write_table_batch(db, entity_type, table, batch, report, user_id=user_id)
+
+    if explicit_ids:
+        _sync_id_sequence(db, table)
+    if report.imported:
+        query_cache.invalidate_tables(table.name)
+        if entity_type == "inventory":
+            # One grouped recompute is cheaper than per-row KPI deltas for a bulk load
+            dashboard.rebuild(db)
+            # Imported quantities are recorded as checkpoints rather than deltas
+            inventory_history.checkpoint(db)
+
+
+# Orders
+
+def _order_groups(rows: Iterable[Tuple[int, Dict[str, str]]]) -> Iterator[List[Tuple[int, Dict[str, str]]]]:
+    """
+    Group consecutive rows with the same order_ref; rows without one are
+    single-line orders
+    """
+    group = []
+    group_ref = None
+    for line, row in rows:
+        ref = row.get("order_ref")
+        if group and (ref is None or ref != group_ref):
+            yield group
+            group = []
+        group.append((line, row))
+        group_ref = ref
+    if group:
+        yield group
+
+
+def _shortage_message(shortages: List[dict]) -> str:
+    return "Insufficient stock: " + ", ".join(
+        f"inventory {shortage['inventory_id']} (requested {shortage['requested']}, "
+        f"available {'none' if shortage['available'] is None else shortage['available']})"
+        for shortage in shortages
+    )
+
+
+def _write_order_batch(db: Session, batch: List[Tuple[int, schemas.OrderCreate]], report: ImportReport,
+                       user_id: Optional[int] = None):
+    try:
+        # create_orders_bulk records an audit entry per order it commits
+        order_ids, rejected = crud.create_orders_bulk(db, [order for _, order in batch], user_id=user_id)
+    except Exception as e:
+        if len(batch) == 1:
+            shortages = getattr(e, "shortages", None)
+            report.add_error(batch[0][0], _shortage_message(shortages) if shortages else _database_message(e))
+            return
+        # create_orders_bulk rolled back; retry one order at a time to find the bad ones
+        for entry in batch:
+            _write_order_batch(db, [entry], report, user_id=user_id)
+        return
+
+    report.imported += len(order_ids)
+    for rejection in rejected:
+        report.add_error(batch[rejection["index"]][0], _shortage_message(rejection["shortages"]))
+
+
+def _import_orders(db: Session, reader: csv.DictReader, report: ImportReport, user_id: Optional[int] = None):
+    _check_columns(reader.fieldnames, ORDER_REQUIRED_COLUMNS)
+
+    def parsed_orders():
+        for group in _order_groups(_iter_rows(reader, report)):
+            first_line, first_row = group[0]
+            data = {name: first_row[name] for name in ORDER_HEADER_COLUMNS if name in first_row}
+            data["items"] = [
+                {name: row.get(name) for name in ORDER_ITEM_COLUMNS} for _, row in group
+            ]
+            try:
+                yield first_line, schemas.OrderCreate(**data)
+            except ValidationError as e:
+                report.add_error(first_line, _validation_message(e))
+
+    for batch in _batches(parsed_orders(), IMPORT_BATCH_SIZE):
+        _write_order_batch(db, batch, report, user_id=user_id)
+
+
+def import_csv(db: Session, entity_type: str, file: BinaryIO, user_id: Optional[int] = None) -> dict:
+    """
+    Import a CSV upload for inventory, suppliers or orders.
+
+    The file is read as a stream and written in batches of IMPORT_BATCH_SIZE,
+    each committed on its own, so memory use does not grow with the file.
+    Invalid rows are reported by line number and skipped; the rest of the
+    batch still goes in. Inventory and supplier rows that carry an id update
+    the existing record. Order rows are grouped into orders by order_ref and
+    go through the same stock checks as POST /orders/. Each committed batch
+    is recorded in the audit trail under user_id.
+    """
+    if entity_type not in ENTITY_TYPES:
+        raise ValueError(f"Unsupported entity type '{entity_type}'. Supported: {', '.join(ENTITY_TYPES)}")
+
+    report = ImportReport(entity_type)
+    stream = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        reader = csv.DictReader(stream)
+        try:
+            if entity_type == "orders":
+                _import_orders(db, reader, report, user_id=user_id)
+            else:
+                _import_table(db, entity_type, reader, report, user_id=user_id)
+        except (csv.Error, UnicodeDecodeError) as e:
+            # Batches already committed stay; the unreadable remainder is reported once
+            report.add_error(reader.line_num, f"Could not read CSV: {str(e)}")
+    finally:
+        # Leave the upload's file open for its owner to close
+        stream.detach()
+
+    print(f"Imported {report.imported} {entity_type} records ({report.failed} failed)")
+    return report.as_dict()
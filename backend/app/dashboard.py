@@ -0,0 +1,263 @@
+import os
+from collections import defaultdict
+from typing import Any, Dict, Optional
+
+from sqlalchemy import case, func, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+
+from . import models
+from .database import Base, SessionLocal, engine
+
+# Load environment variables
+load_dotenv()
+
+# Items with quantity below this count as low stock (changing it needs a rebuild)
+LOW_STOCK_THRESHOLD = int(os.getenv("LOW_STOCK_THRESHOLD", "10"))
+DASHBOARD_TOP_SUPPLIERS = int(os.getenv("DASHBOARD_TOP_SUPPLIERS", "5"))
+
+# Orders in this status do not count towards supplier spend
+CANCELLED_STATUS = "cancelled"
+
+KPI_TABLES = [
+    models.KpiInventory.__table__,
+    models.KpiOrderStatus.__table__,
+    models.KpiSupplierSpend.__table__,
+]
+
+
+class KpiDelta:
+    """
+    Changes to the KPI tables accumulated while a transaction writes source
+    rows. `apply` adds them to the aggregates in the same transaction, so the
+    dashboard never disagrees with committed data.
+    """
+
+    def __init__(self):
+        self.inventory: Dict[tuple, Dict[str, float]] = defaultdict(lambda: defaultdict(int))
+        self.order_status: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(int))
+        self.supplier_spend: Dict[int, Dict[str, float]] = defaultdict(lambda: defaultdict(int))
+
+    def add_inventory(self, category: Optional[str], location: Optional[str], quantity: Optional[int],
+                      unit_price: Optional[float], sign: int = 1):
+        """
+        Count (sign=1) or uncount (sign=-1) one inventory row in its
+        category/location bucket
+        """
+        quantity = quantity or 0
+        totals = self.inventory[(category or "", location or "")]
+        totals["item_count"] += sign
+        totals["total_quantity"] += sign * quantity
+        totals["stock_value"] += sign * quantity * (unit_price or 0.0)
+        totals["low_stock_count"] += sign * int(quantity < LOW_STOCK_THRESHOLD)
+
+    def add_order(self, status: Optional[str], supplier_id: Optional[int], total_amount: Optional[float], sign: int = 1):
+        total_amount = total_amount or 0.0
+        totals = self.order_status[status or ""]
+        totals["order_count"] += sign
+        totals["total_value"] += sign * total_amount
+        if supplier_id is not None and status != CANCELLED_STATUS:
+            spend = self.supplier_spend[supplier_id]
+            spend["order_count"] += sign
+            spend["total_spend"] += sign * total_amount
+
+    def apply(self, db: Session):
+        _add_rows(db, models.KpiInventory.__table__, ["category", "location"], self.inventory)
+        _add_rows(db, models.KpiOrderStatus.__table__, ["status"], self.order_status)
+        _add_rows(db, models.KpiSupplierSpend.__table__, ["supplier_id"], self.supplier_spend)
+
+
+def _add_rows(db: Session, table, key_columns, deltas: Dict[Any, Dict[str, float]]):
+    """
+    Add each delta to its aggregate row, creating the row if needed. Uses a
+    single INSERT ... ON CONFLICT DO UPDATE so concurrent writers can't lose
+    updates or race on the insert.
+    """
+    rows = []
+    # Sorted so concurrent transactions lock aggregate rows in the same order
+    for key, totals in sorted(deltas.items()):
+        if not any(totals.values()):
+            continue
+        key_values = key if isinstance(key, tuple) else (key,)
+        rows.append({**dict(zip(key_columns, key_values)), **totals})
+    if not rows:
+        return
+
+    value_columns = [column.name for column in table.columns if column.name not in key_columns]
+    for row in rows:
+        for name in value_columns:
+            row.setdefault(name, 0)
+
+    dialect_name = db.get_bind().dialect.name
+    if dialect_name in ("postgresql", "sqlite"):
+        statement = (postgresql if dialect_name == "postgresql" else sqlite).insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=key_columns,
+            set_={name: table.c[name] + statement.excluded[name] for name in value_columns}
+        )
+        db.execute(statement, rows)
+        return
+
+    for row in rows:
+        condition = [table.c[name] == row[name] for name in key_columns]
+        result = db.execute(
+            update(table).where(*condition).values({name: table.c[name] + row[name] for name in value_columns})
+        )
+        if result.rowcount == 0:
+            db.execute(insert(table).values(row))
+
+
+def rebuild(db: Session):
+    """
+    Recompute every KPI table from the source tables with one grouped query
+    each. Used on first start, after bulk imports, and on demand.
+    """
+    inventory_quantity = func.coalesce(models.Inventory.quantity, 0)
+    category = func.coalesce(models.Inventory.category, "")
+    location = func.coalesce(models.Inventory.location, "")
+    inventory_totals = (
+        select(
+            category,
+            location,
+            func.count(models.Inventory.id),
+            func.coalesce(func.sum(inventory_quantity), 0),
+            func.coalesce(func.sum(inventory_quantity * func.coalesce(models.Inventory.unit_price, 0.0)), 0.0),
+            func.coalesce(func.sum(case((inventory_quantity < LOW_STOCK_THRESHOLD, 1), else_=0)), 0),
+        )
+        .group_by(category, location)
+    )
+
+    status = func.coalesce(models.Order.status, "")
+    order_totals = (
+        select(status, func.count(models.Order.id), func.coalesce(func.sum(models.Order.total_amount), 0.0))
+        .group_by(status)
+    )
+
+    supplier_totals = (
+        select(
+            models.Order.supplier_id,
+            func.count(models.Order.id),
+            func.coalesce(func.sum(models.Order.total_amount), 0.0),
+        )
+        .where(models.Order.supplier_id.isnot(None))
+        .where(func.coalesce(models.Order.status, "") != CANCELLED_STATUS)
+        .group_by(models.Order.supplier_id)
+    )
+
+    try:
+        for table in KPI_TABLES:
+            db.execute(table.delete())
+        db.execute(insert(models.KpiInventory.__table__).from_select(
+            ["category", "location", "item_count", "total_quantity", "stock_value", "low_stock_count"],
+            inventory_totals
+        ))
+        db.execute(insert(models.KpiOrderStatus.__table__).from_select(
+            ["status", "order_count", "total_value"], order_totals
+        ))
+        db.execute(insert(models.KpiSupplierSpend.__table__).from_select(
+            ["supplier_id", "order_count", "total_spend"], supplier_totals
+        ))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+
+def warm_up() -> None:
+    """
+    Create missing KPI tables and fill them on first start. Failures are
+    logged; the dashboard then shows zeros until a rebuild succeeds.
+    """
+    db = SessionLocal()
+    try:
+        Base.metadata.create_all(bind=engine, tables=KPI_TABLES)
+        empty = all(db.execute(select(func.count()).select_from(table)).scalar() == 0 for table in KPI_TABLES)
+        if empty:
+            rebuild(db)
+            print("Dashboard KPI tables rebuilt")
+    except Exception as e:
+        print(f"Could not prepare dashboard KPI tables: {str(e)}")
+    finally:
+        db.close()
+
+
+def _round(value: float) -> float:
+    return round(value or 0.0, 2)
+
+
+def get_summary(db: Session) -> Dict[str, Any]:
+    """
+    Dashboard KPIs read from the aggregate tables. Only the suppliers table
+    is counted directly; inventory and orders are never scanned.
+    """
+    inventory_rows = db.query(models.KpiInventory).all()
+    by_category = defaultdict(lambda: defaultdict(float))
+    by_location = defaultdict(lambda: defaultdict(float))
+    inventory_totals = defaultdict(float)
+    for row in inventory_rows:
+        for bucket in (by_category[row.category], by_location[row.location], inventory_totals):
+            bucket["item_count"] += row.item_count
+            bucket["total_quantity"] += row.total_quantity
+            bucket["stock_value"] += row.stock_value
+            bucket["low_stock_count"] += row.low_stock_count
+
+    def _stock_entries(buckets, key_name):
+        return sorted(
+            (
+                {
+                    key_name: key or None,
+                    "item_count": int(totals["item_count"]),
+                    "total_quantity": int(totals["total_quantity"]),
+                    "stock_value": _round(totals["stock_value"]),
+                    "low_stock_count": int(totals["low_stock_count"]),
+                }
+                for key, totals in buckets.items() if totals["item_count"]
+            ),
+            key=lambda entry: entry["stock_value"],
+            reverse=True
+        )
+
+    status_rows = [row for row in db.query(models.KpiOrderStatus).all() if row.order_count]
+    top_suppliers = (
+        db.query(models.KpiSupplierSpend, models.Supplier.name)
+        .outerjoin(models.Supplier, models.Supplier.id == models.KpiSupplierSpend.supplier_id)
+        .filter(models.KpiSupplierSpend.order_count > 0)
+        .order_by(models.KpiSupplierSpend.total_spend.desc())
+        .limit(DASHBOARD_TOP_SUPPLIERS)
+        .all()
+    )
+    supplier_count, active_supplier_count = db.query(
+        func.count(models.Supplier.id),
+        func.coalesce(func.sum(case((models.Supplier.is_active.is_(True), 1), else_=0)), 0)
+    ).one()
+
+    return {
+        "inventory": {
+            "item_count": int(inventory_totals["item_count"]),
+            "total_quantity": int(inventory_totals["total_quantity"]),
+            "stock_value": _round(inventory_totals["stock_value"]),
+            "low_stock_count": int(inventory_totals["low_stock_count"]),
+            "low_stock_threshold": LOW_STOCK_THRESHOLD,
+        },
+        "stock_by_category": _stock_entries(by_category, "category"),
+        "stock_by_location": _stock_entries(by_location, "location"),
+        "orders": {
+            "order_count": sum(row.order_count for row in status_rows),
+            "total_value": _round(sum(row.total_value for row in status_rows)),
+            "by_status": [
+                {"status": row.status or None, "order_count": row.order_count, "total_value": _round(row.total_value)}
+                for row in sorted(status_rows, key=lambda row: row.order_count, reverse=True)
+            ],
+        },
+        "top_suppliers": [
+            {
+                "supplier_id": spend.supplier_id,
+                "name": name,
+                "order_count": spend.order_count,
+                "total_spend": _round(spend.total_spend),
+            }
+            for spend, name in top_suppliers
+        ],
+        "suppliers": {"total": supplier_count, "active": int(active_supplier_count)},
+    }
@@ -1,7 +1,9 @@
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+import itertools
 import os
+import threading
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -10,17 +12,107 @@ load_dotenv()
 # Get database URL from environment variable or use SQLite as default
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-# Create SQLAlchemy engine with PostgreSQL-specific parameters
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,  # Enables connection pool "pre-ping" feature
-    pool_recycle=3600,   # Recycle connections after 1 hour
-    connect_args={"connect_timeout": 30}  # Connection timeout in seconds
-)
+# Read replicas (comma separated URLs) for listings, search, reports and exports
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+
+# Connection pool settings, applied to the primary and to each replica
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))  # Seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))  # Recycle connections after 1 hour
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "30"))  # Connection timeout in seconds
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))  # PostgreSQL only, 0 = no limit
+
+def _is_postgresql(url):
+    return url.startswith("postgres")
+
+def _engine_options(url, async_driver=False):
+    """Pool and connection settings for an engine on the given URL"""
+    options = {
+        "pool_pre_ping": True,  # Enables connection pool "pre-ping" feature
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+    if ":memory:" not in url:
+        # In-memory SQLite uses a single-connection pool that takes no sizing
+        options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    if _is_postgresql(url):
+        if async_driver:
+            connect_args = {"timeout": DB_CONNECT_TIMEOUT}
+            if DB_STATEMENT_TIMEOUT_MS:
+                connect_args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+        else:
+            connect_args = {"connect_timeout": DB_CONNECT_TIMEOUT}
+            if DB_STATEMENT_TIMEOUT_MS:
+                connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+        options["connect_args"] = connect_args
+    return options
+
+# Create SQLAlchemy engine for the primary database
+engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
+
+replica_engines = [create_engine(url, **_engine_options(url)) for url in DATABASE_REPLICA_URLS]
+_replica_cycle = itertools.cycle(replica_engines) if replica_engines else None
+_replica_lock = threading.Lock()
+
+def _next_replica():
+    if _replica_cycle is None:
+        return None
+    with _replica_lock:
+        return next(_replica_cycle)
+
+class RoutingSession(Session):
+    """
+    Session for read-only paths. Each session sticks to one replica (picked
+    round-robin) so its reads see a consistent snapshot; flushes always go to
+    the primary. Without replicas configured it behaves like a normal session.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replica = _next_replica()
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.replica is None or self._flushing:
+            return engine
+        return self.replica
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Sessions for listings, /ai/search/, reports and exports
+ReadSessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=engine)
+
+# Optional async stack for the CRUD routes: asyncpg for PostgreSQL, aiosqlite for SQLite
+ASYNC_DATABASE_ENABLED = os.getenv("ASYNC_DATABASE_ENABLED", "false").lower() in ("1", "true", "yes")
+
+_ASYNC_DRIVERS = [
+    ("postgresql+psycopg2://", "postgresql+asyncpg://"),
+    ("postgresql://", "postgresql+asyncpg://"),
+    ("postgres://", "postgresql+asyncpg://"),
+    ("sqlite://", "sqlite+aiosqlite://"),
+]
+
+def _async_database_url(url):
+    """Swap the sync driver in DATABASE_URL for its async counterpart"""
+    if url is None:
+        return None
+    for sync_prefix, async_prefix in _ASYNC_DRIVERS:
+        if url.startswith(sync_prefix):
+            return async_prefix + url[len(sync_prefix):]
+    return url
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _async_database_url(DATABASE_URL)
+
+async_engine = None
+AsyncSessionLocal = None
+if ASYNC_DATABASE_ENABLED:
+    # Imported here so the async drivers are only needed when the async stack is on
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **_engine_options(ASYNC_DATABASE_URL, async_driver=True))
+    # Objects stay loaded after commit; lazy loads are not possible outside a greenlet
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 # Create Base class
 Base = declarative_base()
 
@@ -30,4 +122,21 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# Dependency to get a DB session for read-only endpoints (served by a replica when configured)
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Dependency to get an async DB session (ASYNC_DATABASE_ENABLED only)
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def dispose_async_engine():
+    if async_engine is not None:
+        await async_engine.dispose()
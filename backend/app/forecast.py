@@ -0,0 +1,392 @@
+import math
+import os
+import threading
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+
+from . import models
+
+# Load environment variables
+load_dotenv()
+
+# Days of order history each model is fitted on
+FORECAST_HISTORY_DAYS = int(os.getenv("FORECAST_HISTORY_DAYS", "365"))
+# Seasonal cycle in days (7 = weekly pattern)
+FORECAST_SEASON_LENGTH = int(os.getenv("FORECAST_SEASON_LENGTH", "7"))
+# Holt-Winters smoothing factors for level, trend and season, and the trend damping
+FORECAST_ALPHA = float(os.getenv("FORECAST_ALPHA", "0.3"))
+FORECAST_BETA = float(os.getenv("FORECAST_BETA", "0.05"))
+FORECAST_GAMMA = float(os.getenv("FORECAST_GAMMA", "0.1"))
+FORECAST_DAMPING = float(os.getenv("FORECAST_DAMPING", "0.98"))
+# Supplier lead time used for reorder points when the request doesn't give one
+FORECAST_LEAD_TIME_DAYS = int(os.getenv("FORECAST_LEAD_TIME_DAYS", "7"))
+# z-score of the safety stock service level (1.65 ~ 95%)
+FORECAST_SERVICE_LEVEL_Z = float(os.getenv("FORECAST_SERVICE_LEVEL_Z", "1.65"))
+FORECAST_MAX_HORIZON_DAYS = int(os.getenv("FORECAST_MAX_HORIZON_DAYS", "365"))
+# SKUs per IN (...) list when refitting a subset
+FORECAST_REFIT_BATCH_SIZE = int(os.getenv("FORECAST_REFIT_BATCH_SIZE", "1000"))
+
+PERIOD_DAYS = {"day": 1, "week": 7, "month": 30}
+
+# Orders in these statuses are not demand
+EXCLUDED_STATUSES = ("cancelled",)
+
+
+def _daily_demand(db: Session, start: date, end: date, inventory_ids: Optional[List[int]] = None) -> List[tuple]:
+    """
+    Units ordered per (inventory_id, day) between start and end inclusive,
+    summed in the database
+    """
+    day = func.date(models.Order.order_date)
+    statement = (
+        select(models.OrderItem.inventory_id, day, func.sum(models.OrderItem.quantity))
+        .join(models.Order, models.Order.id == models.OrderItem.order_id)
+        .where(models.Order.order_date >= datetime.combine(start, datetime.min.time()))
+        .where(models.Order.order_date < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+        .where(func.coalesce(models.Order.status, "").notin_(EXCLUDED_STATUSES))
+        .where(models.OrderItem.inventory_id.isnot(None))
+        .group_by(models.OrderItem.inventory_id, day)
+    )
+    if inventory_ids is not None:
+        statement = statement.where(models.OrderItem.inventory_id.in_(inventory_ids))
+    return db.execute(statement).all()
+
+
+def _demand_columns(rows: List[tuple]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    (inventory_id, day, quantity) rows as id, day and quantity arrays
+    """
+    if not rows:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype="datetime64[D]"), np.zeros(0)
+    inventory_ids, day_values, quantities = zip(*rows)
+    # func.date() returns ISO strings on SQLite and dates on PostgreSQL; numpy parses both
+    return (
+        np.array(inventory_ids, dtype=np.int64),
+        np.array(day_values, dtype="datetime64[D]"),
+        np.nan_to_num(np.array(quantities, dtype=float)),
+    )
+
+
+def _demand_matrix(columns: Tuple[np.ndarray, np.ndarray, np.ndarray], start: date, days: int,
+                   index: Dict[int, int], size: int) -> np.ndarray:
+    """
+    Scatter demand columns into a SKU x day matrix; ids missing from `index`
+    and days outside the window are skipped
+    """
+    matrix = np.zeros((size, days))
+    inventory_ids, day_values, quantities = columns
+    if not len(inventory_ids) or not index:
+        return matrix
+    offsets = (day_values - np.datetime64(start, "D")).astype(np.int64)
+    keys = np.fromiter(index.keys(), dtype=np.int64, count=len(index))
+    positions = np.fromiter(index.values(), dtype=np.int64, count=len(index))
+    order = np.argsort(keys)
+    keys, positions = keys[order], positions[order]
+    found = np.minimum(np.searchsorted(keys, inventory_ids), len(keys) - 1)
+    valid = (keys[found] == inventory_ids) & (offsets >= 0) & (offsets < days)
+    np.add.at(matrix, (positions[found[valid]], offsets[valid]), quantities[valid])
+    return matrix
+
+
+class ModelStates:
+    """
+    Holt-Winters state for a set of SKUs, one row per SKU, so every update
+    and forecast is a handful of array operations over all SKUs at once.
+    """
+
+    def __init__(self, inventory_ids: List[int]):
+        size = len(inventory_ids)
+        self.inventory_ids = np.array(inventory_ids, dtype=np.int64)
+        self.level = np.zeros(size)
+        self.trend = np.zeros(size)
+        # Indexed by day.toordinal() % FORECAST_SEASON_LENGTH, so slots line up across updates
+        self.season = np.zeros((size, FORECAST_SEASON_LENGTH))
+        self.started = np.zeros(size, dtype=bool)
+        self.squared_error = np.zeros(size)
+        self.observations = np.zeros(size)
+
+    def _initialise(self, demand: np.ndarray, start: date):
+        """
+        Start each SKU's model at its first day with demand: level is the mean
+        of the first season from there, season the deviations from it
+        """
+        size, days = demand.shape
+        first_day = np.where(demand.any(axis=1), (demand > 0).argmax(axis=1), days)
+        offsets = np.minimum(first_day[:, None] + np.arange(FORECAST_SEASON_LENGTH), days - 1)
+        first_season = np.take_along_axis(demand, offsets, axis=1)
+        level = first_season.mean(axis=1)
+        slots = (start.toordinal() + offsets) % FORECAST_SEASON_LENGTH
+        season = np.zeros((size, FORECAST_SEASON_LENGTH))
+        np.put_along_axis(season, slots, first_season - level[:, None], axis=1)
+        return first_day, level, season
+
+    def fit(self, demand: np.ndarray, start: date):
+        """
+        Fit from scratch on a SKU x day demand matrix starting at `start`
+        """
+        first_day, level, season = self._initialise(demand, start)
+        self.level, self.season = level, season
+        self.trend = np.zeros(len(level))
+        self.started = np.zeros(len(level), dtype=bool)
+        self.squared_error = np.zeros(len(level))
+        self.observations = np.zeros(len(level))
+        self.advance(demand, start, first_day)
+
+    def advance(self, demand: np.ndarray, start: date, first_day: Optional[np.ndarray] = None):
+        """
+        Feed the next days of demand into the models. The loop runs over days;
+        each step updates every SKU with vectorised arithmetic.
+        """
+        rows = np.arange(len(self.level))
+        for offset in range(demand.shape[1]):
+            observed = demand[:, offset]
+            active = self.started if first_day is None else self.started | (first_day <= offset)
+            slot = (start.toordinal() + offset) % FORECAST_SEASON_LENGTH
+            seasonal = self.season[rows, slot]
+
+            prediction = self.level + FORECAST_DAMPING * self.trend + seasonal
+            level = FORECAST_ALPHA * (observed - seasonal) + (1 - FORECAST_ALPHA) * (self.level + FORECAST_DAMPING * self.trend)
+            trend = FORECAST_BETA * (level - self.level) + (1 - FORECAST_BETA) * FORECAST_DAMPING * self.trend
+            seasonal = FORECAST_GAMMA * (observed - level) + (1 - FORECAST_GAMMA) * seasonal
+
+            self.squared_error += np.where(active, (observed - prediction) ** 2, 0.0)
+            self.observations += active
+            self.level = np.where(active, level, self.level)
+            self.trend = np.where(active, trend, self.trend)
+            self.season[rows, slot] = np.where(active, seasonal, self.season[rows, slot])
+            self.started = active
+
+    def forecast(self, positions: np.ndarray, first_day: date, horizon_days: int) -> np.ndarray:
+        """
+        Daily point forecasts (SKU x horizon_days) from `first_day` on for the
+        SKUs at `positions`, never below zero
+        """
+        steps = np.arange(1, horizon_days + 1)
+        damping = np.cumsum(FORECAST_DAMPING ** steps)
+        slots = (first_day.toordinal() + steps - 1) % FORECAST_SEASON_LENGTH
+        values = (
+            self.level[positions, None]
+            + self.trend[positions, None] * damping[None, :]
+            + self.season[positions][:, slots]
+        )
+        return np.maximum(values, 0.0)
+
+    def residual_std(self) -> np.ndarray:
+        return np.sqrt(self.squared_error / np.maximum(self.observations, 1))
+
+    def take(self, keep: np.ndarray):
+        for name in ("inventory_ids", "level", "trend", "season", "started", "squared_error", "observations"):
+            setattr(self, name, getattr(self, name)[keep])
+
+    def extend(self, other: "ModelStates"):
+        for name in ("inventory_ids", "level", "trend", "season", "started", "squared_error", "observations"):
+            setattr(self, name, np.concatenate([getattr(self, name), getattr(other, name)]))
+
+
+class ForecastCache:
+    """
+    Fitted models for every SKU with order history, kept between requests.
+
+    Models are fitted through the last complete day. On each request only the
+    days since then are read and fed into the existing states; SKUs seen for
+    the first time, or marked stale by `invalidate`, are refitted on their own
+    history. A full fit only happens on the first request.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.states: Optional[ModelStates] = None
+        self.fitted_through: Optional[date] = None
+        self._index: Dict[int, int] = {}
+        self._stale: set = set()
+        self._stale_all = False
+        self.full_fits = 0
+        self.incremental_updates = 0
+        self.refitted_skus = 0
+
+    def invalidate(self, inventory_ids: Optional[Iterable[int]] = None):
+        """
+        Mark SKUs for refitting (all of them when no ids are given), e.g. when
+        an order's status change adds or removes demand already fitted
+        """
+        with self._lock:
+            if inventory_ids is None:
+                self._stale_all = True
+            else:
+                self._stale.update(inventory_id for inventory_id in inventory_ids if inventory_id is not None)
+
+    def _fit_subset(self, db: Session, inventory_ids: List[int], through: date) -> ModelStates:
+        start = through - timedelta(days=FORECAST_HISTORY_DAYS - 1)
+        states = ModelStates(inventory_ids)
+        index = {inventory_id: position for position, inventory_id in enumerate(inventory_ids)}
+        rows = []
+        for offset in range(0, len(inventory_ids), FORECAST_REFIT_BATCH_SIZE):
+            rows.extend(_daily_demand(db, start, through, inventory_ids[offset:offset + FORECAST_REFIT_BATCH_SIZE]))
+        states.fit(_demand_matrix(_demand_columns(rows), start, FORECAST_HISTORY_DAYS, index, len(inventory_ids)), start)
+        return states
+
+    def _full_fit(self, db: Session, through: date):
+        start = through - timedelta(days=FORECAST_HISTORY_DAYS - 1)
+        columns = _demand_columns(_daily_demand(db, start, through))
+        inventory_ids = np.unique(columns[0]).tolist()
+        index = {inventory_id: position for position, inventory_id in enumerate(inventory_ids)}
+        states = ModelStates(inventory_ids)
+        states.fit(_demand_matrix(columns, start, FORECAST_HISTORY_DAYS, index, len(inventory_ids)), start)
+        self.states = states
+        self._index = index
+        self.full_fits += 1
+
+    def _update(self, db: Session, through: date):
+        start = self.fitted_through + timedelta(days=1)
+        columns = _demand_columns(_daily_demand(db, start, through) if start <= through else [])
+
+        new_ids = set(np.unique(columns[0][~np.isin(columns[0], self.states.inventory_ids)]).tolist())
+        # Stale SKUs without a model yet (e.g. their only order was reinstated) are fitted too
+        refit_ids = sorted(new_ids | self._stale)
+        if refit_ids:
+            # Refitted SKUs are dropped here and re-added already fitted through `through`
+            keep = ~np.isin(self.states.inventory_ids, refit_ids)
+            self.states.take(keep)
+            self._index = {int(inventory_id): position for position, inventory_id in enumerate(self.states.inventory_ids)}
+
+        if start <= through:
+            days = (through - start).days + 1
+            self.states.advance(_demand_matrix(columns, start, days, self._index, len(self._index)), start)
+            self.incremental_updates += 1
+
+        if refit_ids:
+            self.states.extend(self._fit_subset(db, refit_ids, through))
+            self._index = {int(inventory_id): position for position, inventory_id in enumerate(self.states.inventory_ids)}
+            self.refitted_skus += len(refit_ids)
+
+    def _refresh(self, db: Session):
+        """
+        Bring the models up to the end of yesterday. Caller holds the lock.
+        """
+        through = datetime.utcnow().date() - timedelta(days=1)
+        if self.states is None or self._stale_all or self.fitted_through > through:
+            self._full_fit(db, through)
+        elif self.fitted_through < through or self._stale:
+            self._update(db, through)
+        self.fitted_through = through
+        self._stale = set()
+        self._stale_all = False
+
+    def predict(self, db: Session, inventory_ids: List[int], days: int):
+        """
+        Refresh the models, then forecast `days` days of demand for each id
+        from today on. Returns (fitted_through, daily forecasts, residual
+        standard deviations, days of history); ids without a model get zeros.
+        """
+        with self._lock:
+            self._refresh(db)
+            positions = np.array([self._index.get(inventory_id, -1) for inventory_id in inventory_ids], dtype=np.int64)
+            modelled = positions >= 0
+            daily = np.zeros((len(inventory_ids), days))
+            sigma = np.zeros(len(inventory_ids))
+            observations = np.zeros(len(inventory_ids))
+            if modelled.any():
+                selected = positions[modelled]
+                # Forecasts start today; today's partial demand is not in the models yet
+                daily[modelled] = self.states.forecast(selected, self.fitted_through + timedelta(days=1), days)
+                sigma[modelled] = self.states.residual_std()[selected]
+                observations[modelled] = self.states.observations[selected]
+            return self.fitted_through, daily, sigma, observations
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "skus": len(self._index),
+            "fitted_through": self.fitted_through.isoformat() if self.fitted_through else None,
+            "full_fits": self.full_fits,
+            "incremental_updates": self.incremental_updates,
+            "refitted_skus": self.refitted_skus,
+        }
+
+
+forecast_cache = ForecastCache()
+
+
+def invalidate_items(inventory_ids: Optional[Iterable[int]] = None):
+    forecast_cache.invalidate(inventory_ids)
+
+
+def get_forecasts(db: Session, inventory_ids: Optional[List[int]] = None, category: Optional[str] = None,
+                  horizon: int = 30, period_type: str = "day", lead_time_days: Optional[int] = None,
+                  include_periods: bool = True) -> Dict[str, Any]:
+    """
+    Demand forecasts and reorder recommendations per inventory item.
+
+    Daily demand is forecast with damped additive Holt-Winters smoothing
+    (seasonal cycle FORECAST_SEASON_LENGTH days) and summed into `horizon`
+    periods of `period_type`. The recommended order brings stock up to the
+    forecast demand over lead time plus horizon, plus safety stock. Items with
+    no orders in the history window forecast zero demand.
+    """
+    if period_type not in PERIOD_DAYS:
+        raise ValueError(f"Unsupported period_type '{period_type}'. Supported: {', '.join(PERIOD_DAYS)}")
+    if horizon < 1:
+        raise ValueError("horizon must be at least 1")
+    horizon_days = horizon * PERIOD_DAYS[period_type]
+    if horizon_days > FORECAST_MAX_HORIZON_DAYS:
+        raise ValueError(f"Forecast horizon may be at most {FORECAST_MAX_HORIZON_DAYS} days")
+    lead_time_days = FORECAST_LEAD_TIME_DAYS if lead_time_days is None else lead_time_days
+    if lead_time_days < 0:
+        raise ValueError("lead_time_days must not be negative")
+
+    items_query = db.query(
+        models.Inventory.id, models.Inventory.product_name, models.Inventory.category, models.Inventory.quantity
+    )
+    if inventory_ids:
+        items_query = items_query.filter(models.Inventory.id.in_(inventory_ids))
+    if category is not None:
+        items_query = items_query.filter(models.Inventory.category == category)
+    items = items_query.order_by(models.Inventory.id).all()
+
+    fitted_through, daily, sigma, observations = forecast_cache.predict(
+        db, [item.id for item in items], lead_time_days + horizon_days
+    )
+
+    lead_demand = daily[:, :lead_time_days].sum(axis=1)
+    horizon_daily = daily[:, lead_time_days:]
+    horizon_demand = horizon_daily.sum(axis=1)
+    period_demand = horizon_daily.reshape(len(items), horizon, PERIOD_DAYS[period_type]).sum(axis=2)
+    safety_stock = FORECAST_SERVICE_LEVEL_Z * sigma * math.sqrt(max(lead_time_days, 1))
+    horizon_spread = FORECAST_SERVICE_LEVEL_Z * sigma * math.sqrt(horizon_days)
+    reorder_point = lead_demand + safety_stock
+    stock = np.array([item.quantity or 0 for item in items], dtype=float)
+    recommended = np.maximum(np.ceil(lead_demand + horizon_demand + safety_stock - stock), 0)
+
+    forecasts = []
+    for position, item in enumerate(items):
+        entry = {
+            "inventory_id": item.id,
+            "product_name": item.product_name,
+            "category": item.category,
+            "current_stock": int(stock[position]),
+            "forecast_demand": round(float(horizon_demand[position]), 2),
+            "forecast_lower": round(float(max(horizon_demand[position] - horizon_spread[position], 0.0)), 2),
+            "forecast_upper": round(float(horizon_demand[position] + horizon_spread[position]), 2),
+            "lead_time_demand": round(float(lead_demand[position]), 2),
+            "safety_stock": round(float(safety_stock[position]), 2),
+            "reorder_point": round(float(reorder_point[position]), 2),
+            "reorder_now": bool(stock[position] <= reorder_point[position] and reorder_point[position] > 0),
+            "recommended_order_quantity": int(recommended[position]),
+            "history_days": int(observations[position]),
+        }
+        if include_periods:
+            entry["periods"] = [round(float(value), 2) for value in period_demand[position]]
+        forecasts.append(entry)
+
+    return {
+        "generated_at": datetime.utcnow().isoformat(),
+        "fitted_through": fitted_through.isoformat(),
+        "horizon": horizon,
+        "period_type": period_type,
+        "lead_time_days": lead_time_days,
+        "forecasts": forecasts,
+    }
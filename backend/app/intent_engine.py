@@ -0,0 +1,421 @@
+import os
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Pattern, Set, Tuple
+
+from sqlalchemy import text
+from dotenv import load_dotenv
+
+from .database import engine
+
+# Load environment variables
+load_dotenv()
+
+# Matches at or above this confidence are answered without calling the LLM
+INTENT_ROUTER_MIN_CONFIDENCE = float(os.getenv("INTENT_ROUTER_MIN_CONFIDENCE", "0.8"))
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Spelling variants folded onto one token before matching
+_SYNONYMS = {
+    "canceled": "cancelled",
+    "cancel": "cancelled",
+    "complete": "completed",
+    "done": "completed",
+    "vendor": "supplier",
+    "provider": "supplier",
+    "product": "item",
+    "sku": "item",
+    "purchase": "order",
+    "account": "user",
+    "priciest": "expensive",
+    "cheapest": "cheap",
+}
+
+
+def tokenize(query_text: str) -> List[str]:
+    """
+    Lower-case, split into word tokens, fold plurals and synonyms
+    """
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(query_text.lower()):
+        if token.endswith("ies") and len(token) > 4:
+            token = token[:-3] + "y"
+        elif token.endswith("s") and not token.endswith(("ss", "us")) and len(token) > 3:
+            token = token[:-1]
+        tokens.append(_SYNONYMS.get(token, token))
+    return tokens
+
+
+# Words that carry no intent; they never lower a match's confidence. Aggregate
+# words ("how many", "how much") are left out so only counting rules explain them.
+STOPWORDS = frozenset(tokenize(
+    "a an the of for to in on at by with from all any me my our us show list get give find display "
+    "what which who whose is are was were be have has do does there that this these those "
+    "please can could would i we you it its and or each every per"
+))
+
+
+@dataclass
+class ParamExtractor:
+    """
+    Pulls one named parameter out of the question with a precompiled regex
+    """
+    name: str
+    pattern: Pattern
+    convert: Callable[[str], Any] = str
+
+    def extract(self, query_text: str) -> Optional[Tuple[Any, Tuple[int, int]]]:
+        found = self.pattern.search(query_text)
+        if not found:
+            return None
+        return self.convert(found.group(1)), found.span()
+
+
+@dataclass
+class IntentRule:
+    """
+    A question shape mapped to a parameterized SQL template.
+
+    A rule applies when the question contains at least one of `entity` and at
+    least one token from every set in `requires`. Extracted parameters listed in
+    `filters` add their WHERE clause to `sql`; `defaults` supply parameters that
+    the template always needs.
+    """
+    name: str
+    entity: FrozenSet[str]
+    sql: str
+    requires: Tuple[FrozenSet[str], ...] = ()
+    boosts: FrozenSet[str] = frozenset()
+    filters: Dict[str, str] = field(default_factory=dict)
+    defaults: Dict[str, Any] = field(default_factory=dict)
+    where: Optional[str] = None
+    group_by: Optional[str] = None
+    order_by: Optional[str] = None
+    limit: Optional[int] = None
+    priority: float = 0.0
+    vocabulary: FrozenSet[str] = field(init=False)
+
+    def __post_init__(self):
+        words = set(self.entity) | set(self.boosts)
+        for group in self.requires:
+            words |= group
+        self.vocabulary = frozenset(words)
+
+    def accepts(self, param_name: str) -> bool:
+        if param_name == "limit":
+            return self.limit is not None
+        return param_name in self.filters or param_name in self.defaults
+
+
+@dataclass
+class IntentMatch:
+    intent: str
+    sql: str
+    params: Dict[str, Any]
+    confidence: float
+
+
+class IntentEngine:
+    """
+    Token-indexed intent matcher. Rules are compiled into an inverted index at
+    registration, so matching a question only evaluates rules sharing a token
+    with it.
+    """
+
+    def __init__(self, extractors: Iterable[ParamExtractor] = ()):
+        self.rules: List[IntentRule] = []
+        self.extractors: List[ParamExtractor] = list(extractors)
+        self._index: Dict[str, Set[int]] = {}
+        # Rendering compiles SQL through the dialect; repeat questions reuse it
+        self._render_cached = lru_cache(maxsize=1024)(self._render_key)
+
+    def register(self, rule: IntentRule) -> None:
+        rule_id = len(self.rules)
+        self.rules.append(rule)
+        for token in rule.vocabulary:
+            self._index.setdefault(token, set()).add(rule_id)
+
+    def add_extractor(self, extractor: ParamExtractor) -> None:
+        self.extractors.append(extractor)
+
+    def extract_params(self, query_text: str) -> Tuple[Dict[str, Any], str]:
+        """
+        Return the extracted parameters and the question with their spans removed
+        """
+        lowered = query_text.lower()
+        params: Dict[str, Any] = {}
+        spans = []
+        for extractor in self.extractors:
+            if extractor.name in params:
+                continue
+            extracted = extractor.extract(lowered)
+            if extracted is not None:
+                params[extractor.name], span = extracted
+                spans.append(span)
+
+        remainder = lowered
+        for start, end in sorted(spans, reverse=True):
+            remainder = remainder[:start] + " " + remainder[end:]
+        return params, remainder
+
+    def match(self, query_text: str) -> Optional[IntentMatch]:
+        params, remainder = self.extract_params(query_text)
+        tokens = set(tokenize(query_text))
+
+        candidates: Set[int] = set()
+        for token in tokens:
+            candidates |= self._index.get(token, set())
+
+        best_id = None
+        best_score = 0.0
+        for rule_id in sorted(candidates):
+            rule = self.rules[rule_id]
+            if not tokens & rule.entity:
+                continue
+            if any(not tokens & group for group in rule.requires):
+                continue
+            accepted = [name for name in params if rule.accepts(name)]
+            score = (
+                1.0
+                + len(rule.requires)
+                + 0.5 * len(accepted)
+                + 0.25 * len(tokens & rule.boosts)
+                + rule.priority
+            )
+            if score > best_score:
+                best_id, best_score = rule_id, score
+
+        if best_id is None:
+            return None
+
+        best = self.rules[best_id]
+        rule_params = {**best.defaults, **{name: value for name, value in params.items() if best.accepts(name)}}
+        return IntentMatch(
+            intent=best.name,
+            sql=self._render_cached(best_id, tuple(sorted(rule_params.items()))),
+            params=rule_params,
+            confidence=self._confidence(best, remainder, params),
+        )
+
+    def _render_key(self, rule_id: int, param_items: Tuple[Tuple[str, Any], ...]) -> str:
+        return self.render(self.rules[rule_id], dict(param_items))
+
+    def render(self, rule: IntentRule, params: Dict[str, Any]) -> str:
+        """
+        Build the rule's SQL and inline the bound parameters, quoted by the
+        database dialect, so the result can flow through the text-based pipeline
+        """
+        clauses = [rule.where] if rule.where else []
+        clauses += [clause for name, clause in rule.filters.items() if name in params]
+
+        sql = rule.sql
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        if rule.group_by:
+            sql += " GROUP BY " + rule.group_by
+        if rule.order_by:
+            sql += " ORDER BY " + rule.order_by
+        limit = params.get("limit", rule.limit)
+        if limit:
+            sql += " LIMIT :limit"
+            params = {**params, "limit": limit}
+
+        statement = text(sql).bindparams(**{name: value for name, value in params.items() if f":{name}" in sql})
+        compiled = statement.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True})
+        return str(compiled) + ";"
+
+    def _confidence(self, rule: IntentRule, remainder: str, params: Dict[str, Any]) -> float:
+        """
+        Share of the question's meaningful tokens that the rule accounts for.
+        Tokens consumed by a parameter the rule cannot use count against it, as
+        do numbers no parameter consumed (e.g. an id the rule cannot filter on).
+        """
+        content = [token for token in tokenize(remainder) if token not in STOPWORDS]
+        explained = sum(1 for token in content if token in rule.vocabulary)
+        ignored_params = sum(1 for name in params if not rule.accepts(name))
+        total = len(content) + ignored_params
+        if total == 0:
+            return 1.0
+        return round(explained / total, 3)
+
+
+def _pattern(expression: str) -> Pattern:
+    return re.compile(expression, re.IGNORECASE)
+
+
+_STOP_LOOKAHEAD = r"(?=\s+(?:with|and|that|which|under|below|over|above|less|more|fewer|from|in|at|by|sorted|ordered)\b|[?.!,;]|$)"
+
+DEFAULT_EXTRACTORS = [
+    ParamExtractor("max_quantity", _pattern(r"(?:under|below|less than|fewer than|<)\s*(\d+)\s*(?:units?|items?|pieces?|pcs)\b"), int),
+    ParamExtractor("max_quantity", _pattern(r"(?:quantity|stock)\s+(?:under|below|less than|<)\s*(\d+)"), int),
+    ParamExtractor("min_quantity", _pattern(r"(?:over|above|more than|at least|>)\s*(\d+)\s*(?:units?|items?|pieces?|pcs)\b"), int),
+    ParamExtractor("min_quantity", _pattern(r"(?:quantity|stock)\s+(?:over|above|more than|>)\s*(\d+)"), int),
+    ParamExtractor("max_price", _pattern(r"(?:under|below|less than|cheaper than|<)\s*\$\s*(\d+(?:\.\d+)?)"), float),
+    ParamExtractor("max_price", _pattern(r"(?:price|cost)\s+(?:under|below|less than|<)\s*\$?\s*(\d+(?:\.\d+)?)"), float),
+    ParamExtractor("min_price", _pattern(r"(?:over|above|more than|>)\s*\$\s*(\d+(?:\.\d+)?)"), float),
+    ParamExtractor("min_price", _pattern(r"(?:price|cost)\s+(?:over|above|more than|>)\s*\$?\s*(\d+(?:\.\d+)?)"), float),
+    ParamExtractor("category", _pattern(r"(?:in\s+)?(?:the\s+)?category\s+['\"]?([a-z0-9][\w &-]*?)['\"]?" + _STOP_LOOKAHEAD), str.strip),
+    ParamExtractor("location", _pattern(r"(?:in|at)\s+(warehouse\s+[a-z0-9]+)"), lambda value: f"%{value.strip()}%"),
+    ParamExtractor("location", _pattern(r"location\s+['\"]?([a-z0-9][\w &-]*?)['\"]?" + _STOP_LOOKAHEAD), lambda value: f"%{value.strip()}%"),
+    ParamExtractor("supplier_id", _pattern(r"(?:supplier|vendor|provider)\s*(?:id\s*)?#?\s*(\d+)"), int),
+    ParamExtractor("order_id", _pattern(r"order\s*(?:id\s*)?#?\s*(\d+)"), int),
+    ParamExtractor("inventory_id", _pattern(r"\b(?:item|product|sku)\s*(?:id\s*)?#?\s*(\d+)\b"), int),
+    ParamExtractor("status", _pattern(r"\b(pending|completed|cancell?ed)\b"), lambda value: "cancelled" if value.startswith("cancel") else value),
+    ParamExtractor("limit", _pattern(r"\b(?:top|first|last)\s+(\d+)\b"), int),
+]
+
+_INVENTORY = frozenset({"inventory", "item", "stock", "quantity"})
+_COUNT = frozenset({"many", "count", "number"})
+_INVENTORY_FILTERS = {
+    "max_quantity": "quantity < :max_quantity",
+    "min_quantity": "quantity > :min_quantity",
+    "max_price": "unit_price < :max_price",
+    "min_price": "unit_price > :min_price",
+    "category": "LOWER(category) = :category",
+    "location": "LOWER(location) LIKE :location",
+    "inventory_id": "id = :inventory_id",
+}
+_ORDER_FILTERS = {
+    "status": "status = :status",
+    "supplier_id": "supplier_id = :supplier_id",
+    "min_price": "total_amount > :min_price",
+    "max_price": "total_amount < :max_price",
+}
+
+DEFAULT_RULES = [
+    IntentRule(
+        name="low_stock",
+        entity=_INVENTORY,
+        requires=(frozenset({"low", "out", "running", "reorder", "short"}),),
+        sql="SELECT * FROM inventory",
+        filters={name: clause for name, clause in _INVENTORY_FILTERS.items() if name != "max_quantity"},
+        where="quantity < :max_quantity",
+        defaults={"max_quantity": 10},
+        order_by="quantity ASC",
+    ),
+    IntentRule(
+        name="expensive_inventory",
+        entity=_INVENTORY,
+        requires=(frozenset({"expensive", "highest", "costliest"}),),
+        boosts=frozenset({"price"}),
+        sql="SELECT * FROM inventory",
+        filters=_INVENTORY_FILTERS,
+        order_by="unit_price DESC",
+        limit=10,
+    ),
+    IntentRule(
+        name="cheap_inventory",
+        entity=_INVENTORY,
+        requires=(frozenset({"cheap", "lowest", "inexpensive"}),),
+        boosts=frozenset({"price"}),
+        sql="SELECT * FROM inventory",
+        filters=_INVENTORY_FILTERS,
+        order_by="unit_price ASC",
+        limit=10,
+        priority=0.1,
+    ),
+    IntentRule(
+        name="inventory_by_category",
+        entity=_INVENTORY | {"category"},
+        requires=(frozenset({"category"}), frozenset({"count", "total", "summary", "breakdown", "group", "value"})),
+        sql="SELECT category, COUNT(*) AS item_count, SUM(quantity) AS total_quantity, "
+            "SUM(quantity * unit_price) AS stock_value FROM inventory",
+        filters={name: clause for name, clause in _INVENTORY_FILTERS.items() if name != "category"},
+        group_by="category",
+        order_by="stock_value DESC",
+        priority=0.5,
+    ),
+    IntentRule(
+        name="inventory_count",
+        entity=_INVENTORY,
+        requires=(_COUNT,),
+        boosts=frozenset({"how"}),
+        sql="SELECT COUNT(*) AS item_count, SUM(quantity) AS total_quantity FROM inventory",
+        filters={name: clause for name, clause in _INVENTORY_FILTERS.items() if name != "inventory_id"},
+    ),
+    IntentRule(
+        name="inventory_list",
+        entity=_INVENTORY,
+        sql="SELECT * FROM inventory",
+        filters=_INVENTORY_FILTERS,
+        limit=20,
+    ),
+    IntentRule(
+        name="active_suppliers",
+        entity=frozenset({"supplier"}),
+        requires=(frozenset({"active"}),),
+        sql="SELECT * FROM suppliers",
+        where="is_active = TRUE",
+    ),
+    IntentRule(
+        name="supplier_list",
+        entity=frozenset({"supplier"}),
+        sql="SELECT * FROM suppliers",
+        filters={"supplier_id": "id = :supplier_id"},
+        limit=20,
+    ),
+    IntentRule(
+        name="supplier_spend",
+        entity=frozenset({"supplier"}),
+        requires=(frozenset({"spend", "spent", "total", "value", "top", "biggest", "largest"}),),
+        boosts=frozenset({"order"}),
+        sql="SELECT s.id, s.name, COUNT(o.id) AS order_count, SUM(o.total_amount) AS total_spend "
+            "FROM suppliers s JOIN orders o ON o.supplier_id = s.id",
+        filters={"status": "o.status = :status"},
+        group_by="s.id, s.name",
+        order_by="total_spend DESC",
+        limit=10,
+        priority=0.5,
+    ),
+    IntentRule(
+        name="order_items",
+        entity=frozenset({"order"}),
+        requires=(frozenset({"line", "item", "content", "detail"}),),
+        sql="SELECT * FROM order_items",
+        filters={"order_id": "order_id = :order_id"},
+        priority=0.25,
+    ),
+    IntentRule(
+        name="order_count",
+        entity=frozenset({"order"}),
+        requires=(_COUNT,),
+        boosts=frozenset({"how"}),
+        sql="SELECT COUNT(*) AS order_count, SUM(total_amount) AS total_amount FROM orders",
+        filters=_ORDER_FILTERS,
+        priority=0.5,
+    ),
+    IntentRule(
+        name="order_list",
+        entity=frozenset({"order"}),
+        boosts=frozenset({"pending", "completed", "cancelled", "recent", "latest"}),
+        sql="SELECT * FROM orders",
+        filters={**_ORDER_FILTERS, "order_id": "id = :order_id"},
+        order_by="order_date DESC",
+        limit=20,
+        priority=0.5,
+    ),
+    IntentRule(
+        name="user_list",
+        entity=frozenset({"user"}),
+        boosts=frozenset({"active"}),
+        sql="SELECT id, email, full_name, is_active FROM users",
+        limit=20,
+    ),
+]
+
+
+def build_default_engine() -> IntentEngine:
+    intent_engine = IntentEngine(DEFAULT_EXTRACTORS)
+    for rule in DEFAULT_RULES:
+        intent_engine.register(rule)
+    return intent_engine
+
+
+# Shared engine used by the natural language query pipeline
+default_engine = build_default_engine()
+
+
+def match_intent(query_text: str) -> Optional[IntentMatch]:
+    return default_engine.match(query_text)
@@ -0,0 +1,291 @@
+import asyncio
+import os
+import threading
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_, func, insert, or_, select
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+
+from . import models, query_cache
+from .database import Base, SessionLocal, engine
+
+# Load environment variables
+load_dotenv()
+
+# Seconds between checkpoint runs; bounds how many deltas a lookup sums
+INVENTORY_HISTORY_CHECKPOINT_SECONDS = int(os.getenv("INVENTORY_HISTORY_CHECKPOINT_SECONDS", "86400"))
+
+BUCKETS = {
+    "hour": lambda moment: moment.replace(minute=0, second=0, microsecond=0),
+    "day": lambda moment: moment.replace(hour=0, minute=0, second=0, microsecond=0),
+}
+
+_checkpoint_lock = threading.Lock()
+_checkpoint_task: Optional[asyncio.Task] = None
+
+History = models.InventoryHistory
+
+
+def _location(location: Optional[str]) -> str:
+    return location or ""
+
+
+class StockChanges:
+    """
+    Stock changes made by one transaction, written as delta rows with write()
+    before the caller commits so history and stock always commit together
+    """
+
+    def __init__(self):
+        self.rows: List[dict] = []
+
+    def add(self, inventory_id: int, location: Optional[str], delta: int, reason: str, order_id: Optional[int] = None):
+        if delta:
+            self.rows.append({
+                "inventory_id": inventory_id,
+                "location": _location(location),
+                "delta": delta,
+                "reason": reason,
+                "order_id": order_id,
+            })
+
+    def add_update(self, inventory_id: int, old_location: Optional[str], old_quantity: Optional[int],
+                   new_location: Optional[str], new_quantity: Optional[int]):
+        """
+        A quantity and/or location edit; a move is stock leaving one location
+        and arriving at the other
+        """
+        old_quantity, new_quantity = old_quantity or 0, new_quantity or 0
+        if _location(old_location) == _location(new_location):
+            self.add(inventory_id, new_location, new_quantity - old_quantity, "adjustment")
+        else:
+            self.add(inventory_id, old_location, -old_quantity, "move")
+            self.add(inventory_id, new_location, new_quantity, "move")
+
+    def write(self, db: Session):
+        if not self.rows:
+            return
+        recorded_at = datetime.utcnow()
+        # Executed as multi-row INSERT ... VALUES batches by SQLAlchemy
+        db.execute(insert(History), [{**row, "recorded_at": recorded_at, "is_checkpoint": False} for row in self.rows])
+
+
+def _balances(db: Session, at: Optional[datetime] = None, inventory_id: Optional[int] = None,
+              location: Optional[str] = None) -> Dict[Tuple[int, str], Tuple[int, int]]:
+    """
+    Stock per (inventory_id, location) at `at` (now when None) as
+    (quantity, deltas since the last checkpoint): the latest checkpoint's
+    quantity plus the deltas recorded after it. Two grouped index range scans.
+    """
+    def scoped(statement):
+        if inventory_id is not None:
+            statement = statement.where(History.inventory_id == inventory_id)
+        if location is not None:
+            statement = statement.where(History.location == location)
+        if at is not None:
+            statement = statement.where(History.recorded_at <= at)
+        return statement
+
+    latest = scoped(
+        select(History.inventory_id, History.location, func.max(History.recorded_at).label("recorded_at"))
+        .where(History.is_checkpoint.is_(True))
+        .group_by(History.inventory_id, History.location)
+    ).subquery()
+
+    balances: Dict[Tuple[int, str], List[int]] = {}
+    checkpoints = db.execute(
+        select(History.inventory_id, History.location, History.quantity)
+        .join(latest, and_(
+            History.inventory_id == latest.c.inventory_id,
+            History.location == latest.c.location,
+            History.recorded_at == latest.c.recorded_at,
+        ))
+        .where(History.is_checkpoint.is_(True))
+    )
+    for row in checkpoints:
+        balances[(row.inventory_id, row.location)] = [row.quantity or 0, 0]
+
+    deltas = db.execute(scoped(
+        select(History.inventory_id, History.location, func.sum(History.delta), func.count())
+        .outerjoin(latest, and_(History.inventory_id == latest.c.inventory_id, History.location == latest.c.location))
+        .where(History.is_checkpoint.is_(False))
+        .where(or_(latest.c.recorded_at.is_(None), History.recorded_at > latest.c.recorded_at))
+        .group_by(History.inventory_id, History.location)
+    ))
+    for item_id, item_location, total, count in deltas:
+        balance = balances.setdefault((item_id, item_location), [0, 0])
+        balance[0] += int(total or 0)
+        balance[1] += count
+    return {key: (quantity, count) for key, (quantity, count) in balances.items()}
+
+
+def checkpoint(db: Session) -> int:
+    """
+    Write a checkpoint for every (item, location) with deltas since its last
+    one, or whose recorded stock no longer matches the inventory table
+    (bulk imports and other writes that bypass the CRUD layer). A change
+    racing with a checkpoint is reconciled by the next one. Returns the
+    number of checkpoints written.
+    """
+    with _checkpoint_lock:
+        try:
+            balances = _balances(db)
+            current = {
+                (row.id, _location(row.location)): row.quantity or 0
+                for row in db.query(models.Inventory.id, models.Inventory.location, models.Inventory.quantity)
+            }
+            recorded_at = datetime.utcnow()
+            rows = []
+            for key in set(current) | set(balances):
+                quantity = current.get(key, 0)
+                recorded, pending = balances.get(key, (None, 0))
+                if recorded != quantity or pending:
+                    rows.append({
+                        "inventory_id": key[0],
+                        "location": key[1],
+                        "recorded_at": recorded_at,
+                        "is_checkpoint": True,
+                        "delta": 0,
+                        "quantity": quantity,
+                        "reason": "checkpoint",
+                    })
+            if rows:
+                db.execute(insert(History), rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+    if rows:
+        query_cache.invalidate_tables(History.__tablename__)
+    return len(rows)
+
+
+def checkpoint_safely():
+    db = SessionLocal()
+    try:
+        written = checkpoint(db)
+        if written:
+            print(f"Wrote {written} inventory history checkpoints")
+    except Exception as e:
+        print(f"Could not checkpoint inventory history: {str(e)}")
+    finally:
+        db.close()
+
+
+def warm_up() -> None:
+    """
+    Create the inventory_history table if missing and checkpoint current
+    stock, so history starts from a known quantity for every item
+    """
+    try:
+        Base.metadata.create_all(bind=engine, tables=[History.__table__])
+    except Exception as e:
+        print(f"Could not prepare inventory history: {str(e)}")
+        return
+    checkpoint_safely()
+
+
+async def _checkpoint_periodically():
+    while True:
+        await asyncio.sleep(INVENTORY_HISTORY_CHECKPOINT_SECONDS)
+        await run_in_threadpool(checkpoint_safely)
+
+
+def start_checkpointer():
+    global _checkpoint_task
+    if _checkpoint_task is None and INVENTORY_HISTORY_CHECKPOINT_SECONDS > 0:
+        _checkpoint_task = asyncio.get_running_loop().create_task(_checkpoint_periodically())
+
+
+def stop_checkpointer():
+    global _checkpoint_task
+    if _checkpoint_task is not None:
+        _checkpoint_task.cancel()
+        _checkpoint_task = None
+
+
+def _tracked_since(db: Session, inventory_id: int, location: Optional[str]) -> Optional[datetime]:
+    statement = select(func.min(History.recorded_at)).where(History.inventory_id == inventory_id)
+    if location is not None:
+        statement = statement.where(History.location == location)
+    return db.execute(statement).scalar()
+
+
+def get_stock_at(db: Session, inventory_id: int, at: datetime, location: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Stock of an item at time `at`, at one location or summed over all of
+    them. quantity is None before the item's history starts.
+    """
+    tracked_since = _tracked_since(db, inventory_id, location)
+    quantity = None
+    if tracked_since is not None and at >= tracked_since:
+        balances = _balances(db, at=at, inventory_id=inventory_id, location=location)
+        quantity = sum(balance for balance, _ in balances.values())
+    return {
+        "inventory_id": inventory_id,
+        "location": location,
+        "at": at,
+        "quantity": quantity,
+        "tracked_since": tracked_since,
+    }
+
+
+def get_stock_curve(db: Session, inventory_id: int, start: datetime, end: datetime,
+                    location: Optional[str] = None, bucket: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Stock of an item over [start, end]: the opening quantity and a point for
+    every change, or the closing quantity of each hour/day with `bucket`.
+    Reads one checkpoint per location plus the rows inside the range.
+    """
+    if start >= end:
+        raise ValueError("start must be before end")
+    if bucket is not None and bucket not in BUCKETS:
+        raise ValueError(f"Unsupported bucket '{bucket}'. Supported: {', '.join(BUCKETS)}")
+
+    tracked_since = _tracked_since(db, inventory_id, location)
+    levels = defaultdict(int)
+    for (_, item_location), (quantity, _) in _balances(db, at=start, inventory_id=inventory_id, location=location).items():
+        levels[item_location] = quantity
+    opening = sum(levels.values())
+
+    statement = (
+        select(History.recorded_at, History.location, History.is_checkpoint, History.delta, History.quantity)
+        .where(History.inventory_id == inventory_id)
+        .where(History.recorded_at > start, History.recorded_at <= end)
+        .order_by(History.recorded_at, History.id)
+    )
+    if location is not None:
+        statement = statement.where(History.location == location)
+
+    points = []
+    total = opening
+    for row in db.execute(statement):
+        if row.is_checkpoint:
+            levels[row.location] = row.quantity or 0
+        else:
+            levels[row.location] += row.delta
+        new_total = sum(levels.values())
+        if row.is_checkpoint and new_total == total:
+            continue
+        total = new_total
+        timestamp = BUCKETS[bucket](row.recorded_at) if bucket else row.recorded_at
+        # Rows of one transaction (e.g. both sides of a move) share a timestamp
+        if points and points[-1]["timestamp"] == timestamp:
+            points[-1]["quantity"] = total
+        else:
+            points.append({"timestamp": timestamp, "quantity": total})
+
+    return {
+        "inventory_id": inventory_id,
+        "location": location,
+        "start": start,
+        "end": end,
+        "tracked_since": tracked_since,
+        "opening_quantity": opening if tracked_since is not None and tracked_since <= start else None,
+        "closing_quantity": total,
+        "points": points,
+    }
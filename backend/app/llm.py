@@ -0,0 +1,125 @@
+import asyncio
+import os
+import threading
+from typing import Optional
+
+import httpx
+from dotenv import load_dotenv
+from openai import AzureOpenAI, AsyncAzureOpenAI
+
+# Load environment variables
+load_dotenv()
+
+# Get Azure OpenAI configuration from environment variables
+azure_api_key = os.getenv("AZURE_OPENAI_API_KEY", "Get This From Azure")
+azure_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT", "https://test-aipractice-openai.openai.azure.com/")
+azure_deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-35-turbo-16k")
+azure_api_version = os.getenv("AZURE_OPENAI_API_VERSION", "2023-05-15")  # Updated to a stable version
+
+# LLM concurrency settings: cap in-flight completions per worker and bound each call
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "20"))
+
+# HTTP connection pool shared by every request to the Azure OpenAI endpoint
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "10"))
+LLM_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("LLM_KEEPALIVE_EXPIRY_SECONDS", "60"))
+LLM_WARMUP_PING = os.getenv("LLM_WARMUP_PING", "true").lower() in ("1", "true", "yes")
+
+LLM_COMPLETION_PARAMS = {
+    "temperature": 0.1,  # Lower temperature for more deterministic outputs
+    "max_tokens": 500,
+    "top_p": 0.95,
+    "frequency_penalty": 0,
+    "presence_penalty": 0,
+    "stop": None,
+    "stream": False
+}
+
+llm_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+_client: Optional[AzureOpenAI] = None
+_async_client: Optional[AsyncAzureOpenAI] = None
+_client_lock = threading.Lock()
+
+
+def is_llm_configured() -> bool:
+    return bool(azure_api_key) and azure_api_key != "your-azure-openai-api-key"
+
+
+def _http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY_SECONDS
+    )
+
+
+def get_client() -> AzureOpenAI:
+    """
+    Return the process-wide sync Azure OpenAI client, building it on first use
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = AzureOpenAI(
+                    api_key=azure_api_key,
+                    azure_endpoint=azure_endpoint,
+                    api_version=azure_api_version,
+                    timeout=LLM_TIMEOUT_SECONDS,
+                    http_client=httpx.Client(limits=_http_limits(), timeout=LLM_TIMEOUT_SECONDS)
+                )
+                print("Azure OpenAI client initialized successfully")
+    return _client
+
+
+def get_async_client() -> AsyncAzureOpenAI:
+    """
+    Return the process-wide async Azure OpenAI client, building it on first use
+    """
+    global _async_client
+    if _async_client is None:
+        with _client_lock:
+            if _async_client is None:
+                _async_client = AsyncAzureOpenAI(
+                    api_key=azure_api_key,
+                    azure_endpoint=azure_endpoint,
+                    api_version=azure_api_version,
+                    timeout=LLM_TIMEOUT_SECONDS,
+                    http_client=httpx.AsyncClient(limits=_http_limits(), timeout=LLM_TIMEOUT_SECONDS)
+                )
+                print("Async Azure OpenAI client initialized successfully")
+    return _async_client
+
+
+async def warm_up() -> None:
+    """
+    Build the clients and open a pooled connection to the endpoint ahead of the
+    first user request. Failures are logged and never block startup.
+    """
+    if not is_llm_configured():
+        print("Azure OpenAI API key not properly configured, skipping LLM warm-up")
+        return
+    try:
+        get_client()
+        async_client = get_async_client()
+        if LLM_WARMUP_PING:
+            # Any authenticated round trip establishes the TLS connection the pool keeps alive
+            await asyncio.wait_for(async_client.models.list(), timeout=LLM_TIMEOUT_SECONDS)
+        print("LLM warm-up complete")
+    except Exception as e:
+        print(f"LLM warm-up failed: {str(e)}")
+
+
+async def close() -> None:
+    """
+    Release pooled connections on application shutdown
+    """
+    global _client, _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+    if _client is not None:
+        _client.close()
+        _client = None
@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, DateTime, Text
+from sqlalchemy import Boolean, Column, ForeignKey, Index, Integer, String, Float, DateTime, Text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
@@ -25,7 +25,7 @@ class Inventory(Base):
     quantity = Column(Integer)
     unit_price = Column(Float)
     category = Column(String, index=True)
-    location = Column(String)
+    location = Column(String, index=True)
     last_updated = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -49,10 +49,10 @@ class Order(Base):
     __tablename__ = "orders"
 
     id = Column(Integer, primary_key=True, index=True)
-    order_date = Column(DateTime, default=datetime.utcnow)
+    order_date = Column(DateTime, default=datetime.utcnow, index=True)
     status = Column(String, index=True)  # pending, completed, cancelled
     total_amount = Column(Float)
-    supplier_id = Column(Integer, ForeignKey("suppliers.id"))
+    supplier_id = Column(Integer, ForeignKey("suppliers.id"), index=True)
     
     # Relationships
     supplier = relationship("Supplier", back_populates="orders")
@@ -71,8 +71,15 @@ class OrderItem(Base):
     order = relationship("Order", back_populates="order_items")
     inventory_item = relationship("Inventory", back_populates="order_items")
 
+# Partitioned by month on timestamp (natively on PostgreSQL, by rolling
+# archive tables on SQLite); see app/audit_partitions.py
 class ActivityLog(Base):
     __tablename__ = "activity_logs"
+    __table_args__ = (
+        # History of one entity, and one user's actions in a time range
+        Index("ix_activity_logs_entity_history", "entity_type", "entity_id", "timestamp"),
+        Index("ix_activity_logs_user_time", "user_id", "timestamp"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -80,7 +87,93 @@ class ActivityLog(Base):
     entity_type = Column(String)  # inventory, order, supplier
     entity_id = Column(Integer)
     details = Column(Text)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
     
     # Relationships
-    user = relationship("User", back_populates="activity_logs")
\ No newline at end of file
+    user = relationship("User", back_populates="activity_logs")
+
+class Anomaly(Base):
+    __tablename__ = "anomalies"
+
+    id = Column(Integer, primary_key=True, index=True)
+    detected_at = Column(DateTime, default=datetime.utcnow, index=True)
+    anomaly_type = Column(String, index=True)  # order_quantity, unit_price, burn_rate, stockout_risk, sudden_drop
+    severity = Column(String)  # medium, high
+    inventory_id = Column(Integer, ForeignKey("inventory.id"), index=True)
+    supplier_id = Column(Integer, ForeignKey("suppliers.id"))
+    order_id = Column(Integer, ForeignKey("orders.id"))
+    observed = Column(Float)
+    expected = Column(Float)
+    score = Column(Float)  # z-score, when the check is statistical
+    message = Column(Text)
+
+# Append-only stock history maintained by app/inventory_history.py: one
+# delta row per stock change, plus periodic checkpoint rows holding the
+# absolute quantity so a lookup never sums more than one period of deltas
+class InventoryHistory(Base):
+    __tablename__ = "inventory_history"
+    __table_args__ = (
+        Index("ix_inventory_history_lookup", "inventory_id", "location", "is_checkpoint", "recorded_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    inventory_id = Column(Integer, ForeignKey("inventory.id"), nullable=False)
+    location = Column(String, nullable=False, default="")  # empty string stands for a missing location
+    recorded_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    is_checkpoint = Column(Boolean, nullable=False, default=False)
+    delta = Column(Integer, nullable=False, default=0)  # change in quantity; 0 on checkpoints
+    quantity = Column(Integer)  # stock at recorded_at, set on checkpoints only
+    reason = Column(String)  # create, adjustment, move, order, checkpoint
+    order_id = Column(Integer, ForeignKey("orders.id"))
+
+# Aggregate tables maintained by app/dashboard.py (incrementally) and
+# app/supplier_metrics.py (periodic refresh). They are derived data
+# (rebuildable from the tables above) and are hidden from the natural
+# language query schema.
+DERIVED_TABLE_INFO = {"derived": True}
+
+class KpiInventory(Base):
+    __tablename__ = "kpi_inventory"
+    __table_args__ = {"info": DERIVED_TABLE_INFO}
+
+    # Empty string stands for a missing category/location
+    category = Column(String, primary_key=True)
+    location = Column(String, primary_key=True)
+    item_count = Column(Integer, nullable=False, default=0)
+    total_quantity = Column(Integer, nullable=False, default=0)
+    stock_value = Column(Float, nullable=False, default=0.0)
+    low_stock_count = Column(Integer, nullable=False, default=0)
+
+class KpiOrderStatus(Base):
+    __tablename__ = "kpi_order_status"
+    __table_args__ = {"info": DERIVED_TABLE_INFO}
+
+    status = Column(String, primary_key=True)
+    order_count = Column(Integer, nullable=False, default=0)
+    total_value = Column(Float, nullable=False, default=0.0)
+
+class KpiSupplierSpend(Base):
+    __tablename__ = "kpi_supplier_spend"
+    __table_args__ = {"info": DERIVED_TABLE_INFO}
+
+    supplier_id = Column(Integer, primary_key=True)
+    order_count = Column(Integer, nullable=False, default=0)
+    total_spend = Column(Float, nullable=False, default=0.0)
+
+class SupplierMetrics(Base):
+    __tablename__ = "supplier_metrics"
+    __table_args__ = {"info": DERIVED_TABLE_INFO}
+
+    # '*' is the supplier's totals across all categories, '' items without a category
+    category = Column(String, primary_key=True)
+    supplier_id = Column(Integer, primary_key=True)
+    order_count = Column(Integer, nullable=False, default=0)
+    cancelled_count = Column(Integer, nullable=False, default=0)
+    units = Column(Integer, nullable=False, default=0)
+    spend = Column(Float, nullable=False, default=0.0)
+    # Quantity-weighted unit price relative to the average paid for the same items (1.0 = average)
+    price_index = Column(Float)
+    completed_count = Column(Integer, nullable=False, default=0)
+    avg_fulfilment_hours = Column(Float)
+    last_order_date = Column(DateTime)
+    refreshed_at = Column(DateTime, nullable=False)
@@ -1,168 +1,178 @@
 from sqlalchemy import text
 from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+import asyncio
+import json
 import os
 from dotenv import load_dotenv
-from typing import Dict, Any, List, Optional
-from openai import AzureOpenAI
+from typing import Dict, Any, List, Optional, Iterator, Tuple
+
+from . import llm, query_cache, sql_guard, intent_engine, schema_context
+from .database import ReadSessionLocal
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Azure OpenAI client
-try:
-    # Get Azure OpenAI configuration from environment variables
-    azure_api_key = os.getenv("AZURE_OPENAI_API_KEY")
-    azure_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
-    azure_deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
-    azure_api_version = os.getenv("AZURE_OPENAI_API_VERSION", "2023-05-15")  # Updated to a stable version
-    
-    if not azure_api_key or not azure_endpoint or not azure_deployment:
-        print("Warning: Azure OpenAI configuration not found in environment variables")
-        azure_api_key = "your-azure-openai-api-key"  # Placeholder for testing
-        azure_endpoint = "https://your-resource-name.openai.azure.com/"  # Placeholder
-        azure_deployment = "your-deployment-name"  # Placeholder
-        azure_api_version = "2023-05-15"  # Default API version
-    
-    # Configure Azure OpenAI client
-    client = AzureOpenAI(
-        api_key=azure_api_key,
-        azure_endpoint=azure_endpoint,
-        api_version=azure_api_version
-    )
-    print("Azure OpenAI client initialized successfully")
-except Exception as e:
-    print(f"Error initializing Azure OpenAI client: {str(e)}")
-    print("API calls will likely fail without valid Azure OpenAI configuration")
+# Result size limits for natural language queries
+NLQ_MAX_ROWS = int(os.getenv("NLQ_MAX_ROWS", "10000"))
+NLQ_STREAM_BATCH_SIZE = int(os.getenv("NLQ_STREAM_BATCH_SIZE", "500"))
+NLQ_STREAM_MAX_BYTES = int(os.getenv("NLQ_STREAM_MAX_BYTES", str(16 * 1024 * 1024)))
 
-# Database schema information for context
-DB_SCHEMA = """
-Tables:
-1. inventory
-   - id (int, primary key)
-   - product_name (string, indexed)
-   - description (string)
-   - quantity (int)
-   - unit_price (float)
-   - category (string, indexed)
-   - location (string)
-   - last_updated (datetime)
+# Tables generated SQL is allowed to read, taken from the model metadata
+ALLOWED_TABLES = schema_context.table_names()
 
-2. suppliers
-   - id (int, primary key)
-   - name (string, indexed)
-   - contact_name (string)
-   - email (string)
-   - phone (string)
-   - address (string)
-   - is_active (boolean)
+def build_sql_messages(query_text: str) -> List[Dict[str, str]]:
+    """
+    Build the chat messages asking the LLM to translate a question into SQL
+    """
+    # Only the tables relevant to this question are described, keeping the prompt small
+    system_message = f"""You are a SQL expert. Convert the following natural language query into a SQL query for a supply chain management system.
+Use the following database schema information:
 
-3. orders
-   - id (int, primary key)
-   - order_date (datetime)
-   - status (string, indexed) - values: pending, completed, cancelled
-   - total_amount (float)
-   - supplier_id (int, foreign key to suppliers.id)
+{schema_context.get_prompt_schema(query_text)}
 
-4. order_items
-   - id (int, primary key)
-   - order_id (int, foreign key to orders.id)
-   - inventory_id (int, foreign key to inventory.id)
-   - quantity (int)
-   - unit_price (float)
+Only return the SQL query without any explanations or markdown formatting.
+The query must be a SELECT statement for security reasons."""
+    
+    user_message = f"Convert to SQL: {query_text}"
+    
+    return [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": user_message}
+    ]
 
-5. users
-   - id (int, primary key)
-   - email (string, unique, indexed)
-   - hashed_password (string)
-   - full_name (string)
-   - is_active (boolean)
+def extract_sql_from_completion(content: str) -> str:
+    """
+    Extract the SQL statement from the raw LLM completion text
+    """
+    sql_query = content.strip()
+    print(f"Generated SQL query: {sql_query}")
+    
+    # Clean up any additional text that might be included
+    # Look for SQL keywords to identify the start of the query
+    sql_keywords = ["SELECT", "select"]
+    for keyword in sql_keywords:
+        if keyword in sql_query:
+            sql_query = sql_query[sql_query.find(keyword):]
+            break
+    
+    # Add semicolon if missing
+    if not sql_query.endswith(";"):
+        sql_query += ";"
+    
+    print(f"SQL query extracted (length: {len(sql_query)}): {sql_query}")
+    return sql_query
 
-6. activity_logs
-   - id (int, primary key)
-   - user_id (int, foreign key to users.id)
-   - action (string)
-   - entity_type (string) - values: inventory, order, supplier
-   - entity_id (int)
-   - details (text)
-   - timestamp (datetime)
-"""
+def is_valid_generated_sql(sql_query: str) -> bool:
+    """
+    Basic sanity checks on the SQL returned by the LLM
+    """
+    # Validate the SQL query
+    if not sql_query or len(sql_query) < 10:  # Basic length check
+        print("Extracted SQL query is too short or empty, using rule-based fallback")
+        return False
+    
+    # Cheap pre-check; sql_guard.validate_sql does the parser-based validation
+    if not sql_query.lower().startswith("select"):
+        print(f"Query doesn't start with SELECT: {sql_query}, using rule-based fallback")
+        return False
+    
+    return True
 
-def generate_sql_from_text(query_text: str) -> str:
+async def generate_sql_from_text_async(query_text: str) -> str:
     """
-    Convert natural language query to SQL using OpenAI API
+    Convert a natural language query to SQL, from a matching intent rule or
+    with Azure OpenAI, falling back to the rule-based query when the LLM is
+    unavailable. Waits on the LLM without holding a worker thread, caps
+    in-flight LLM calls with a semaphore and gives up after LLM_TIMEOUT_SECONDS
+    (including time spent queued for a slot).
     """
+    routed_sql = route_to_intent(query_text)
+    if routed_sql is not None:
+        return routed_sql
+    
+    if not llm.is_llm_configured():
+        print("Azure OpenAI API key not properly configured, using rule-based fallback")
+        return generate_fallback_sql_query(query_text)
+    
+    async def _complete() -> str:
+        async with llm.llm_semaphore:
+            response = await llm.get_async_client().chat.completions.create(
+                model=llm.azure_deployment,
+                messages=build_sql_messages(query_text),
+                **llm.LLM_COMPLETION_PARAMS
+            )
+        return extract_sql_from_completion(response.choices[0].message.content)
     
     try:
-        # Prepare the prompt for OpenAI
-        system_message = f"""You are a SQL expert. Convert the following natural language query into a SQL query for a supply chain management system.
-Use the following database schema information:
+        print("Generating SQL using Azure OpenAI API (async)")
+        sql_query = await asyncio.wait_for(_complete(), timeout=llm.LLM_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        print(f"Azure OpenAI API call timed out after {llm.LLM_TIMEOUT_SECONDS}s, using rule-based fallback")
+        return generate_fallback_sql_query(query_text)
+    except Exception as api_error:
+        print(f"Azure OpenAI API call failed with error: {str(api_error)}, using rule-based fallback")
+        return generate_fallback_sql_query(query_text)
+    
+    if not is_valid_generated_sql(sql_query):
+        return generate_fallback_sql_query(query_text)
+    
+    return sql_query
 
-{DB_SCHEMA}
 
-Only return the SQL query without any explanations or markdown formatting.
-The query must be a SELECT statement for security reasons."""
-        
-        user_message = f"Convert to SQL: {query_text}"
-        
-        # Check if Azure OpenAI configuration is available
-        if not azure_api_key or azure_api_key == "your-azure-openai-api-key":
-            print("Azure OpenAI API key not properly configured")
-            raise ValueError("Azure OpenAI API key not properly configured")
-        
-        # Generate SQL using Azure OpenAI API
-        print("Generating SQL using Azure OpenAI API")
-        
-        try:
-            # Make API call to Azure OpenAI
-            response = client.chat.completions.create(
-                deployment_name=azure_deployment,  # Use the deployment name instead of model
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": user_message}
-                ],
-                temperature=0.1,  # Lower temperature for more deterministic outputs
-                max_tokens=500,
-                top_p=0.95,
-                frequency_penalty=0,
-                presence_penalty=0
-            )
-            
-            # Extract the SQL query from the response
-            sql_query = response.choices[0].message.content.strip()
-            print(f"Generated SQL query: {sql_query}")
-            
-            # Clean up any additional text that might be included
-            # Look for SQL keywords to identify the start of the query
-            sql_keywords = ["SELECT", "select"]
-            for keyword in sql_keywords:
-                if keyword in sql_query:
-                    sql_query = sql_query[sql_query.find(keyword):]
-                    break
-            
-            # Add semicolon if missing
-            if not sql_query.endswith(";"):
-                sql_query += ";"
-            
-            print(f"SQL query extracted (length: {len(sql_query)}): {sql_query}")
-        except Exception as api_error:
-            print(f"Azure OpenAI API call failed with error: {str(api_error)}")
-            raise ValueError(f"Azure OpenAI API call failed: {str(api_error)}")
-        
-        # Validate the SQL query
-        if not sql_query or len(sql_query) < 10:  # Basic length check
-            print("Extracted SQL query is too short or empty")
-            raise ValueError("OpenAI returned an invalid SQL query")
-        
-        # Basic validation to ensure it's a SELECT query (for safety)
-        if not sql_query.lower().startswith("select"):
-            print(f"Query doesn't start with SELECT: {sql_query}")
-            raise ValueError("Generated query is not a SELECT statement. For security reasons, only SELECT queries are allowed.")
-        
-        return sql_query
+def generate_fallback_sql_query(query_text: str) -> str:
+    """
+    Generate a SQL query from the compiled intent rules in app/intent_engine.py
+    This is a fallback mechanism when the LLM is not available
+    """
+    match = intent_engine.match_intent(query_text)
+    if match is not None:
+        return match.sql
     
-    except Exception as e:
-        print(f"Error in generate_sql_from_text: {str(e)}")
-        raise Exception(f"Error generating SQL from text: {str(e)}")
+    # If we can't determine the intent, return a default query
+    print(f"Could not determine specific intent from query: '{query_text}', using default query")
+    return "SELECT * FROM inventory LIMIT 10;"
+
+def route_to_intent(query_text: str) -> Optional[str]:
+    """
+    Answer the question from the intent rules when they explain it with high
+    confidence, so the LLM is skipped entirely
+    """
+    match = intent_engine.match_intent(query_text)
+    if match is not None and match.confidence >= intent_engine.INTENT_ROUTER_MIN_CONFIDENCE:
+        print(f"Intent router matched '{match.intent}' (confidence {match.confidence}), skipping LLM")
+        return match.sql
+    return None
+
+def validate_generated_sql(query_text: str, sql_query: str) -> str:
+    """
+    Run generated SQL through the parser-based validator, returning the rewritten
+    query. Rejected SQL is replaced by the rule-based fallback query.
+    """
+    try:
+        return sql_guard.validate_sql(sql_query, ALLOWED_TABLES)
+    except sql_guard.SQLValidationError as e:
+        print(f"Generated SQL rejected by validator: {str(e)}, using rule-based fallback")
+        return sql_guard.validate_sql(generate_fallback_sql_query(query_text), ALLOWED_TABLES)
+
+def check_sql_query_cost(sql_query: str) -> None:
+    """
+    Run the EXPLAIN cost guard on a short-lived session
+    """
+    db = ReadSessionLocal()
+    try:
+        sql_guard.check_query_cost(db, sql_query)
+    finally:
+        db.close()
+
+def execute_guarded_sql_query(db: Session, sql_query: str, check_cost: bool = True) -> List[Dict[str, Any]]:
+    """
+    Refuse queries whose estimated plan is too expensive, then execute them
+    """
+    if check_cost:
+        sql_guard.check_query_cost(db, sql_query)
+    return execute_sql_query(db, sql_query)
 
 def execute_sql_query(db: Session, sql_query: str) -> List[Dict[str, Any]]:
     """
@@ -170,11 +180,14 @@ def execute_sql_query(db: Session, sql_query: str) -> List[Dict[str, Any]]:
     """
     try:
         # Execute the query
+        print("execute_sql_query : "+ sql_query)
         result = db.execute(text(sql_query))
         
+        print("SQL query executed successfully, processing results...")
         # Convert the result to a list of dictionaries
         column_names = result.keys()
-        rows = result.fetchall()
+        # Never materialize more than the hard row cap
+        rows = result.fetchmany(NLQ_MAX_ROWS)
         
         # Format the results
         formatted_results = [
@@ -187,69 +200,103 @@ def execute_sql_query(db: Session, sql_query: str) -> List[Dict[str, Any]]:
     except Exception as e:
         raise Exception(f"Error executing SQL query: {str(e)}")
 
-def generate_fallback_sql_query(query_text: str) -> str:
+def stream_sql_query(query_text: str, sql_query: str) -> Iterator[bytes]:
     """
-    Generate a simple SQL query based on keywords in the natural language query
-    This is a fallback mechanism when the OpenAI API is not available
+    Execute the generated SQL query on a server-side cursor and yield the results
+    as NDJSON lines: one "meta" line, one "row" line per row, then an "end" line.
+    Rows are fetched NLQ_STREAM_BATCH_SIZE at a time and the stream stops once
+    NLQ_MAX_ROWS rows or NLQ_STREAM_MAX_BYTES bytes have been written.
     """
-    query_lower = query_text.lower()
-    
-    # Default query - return a limited set of inventory items
-    default_query = "SELECT * FROM inventory LIMIT 10;"
-    
-    # Check for specific entity types in the query
-    if any(word in query_lower for word in ["inventory", "product", "item", "stock"]):
-        if "low" in query_lower or "out of" in query_lower:
-            return "SELECT * FROM inventory WHERE quantity < 10 ORDER BY quantity ASC;"
-        elif "expensive" in query_lower or "highest price" in query_lower:
-            return "SELECT * FROM inventory ORDER BY unit_price DESC LIMIT 10;"
-        elif "cheap" in query_lower or "lowest price" in query_lower:
-            return "SELECT * FROM inventory ORDER BY unit_price ASC LIMIT 10;"
-        else:
-            return "SELECT * FROM inventory LIMIT 20;"
+    def _line(payload: Dict[str, Any]) -> bytes:
+        return (json.dumps(jsonable_encoder(payload)) + "\n").encode("utf-8")
     
-    elif any(word in query_lower for word in ["supplier", "vendor", "provider"]):
-        if "active" in query_lower:
-            return "SELECT * FROM suppliers WHERE is_active = TRUE;"
-        else:
-            return "SELECT * FROM suppliers LIMIT 20;"
-    
-    elif any(word in query_lower for word in ["order", "purchase"]):
-        if "pending" in query_lower:
-            return "SELECT * FROM orders WHERE status = 'pending';"
-        elif "completed" in query_lower:
-            return "SELECT * FROM orders WHERE status = 'completed';"
-        elif "cancelled" in query_lower or "canceled" in query_lower:
-            return "SELECT * FROM orders WHERE status = 'cancelled';"
-        else:
-            return "SELECT * FROM orders LIMIT 20;"
-    
-    elif any(word in query_lower for word in ["user", "account"]):
-        return "SELECT id, email, full_name, is_active FROM users LIMIT 20;"
+    # The session is opened here rather than injected so it lives exactly as
+    # long as the stream, independent of when request dependencies are torn down
+    db = ReadSessionLocal()
+    row_count = 0
+    bytes_sent = 0
+    truncated_reason = None
+    try:
+        print("stream_sql_query : " + sql_query)
+        result = db.execute(
+            text(sql_query),
+            execution_options={"stream_results": True, "max_row_buffer": NLQ_STREAM_BATCH_SIZE}
+        )
+        column_names = list(result.keys())
+        
+        header = _line({"type": "meta", "query": query_text, "sql": sql_query, "columns": column_names})
+        bytes_sent += len(header)
+        yield header
+        
+        while truncated_reason is None:
+            rows = result.fetchmany(NLQ_STREAM_BATCH_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                if row_count >= NLQ_MAX_ROWS:
+                    truncated_reason = "row_limit"
+                    break
+                line = _line({"type": "row", "data": dict(zip(column_names, row))})
+                if bytes_sent + len(line) > NLQ_STREAM_MAX_BYTES:
+                    truncated_reason = "byte_limit"
+                    break
+                bytes_sent += len(line)
+                row_count += 1
+                yield line
+        
+        # Stop the server from producing rows we are not going to send
+        result.close()
+        yield _line({
+            "type": "end",
+            "row_count": row_count,
+            "truncated": truncated_reason is not None,
+            "reason": truncated_reason
+        })
+    except Exception as e:
+        yield _line({"type": "error", "error": f"Error executing SQL query: {str(e)}", "row_count": row_count})
+    finally:
+        db.close()
+
+async def resolve_sql_async(query_text: str) -> Tuple[str, bool, bool]:
+    """
+    Turn a question into validated SQL, using the SQL cache before the LLM.
+    Returns (sql_query, cached, cacheable); only LLM output is cacheable so an
+    outage doesn't pin the fallback answer.
+    """
+    sql_query = query_cache.get_cached_sql(query_text)
+    if sql_query is not None:
+        return sql_query, True, False
     
-    # If we can't determine the intent, return a default query
-    print(f"Could not determine specific intent from query: '{query_text}', using default query")
-    return default_query
+    generated_sql = await generate_sql_from_text_async(query_text)
+    sql_query = validate_generated_sql(query_text, generated_sql)
+    return sql_query, False, generated_sql != generate_fallback_sql_query(query_text)
 
-def process_natural_language_query(db: Session, query_text: str) -> Dict[str, Any]:
+async def process_natural_language_query_async(db: Session, query_text: str) -> Dict[str, Any]:
     """
-    Process a natural language query by converting it to SQL and executing it
+    Process a natural language query by converting it to SQL and executing it.
+    The session's connection is released while the LLM generates SQL and only
+    checked out again to execute it.
     """
     try:
-        # Generate SQL from natural language
-        try:
-            sql_query = generate_sql_from_text(query_text)
-        except Exception as sql_gen_error:
-            print(f"SQL generation failed: {str(sql_gen_error)}, using fallback")
-            sql_query = generate_fallback_sql_query(query_text)
-            
-        # Execute the SQL query
-        results = execute_sql_query(db, sql_query)
+        # Return the connection checked out during authentication to the pool
+        db.close()
+        
+        sql_query, cached, cacheable = await resolve_sql_async(query_text)
+        
+        results = query_cache.get_cached_results(sql_query)
+        if results is None:
+            # Blocking DB work runs in the threadpool, not on the event loop
+            results = await run_in_threadpool(execute_guarded_sql_query, db, sql_query, not cached)
+            query_cache.cache_results(sql_query, results)
+        
+        if cacheable:
+            query_cache.cache_sql(query_text, sql_query)
         
         return {
             "success": True,
             "query": query_text,
             "sql": sql_query,
+            "cached": cached,
             "results": results
         }
     
@@ -258,4 +305,85 @@ def process_natural_language_query(db: Session, query_text: str) -> Dict[str, An
             "success": False,
             "query": query_text,
             "error": str(e)
-        }
\ No newline at end of file
+        }
+
+def execute_sql_batch(db: Session, sql_queries: Dict[str, bool]) -> Dict[str, Dict[str, Any]]:
+    """
+    Execute distinct SQL queries on one connection inside a single read-only
+    transaction. sql_queries maps each query to whether it still needs the cost
+    check. Each query runs in its own savepoint so one failure doesn't abort the rest.
+    """
+    outcomes = {}
+    try:
+        if db.get_bind().dialect.name == "postgresql":
+            db.execute(text("SET TRANSACTION READ ONLY"))
+        
+        for sql_query, check_cost in sql_queries.items():
+            results = query_cache.get_cached_results(sql_query)
+            if results is not None:
+                outcomes[sql_query] = {"results": results}
+                continue
+            try:
+                with db.begin_nested():
+                    results = execute_guarded_sql_query(db, sql_query, check_cost)
+                query_cache.cache_results(sql_query, results)
+                outcomes[sql_query] = {"results": results}
+            except Exception as e:
+                outcomes[sql_query] = {"error": str(e)}
+    finally:
+        # Nothing was written; end the read-only transaction
+        db.rollback()
+    
+    return outcomes
+
+async def process_natural_language_batch_async(db: Session, query_texts: List[str]) -> Dict[str, Any]:
+    """
+    Answer many questions in one call: SQL is generated concurrently (bounded by
+    the LLM semaphore), identical SQL is executed once, and every distinct query
+    runs on the same connection. Results are keyed by question.
+    """
+    print(f"process_natural_language_batch_async: {len(query_texts)} questions")
+    db.close()
+    
+    questions = list(dict.fromkeys(query_texts))
+    resolved = await asyncio.gather(
+        *[resolve_sql_async(query_text) for query_text in questions],
+        return_exceptions=True
+    )
+    
+    # Identical SQL from different questions runs once; skip the cost check only
+    # when every question producing it came from the cache
+    distinct_queries: Dict[str, bool] = {}
+    for resolution in resolved:
+        if isinstance(resolution, Exception):
+            continue
+        sql_query, cached, _ = resolution
+        distinct_queries[sql_query] = distinct_queries.get(sql_query, False) or not cached
+    
+    outcomes = await run_in_threadpool(execute_sql_batch, db, distinct_queries) if distinct_queries else {}
+    
+    answers = {}
+    for query_text, resolution in zip(questions, resolved):
+        if isinstance(resolution, Exception):
+            answers[query_text] = {"success": False, "error": str(resolution)}
+            continue
+        sql_query, cached, cacheable = resolution
+        outcome = outcomes[sql_query]
+        if "error" in outcome:
+            answers[query_text] = {"success": False, "sql": sql_query, "error": outcome["error"]}
+            continue
+        if cacheable:
+            query_cache.cache_sql(query_text, sql_query)
+        answers[query_text] = {
+            "success": True,
+            "sql": sql_query,
+            "cached": cached,
+            "results": outcome["results"]
+        }
+    
+    return {
+        "success": all(answer["success"] for answer in answers.values()),
+        "question_count": len(questions),
+        "distinct_sql_count": len(distinct_queries),
+        "results": answers
+    }
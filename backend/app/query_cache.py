@@ -0,0 +1,251 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import SqlglotError
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Cache settings for the natural language query pipeline
+SQL_CACHE_SIZE = int(os.getenv("NLQ_SQL_CACHE_SIZE", "512"))
+SQL_CACHE_TTL_SECONDS = int(os.getenv("NLQ_SQL_CACHE_TTL_SECONDS", "3600"))
+RESULT_CACHE_ENABLED = os.getenv("NLQ_RESULT_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+RESULT_CACHE_SIZE = int(os.getenv("NLQ_RESULT_CACHE_SIZE", "128"))
+RESULT_CACHE_TTL_SECONDS = int(os.getenv("NLQ_RESULT_CACHE_TTL_SECONDS", "300"))
+
+_PUNCTUATION_PATTERN = re.compile(r"[^\w\s]")
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_query_text(query_text: str) -> str:
+    """
+    Normalize a natural language question so trivially different phrasings
+    ("Show low stock items?" / "show  low stock items") share a cache entry
+    """
+    normalized = _PUNCTUATION_PATTERN.sub(" ", query_text.lower())
+    return _WHITESPACE_PATTERN.sub(" ", normalized).strip()
+
+
+def extract_tables(sql_query: str) -> Set[str]:
+    """
+    Return the lower-cased table names referenced by a SQL query, including
+    comma joins and subqueries. Empty when the query cannot be parsed.
+    """
+    try:
+        statements = [statement for statement in sqlglot.parse(sql_query) if statement is not None]
+    except SqlglotError:
+        return set()
+    tables = set()
+    for statement in statements:
+        # Names defined by WITH clauses are not real tables
+        cte_names = {cte.alias_or_name.lower() for cte in statement.find_all(exp.CTE)}
+        tables |= {table.name.lower() for table in statement.find_all(exp.Table)} - cte_names
+    return tables
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire after a fixed time-to-live
+    """
+
+    def __init__(self, maxsize: int, ttl_seconds: int):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.RLock()
+
+    def _forget(self, key: str) -> None:
+        """
+        Called with the lock held whenever an entry is dropped (expiry, LRU
+        eviction or delete), so subclasses can clean up what they keep per key
+        """
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self._forget(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        if self.maxsize <= 0:
+            return
+        ttl = self.ttl_seconds if ttl_seconds is None else min(ttl_seconds, self.ttl_seconds)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                evicted, _ = self._entries.popitem(last=False)
+                self._forget(evicted)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._forget(key)
+
+    def keys(self) -> List[str]:
+        with self._lock:
+            return list(self._entries.keys())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class ResultCache(TTLCache):
+    """
+    SQL result set cache that is invalidated by writes to the tables a query reads
+    """
+
+    def __init__(self, maxsize: int, ttl_seconds: int):
+        super().__init__(maxsize, ttl_seconds)
+        self.invalidations = 0
+        self._keys_by_table: Dict[str, Set[str]] = {}
+        self._tables_by_key: Dict[str, Set[str]] = {}
+
+    def _forget(self, key: str) -> None:
+        for table in self._tables_by_key.pop(key, ()):
+            keys = self._keys_by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_table[table]
+
+    def set_result(self, sql_query: str, results: List[Dict[str, Any]]) -> None:
+        tables = extract_tables(sql_query)
+        if not tables:
+            # Without knowing which tables were read we cannot invalidate safely
+            return
+        self.set_for_tables(sql_query, results, tables)
+
+    def set_for_tables(self, key: str, value: Any, tables: Iterable[str]) -> None:
+        """
+        Cache `value` until it expires or any of `tables` is written
+        """
+        if self.maxsize <= 0:
+            return
+        tables = {table.lower() for table in tables}
+        # Held across set() so an invalidation cannot slip between storing and indexing
+        with self._lock:
+            self._forget(key)
+            self.set(key, value)
+            if key not in self._entries:
+                return
+            self._tables_by_key[key] = tables
+            for table in tables:
+                self._keys_by_table.setdefault(table, set()).add(key)
+
+    def invalidate_tables(self, tables: Iterable[str]) -> None:
+        with self._lock:
+            for table in tables:
+                for key in list(self._keys_by_table.get(table.lower(), ())):
+                    if self._entries.pop(key, None) is not None:
+                        self.invalidations += 1
+                    self._forget(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_table.clear()
+            self._tables_by_key.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats["invalidations"] = self.invalidations
+        return stats
+
+
+# Tier 1: normalized question text -> generated SQL
+sql_cache = TTLCache(SQL_CACHE_SIZE, SQL_CACHE_TTL_SECONDS)
+
+# Tier 2 (optional): generated SQL -> result rows
+result_cache = ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL_SECONDS)
+
+# Other table-keyed caches (e.g. reports) invalidated alongside the result cache
+_dependent_caches: List[ResultCache] = []
+
+
+def register_cache(cache: ResultCache) -> None:
+    _dependent_caches.append(cache)
+
+
+def unregister_cache(cache: ResultCache) -> None:
+    if cache in _dependent_caches:
+        _dependent_caches.remove(cache)
+
+
+def get_cached_sql(query_text: str) -> Optional[str]:
+    return sql_cache.get(normalize_query_text(query_text))
+
+
+def cache_sql(query_text: str, sql_query: str) -> None:
+    sql_cache.set(normalize_query_text(query_text), sql_query)
+
+
+def get_cached_results(sql_query: str) -> Optional[List[Dict[str, Any]]]:
+    if not RESULT_CACHE_ENABLED:
+        return None
+    return result_cache.get(sql_query)
+
+
+def cache_results(sql_query: str, results: List[Dict[str, Any]]) -> None:
+    if RESULT_CACHE_ENABLED:
+        result_cache.set_result(sql_query, results)
+
+
+def invalidate_tables(*tables: str) -> None:
+    """
+    Drop cached result sets (and registered caches' entries) that read
+    from any of the given tables.
+    Called by the CRUD layer after every committed write; the cache is
+    per-process, so each worker only sees its own writes.
+    """
+    if RESULT_CACHE_ENABLED:
+        result_cache.invalidate_tables(tables)
+    for cache in _dependent_caches:
+        cache.invalidate_tables(tables)
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    """
+    Hit/miss counters for both tiers. SQL tier hits are LLM calls avoided.
+    """
+    sql_stats = sql_cache.stats()
+    return {
+        "sql_cache": sql_stats,
+        "result_cache": {"enabled": RESULT_CACHE_ENABLED, **result_cache.stats()},
+        "llm_calls_avoided": sql_stats["hits"],
+    }
@@ -0,0 +1,505 @@
+import csv
+import importlib.util
+import io
+import json
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from sqlalchemy import case, extract, func, select
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+
+from . import audit_partitions, crud, models, query_cache
+from .database import ReadSessionLocal
+from .query_cache import ResultCache, TTLCache
+
+# Load environment variables
+load_dotenv()
+
+REPORT_CACHE_SIZE = int(os.getenv("REPORT_CACHE_SIZE", "256"))
+REPORT_CACHE_TTL_SECONDS = int(os.getenv("REPORT_CACHE_TTL_SECONDS", "600"))
+# Threads rendering CSV/PDF files, and how long finished files are kept for download
+REPORT_RENDER_WORKERS = int(os.getenv("REPORT_RENDER_WORKERS", "2"))
+REPORT_JOB_TTL_SECONDS = int(os.getenv("REPORT_JOB_TTL_SECONDS", "3600"))
+REPORT_JOB_CACHE_SIZE = int(os.getenv("REPORT_JOB_CACHE_SIZE", "100"))
+
+CANCELLED_STATUS = "cancelled"
+COMPLETED_STATUS = "completed"
+
+RENDER_FORMATS = {"csv": "text/csv", "pdf": "application/pdf"}
+
+# (type, period, filters) -> report; entries drop when a table the report reads is written
+report_cache = ResultCache(REPORT_CACHE_SIZE, REPORT_CACHE_TTL_SECONDS)
+query_cache.register_cache(report_cache)
+
+# job id -> {"status", "format", "filename", "content", "error"}
+render_jobs = TTLCache(REPORT_JOB_CACHE_SIZE, REPORT_JOB_TTL_SECONDS)
+_render_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _month_start(moment: datetime) -> datetime:
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _resolve_period(period: str, start: Optional[datetime], end: Optional[datetime]) -> Tuple[datetime, datetime]:
+    now = datetime.utcnow()
+    if period == "custom":
+        if start is None or end is None or start >= end:
+            raise ValueError("A custom period needs start before end")
+        return start, end
+    if period.startswith("last_") and period.endswith("_days"):
+        try:
+            days = int(period[len("last_"):-len("_days")])
+        except ValueError:
+            days = 0
+        if days > 0:
+            return now - timedelta(days=days), now
+    if period == "month_to_date":
+        return _month_start(now), now
+    if period == "last_month":
+        this_month = _month_start(now)
+        return _month_start(this_month - timedelta(days=1)), this_month
+    if period == "year_to_date":
+        return _month_start(now).replace(month=1), now
+    raise ValueError(
+        f"Unsupported period '{period}'. Use last_<n>_days, month_to_date, last_month, year_to_date or custom"
+    )
+
+
+def _hours_between(db: Session, later, earlier):
+    if db.get_bind().dialect.name == "sqlite":
+        return (func.julianday(later) - func.julianday(earlier)) * 24.0
+    return extract("epoch", later - earlier) / 3600.0
+
+
+def _round(value: Optional[float], digits: int = 2) -> Optional[float]:
+    return round(float(value), digits) if value is not None else None
+
+
+def _inventory_turns(db: Session, start: datetime, end: datetime, filters: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Cost of goods ordered over the period divided by average inventory value,
+    per category. Stock is only reduced by orders, so opening stock is closing
+    stock plus what was ordered; average inventory is the mean of the two.
+    """
+    category = func.coalesce(models.Inventory.category, "")
+    cogs = (
+        select(
+            category.label("category"),
+            func.coalesce(func.sum(models.OrderItem.quantity * models.Inventory.unit_price), 0.0).label("cogs"),
+            func.coalesce(func.sum(models.OrderItem.quantity), 0).label("units"),
+        )
+        .join(models.Order, models.Order.id == models.OrderItem.order_id)
+        .join(models.Inventory, models.Inventory.id == models.OrderItem.inventory_id)
+        .where(models.Order.order_date >= start, models.Order.order_date < end)
+        .where(func.coalesce(models.Order.status, "") != CANCELLED_STATUS)
+    )
+    stock = select(
+        category.label("category"),
+        func.coalesce(func.sum(models.Inventory.quantity * models.Inventory.unit_price), 0.0).label("stock_value"),
+    )
+    if filters.get("category") is not None:
+        cogs = cogs.where(models.Inventory.category == filters["category"])
+        stock = stock.where(models.Inventory.category == filters["category"])
+    if filters.get("location") is not None:
+        cogs = cogs.where(models.Inventory.location == filters["location"])
+        stock = stock.where(models.Inventory.location == filters["location"])
+    if filters.get("supplier_id") is not None:
+        cogs = cogs.where(models.Order.supplier_id == filters["supplier_id"])
+
+    consumed = {row.category: row for row in db.execute(cogs.group_by(category))}
+    on_hand = {row.category: row.stock_value for row in db.execute(stock.group_by(category))}
+
+    period_days = max((end - start).total_seconds() / 86400, 1e-9)
+    rows = []
+    for name in sorted(set(consumed) | set(on_hand)):
+        cost = float(consumed[name].cogs) if name in consumed else 0.0
+        closing = float(on_hand.get(name) or 0.0)
+        average = closing + cost / 2
+        turns = cost / average if average > 0 else None
+        rows.append({
+            "category": name or None,
+            "units_ordered": int(consumed[name].units) if name in consumed else 0,
+            "cost_of_goods": _round(cost),
+            "average_inventory_value": _round(average),
+            "closing_inventory_value": _round(closing),
+            "inventory_turns": _round(turns, 3),
+            "days_of_supply": _round(period_days / turns, 1) if turns else None,
+        })
+
+    total_cost = sum(row["cost_of_goods"] for row in rows)
+    total_average = sum(row["average_inventory_value"] for row in rows)
+    total_turns = total_cost / total_average if total_average > 0 else None
+    summary = {
+        "cost_of_goods": _round(total_cost),
+        "average_inventory_value": _round(total_average),
+        "inventory_turns": _round(total_turns, 3),
+        "annualised_turns": _round(total_turns * 365 / period_days, 2) if total_turns else None,
+    }
+    insights = []
+    ranked = [row for row in rows if row["inventory_turns"] is not None]
+    if ranked:
+        fastest = max(ranked, key=lambda row: row["inventory_turns"])
+        slowest = min(ranked, key=lambda row: row["inventory_turns"])
+        insights.append(f"{fastest['category'] or 'Uncategorized'} turns fastest ({fastest['inventory_turns']} turns in the period).")
+        if slowest is not fastest:
+            insights.append(f"{slowest['category'] or 'Uncategorized'} turns slowest ({slowest['inventory_turns']} turns in the period).")
+    idle = [row["category"] or "Uncategorized" for row in rows if row["units_ordered"] == 0 and row["closing_inventory_value"] > 0]
+    if idle:
+        insights.append(f"No orders in the period for stock in: {', '.join(idle)}.")
+    return {"summary": summary, "rows": rows, "insights": insights}
+
+
+def _fill_rate(db: Session, start: datetime, end: datetime, filters: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Share of resolved orders (completed or cancelled) that were completed, by
+    order count and by units, per supplier
+    """
+    completed = models.Order.status == COMPLETED_STATUS
+    cancelled = models.Order.status == CANCELLED_STATUS
+    order_units = (
+        select(models.OrderItem.order_id, func.sum(models.OrderItem.quantity).label("units"))
+        .group_by(models.OrderItem.order_id)
+    )
+    if filters.get("category") is not None or filters.get("location") is not None:
+        order_units = order_units.join(models.Inventory, models.Inventory.id == models.OrderItem.inventory_id)
+        if filters.get("category") is not None:
+            order_units = order_units.where(models.Inventory.category == filters["category"])
+        if filters.get("location") is not None:
+            order_units = order_units.where(models.Inventory.location == filters["location"])
+    order_units = order_units.subquery()
+
+    units = func.coalesce(order_units.c.units, 0)
+    statement = (
+        select(
+            models.Order.supplier_id,
+            func.count(models.Order.id).label("orders"),
+            func.sum(case((completed, 1), else_=0)).label("completed"),
+            func.sum(case((cancelled, 1), else_=0)).label("cancelled"),
+            func.coalesce(func.sum(case((completed, units), else_=0)), 0).label("completed_units"),
+            func.coalesce(func.sum(case((completed | cancelled, units), else_=0)), 0).label("resolved_units"),
+        )
+        .join(order_units, order_units.c.order_id == models.Order.id)
+        .where(models.Order.order_date >= start, models.Order.order_date < end)
+        .group_by(models.Order.supplier_id)
+        .order_by(models.Order.supplier_id)
+    )
+    if filters.get("supplier_id") is not None:
+        statement = statement.where(models.Order.supplier_id == filters["supplier_id"])
+
+    rows = []
+    for row in db.execute(statement):
+        resolved = row.completed + row.cancelled
+        rows.append({
+            "supplier_id": row.supplier_id,
+            "orders": row.orders,
+            "completed": row.completed,
+            "cancelled": row.cancelled,
+            "open": row.orders - resolved,
+            "order_fill_rate": _round(row.completed / resolved, 4) if resolved else None,
+            "unit_fill_rate": _round(row.completed_units / row.resolved_units, 4) if row.resolved_units else None,
+        })
+
+    totals = {name: sum(row[name] for row in rows) for name in ("orders", "completed", "cancelled", "open")}
+    resolved = totals["completed"] + totals["cancelled"]
+    summary = {**totals, "order_fill_rate": _round(totals["completed"] / resolved, 4) if resolved else None}
+    insights = []
+    if summary["order_fill_rate"] is not None:
+        insights.append(f"{summary['order_fill_rate'] * 100:.1f}% of resolved orders were completed.")
+    worst = [row for row in rows if row["order_fill_rate"] is not None]
+    if len(worst) > 1:
+        worst = min(worst, key=lambda row: row["order_fill_rate"])
+        insights.append(f"Supplier {worst['supplier_id']} has the lowest fill rate ({worst['order_fill_rate'] * 100:.1f}%).")
+    if totals["open"]:
+        insights.append(f"{totals['open']} orders from the period are still open.")
+    return {"summary": summary, "rows": rows, "insights": insights}
+
+
+def _spend_by_supplier(db: Session, start: datetime, end: datetime, filters: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Spend, orders and units per supplier over the period, excluding cancelled orders
+    """
+    spend = func.sum(models.OrderItem.quantity * models.OrderItem.unit_price)
+    statement = (
+        select(
+            models.Order.supplier_id,
+            models.Supplier.name,
+            func.count(func.distinct(models.Order.id)).label("orders"),
+            func.coalesce(func.sum(models.OrderItem.quantity), 0).label("units"),
+            func.coalesce(spend, 0.0).label("spend"),
+        )
+        .select_from(models.OrderItem)
+        .join(models.Order, models.Order.id == models.OrderItem.order_id)
+        .outerjoin(models.Supplier, models.Supplier.id == models.Order.supplier_id)
+        .where(models.Order.order_date >= start, models.Order.order_date < end)
+        .where(func.coalesce(models.Order.status, "") != CANCELLED_STATUS)
+        .group_by(models.Order.supplier_id, models.Supplier.name)
+        .order_by(func.coalesce(spend, 0.0).desc())
+    )
+    if filters.get("category") is not None or filters.get("location") is not None:
+        statement = statement.join(models.Inventory, models.Inventory.id == models.OrderItem.inventory_id)
+        if filters.get("category") is not None:
+            statement = statement.where(models.Inventory.category == filters["category"])
+        if filters.get("location") is not None:
+            statement = statement.where(models.Inventory.location == filters["location"])
+    if filters.get("supplier_id") is not None:
+        statement = statement.where(models.Order.supplier_id == filters["supplier_id"])
+
+    result = db.execute(statement).all()
+    total = sum(float(row.spend) for row in result)
+    rows = [
+        {
+            "supplier_id": row.supplier_id,
+            "name": row.name,
+            "orders": row.orders,
+            "units": int(row.units),
+            "spend": _round(row.spend),
+            "average_order_value": _round(float(row.spend) / row.orders) if row.orders else None,
+            "share_of_spend": _round(float(row.spend) / total, 4) if total else None,
+        }
+        for row in result
+    ]
+    summary = {"suppliers": len(rows), "orders": sum(row["orders"] for row in rows), "spend": _round(total)}
+    insights = []
+    if rows and rows[0]["share_of_spend"] is not None:
+        insights.append(f"{rows[0]['name'] or 'Supplier ' + str(rows[0]['supplier_id'])} accounts for {rows[0]['share_of_spend'] * 100:.1f}% of spend.")
+        top_three = sum(row["share_of_spend"] for row in rows[:3])
+        if len(rows) > 3:
+            insights.append(f"The top three suppliers account for {top_three * 100:.1f}% of spend.")
+    return {"summary": summary, "rows": rows, "insights": insights}
+
+
+def _order_cycle_time(db: Session, start: datetime, end: datetime, filters: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Hours from order to completion per supplier, for orders placed in the
+    period, from the order status change audit trail
+    """
+    # Orders placed in the period complete after its start, so older
+    # partitions (or archive tables) need not be read
+    status_changes = audit_partitions.log_entity(db, lambda source: [
+        source.c.entity_type == "order",
+        source.c.action == crud.ORDER_STATUS_CHANGE_ACTION,
+        # details is "<old status> -> <new status>"
+        source.c.details.like(f"% -> {COMPLETED_STATUS}"),
+    ], since=start)
+    completions = (
+        select(
+            status_changes.entity_id.label("order_id"),
+            func.min(status_changes.timestamp).label("completed_at"),
+        )
+        .group_by(status_changes.entity_id)
+        .subquery()
+    )
+    hours = _hours_between(db, completions.c.completed_at, models.Order.order_date)
+    statement = (
+        select(
+            models.Order.supplier_id,
+            func.count(models.Order.id).label("completed_orders"),
+            func.avg(hours).label("average_hours"),
+            func.min(hours).label("fastest_hours"),
+            func.max(hours).label("slowest_hours"),
+        )
+        .join(completions, completions.c.order_id == models.Order.id)
+        .where(models.Order.order_date >= start, models.Order.order_date < end)
+        .group_by(models.Order.supplier_id)
+        .order_by(func.avg(hours))
+    )
+    if filters.get("supplier_id") is not None:
+        statement = statement.where(models.Order.supplier_id == filters["supplier_id"])
+    if filters.get("category") is not None or filters.get("location") is not None:
+        lines = select(models.OrderItem.order_id).join(models.Inventory, models.Inventory.id == models.OrderItem.inventory_id)
+        if filters.get("category") is not None:
+            lines = lines.where(models.Inventory.category == filters["category"])
+        if filters.get("location") is not None:
+            lines = lines.where(models.Inventory.location == filters["location"])
+        statement = statement.where(models.Order.id.in_(lines))
+
+    result = db.execute(statement).all()
+    rows = [
+        {
+            "supplier_id": row.supplier_id,
+            "completed_orders": row.completed_orders,
+            "average_hours": _round(row.average_hours),
+            "fastest_hours": _round(row.fastest_hours),
+            "slowest_hours": _round(row.slowest_hours),
+        }
+        for row in result
+    ]
+    completed_orders = sum(row["completed_orders"] for row in rows)
+    weighted_hours = sum(row["average_hours"] * row["completed_orders"] for row in rows if row["average_hours"] is not None)
+    summary = {
+        "completed_orders": completed_orders,
+        "average_hours": _round(weighted_hours / completed_orders) if completed_orders else None,
+    }
+    insights = []
+    if summary["average_hours"] is not None:
+        insights.append(f"Orders took {summary['average_hours'] / 24:.1f} days on average to complete.")
+    if len(rows) > 1:
+        insights.append(f"Supplier {rows[0]['supplier_id']} completes fastest ({rows[0]['average_hours'] / 24:.1f} days on average).")
+    return {"summary": summary, "rows": rows, "insights": insights}
+
+
+# report type -> (builder, tables it reads, for cache invalidation)
+REPORT_TYPES: Dict[str, Tuple[Callable, Tuple[str, ...]]] = {
+    "inventory_turns": (_inventory_turns, ("orders", "order_items", "inventory")),
+    "fill_rate": (_fill_rate, ("orders", "order_items", "inventory")),
+    "spend_by_supplier": (_spend_by_supplier, ("orders", "order_items", "inventory", "suppliers")),
+    "order_cycle_time": (_order_cycle_time, ("orders", "order_items", "inventory", "activity_logs")),
+}
+
+
+def build_report(db: Session, report_type: str, period: str = "last_30_days",
+                 start: Optional[datetime] = None, end: Optional[datetime] = None,
+                 filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Build a KPI report with grouped SQL, or return the cached copy. Reports
+    are cached per (type, period, filters) for REPORT_CACHE_TTL_SECONDS and
+    dropped as soon as a table they read is written. Raises ValueError for
+    an unknown type or period.
+    """
+    if report_type not in REPORT_TYPES:
+        raise ValueError(f"Unknown report type '{report_type}'. Supported: {', '.join(REPORT_TYPES)}")
+    filters = {name: value for name, value in (filters or {}).items() if value is not None}
+    period_start, period_end = _resolve_period(period, start, end)
+
+    key = json.dumps([report_type, period, start, end, filters], sort_keys=True, default=str)
+    cached = report_cache.get(key)
+    if cached is not None:
+        return {**cached, "cached": True}
+
+    builder, tables = REPORT_TYPES[report_type]
+    report = {
+        "report_type": report_type,
+        "period": {"name": period, "start": period_start, "end": period_end},
+        "filters": filters,
+        "generated_at": datetime.utcnow(),
+        **builder(db, period_start, period_end, filters),
+    }
+    report_cache.set_for_tables(key, report, tables)
+    return {**report, "cached": False}
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    return report_cache.stats()
+
+
+# Rendering
+
+def _render_csv(report: Dict[str, Any]) -> bytes:
+    buffer = io.StringIO()
+    rows = report["rows"]
+    columns = list(rows[0]) if rows else []
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow(["" if row[name] is None else row[name] for name in columns])
+    return buffer.getvalue().encode("utf-8")
+
+
+def _render_pdf(report: Dict[str, Any]) -> bytes:
+    try:
+        from reportlab.lib import colors
+        from reportlab.lib.pagesizes import A4, landscape
+        from reportlab.lib.styles import getSampleStyleSheet
+        from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+    except ImportError:
+        raise ValueError("PDF rendering requires the reportlab package")
+
+    styles = getSampleStyleSheet()
+    period = report["period"]
+    title = report["report_type"].replace("_", " ").title()
+    story = [
+        Paragraph(title, styles["Title"]),
+        Paragraph(f"{period['start']:%Y-%m-%d %H:%M} to {period['end']:%Y-%m-%d %H:%M} UTC", styles["Normal"]),
+        Spacer(1, 12),
+    ]
+    for name, value in report["summary"].items():
+        story.append(Paragraph(f"<b>{name.replace('_', ' ').capitalize()}:</b> {'-' if value is None else value}", styles["Normal"]))
+    for insight in report["insights"]:
+        story.append(Paragraph(f"&bull; {insight}", styles["Normal"]))
+    rows = report["rows"]
+    if rows:
+        columns = list(rows[0])
+        table = Table(
+            [[name.replace("_", " ") for name in columns]]
+            + [["-" if row[name] is None else str(row[name]) for name in columns] for row in rows],
+            repeatRows=1
+        )
+        table.setStyle(TableStyle([
+            ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
+            ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
+            ("FONTSIZE", (0, 0), (-1, -1), 8),
+        ]))
+        story += [Spacer(1, 12), table]
+
+    buffer = io.BytesIO()
+    SimpleDocTemplate(buffer, pagesize=landscape(A4), title=title).build(story)
+    return buffer.getvalue()
+
+
+def _render_job(job_id: str, export_format: str, report_type: str, period: str,
+                start: Optional[datetime], end: Optional[datetime], filters: Dict[str, Any]):
+    job = render_jobs.get(job_id)
+    if job is None:
+        return
+    db = ReadSessionLocal()
+    try:
+        report = build_report(db, report_type, period, start, end, filters)
+        content = _render_csv(report) if export_format == "csv" else _render_pdf(report)
+        render_jobs.set(job_id, {**job, "status": "done", "content": content})
+    except Exception as e:
+        render_jobs.set(job_id, {**job, "status": "failed", "error": str(e)})
+    finally:
+        db.close()
+
+
+def _get_render_pool() -> ThreadPoolExecutor:
+    global _render_pool
+    if _render_pool is None:
+        _render_pool = ThreadPoolExecutor(max_workers=REPORT_RENDER_WORKERS, thread_name_prefix="report-render")
+    return _render_pool
+
+
+def submit_render(report_type: str, export_format: str, period: str = "last_30_days",
+                  start: Optional[datetime] = None, end: Optional[datetime] = None,
+                  filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Queue a report for rendering to CSV or PDF and return its job. The file is
+    built on the render pool and kept for REPORT_JOB_TTL_SECONDS; jobs live in
+    this process only.
+    """
+    if export_format not in RENDER_FORMATS:
+        raise ValueError(f"Unsupported format '{export_format}'. Supported: {', '.join(RENDER_FORMATS)}")
+    if export_format == "pdf" and importlib.util.find_spec("reportlab") is None:
+        raise ValueError("PDF rendering requires the reportlab package")
+    if report_type not in REPORT_TYPES:
+        raise ValueError(f"Unknown report type '{report_type}'. Supported: {', '.join(REPORT_TYPES)}")
+    _resolve_period(period, start, end)
+    filters = {name: value for name, value in (filters or {}).items() if value is not None}
+
+    job_id = uuid.uuid4().hex
+    job = {
+        "job_id": job_id,
+        "status": "pending",
+        "format": export_format,
+        "filename": f"{report_type}_{datetime.utcnow():%Y%m%d%H%M%S}.{export_format}",
+        "content": None,
+        "error": None,
+    }
+    render_jobs.set(job_id, job)
+    _get_render_pool().submit(_render_job, job_id, export_format, report_type, period, start, end, filters)
+    return job
+
+
+def get_render_job(job_id: str) -> Optional[Dict[str, Any]]:
+    return render_jobs.get(job_id)
+
+
+def shutdown_render_pool():
+    global _render_pool
+    if _render_pool is not None:
+        _render_pool.shutdown(wait=False, cancel_futures=True)
+        _render_pool = None
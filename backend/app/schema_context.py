@@ -0,0 +1,189 @@
+import os
+import threading
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Optional, Set
+
+from sqlalchemy import Boolean, DateTime, Float, Integer, Numeric, String, Text, select
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+
+from . import models  # Registers the mapped tables on Base.metadata
+from .database import Base, ReadSessionLocal
+from .intent_engine import STOPWORDS, tokenize
+
+# Load environment variables
+load_dotenv()
+
+# Tables the LLM never sees (comma separated)
+SCHEMA_EXCLUDED_TABLES = {
+    name.strip() for name in os.getenv("SCHEMA_EXCLUDED_TABLES", "").split(",") if name.strip()
+}
+# Low-cardinality columns whose distinct values are sampled into the prompt
+SCHEMA_SAMPLE_COLUMNS = [
+    name.strip() for name in os.getenv(
+        "SCHEMA_SAMPLE_COLUMNS",
+        "orders.status,inventory.category,inventory.location,activity_logs.entity_type,activity_logs.action"
+    ).split(",") if name.strip()
+]
+SCHEMA_SAMPLE_MAX_VALUES = int(os.getenv("SCHEMA_SAMPLE_MAX_VALUES", "12"))
+
+# Extra words that point at a table without naming it
+TABLE_SYNONYMS: Dict[str, Set[str]] = {
+    "inventory": {"item", "stock", "warehouse", "reorder"},
+    "suppliers": {"supplier", "contact", "spend"},
+    "orders": {"order", "sale", "spend", "pending", "completed", "cancelled", "total"},
+    "order_items": {"line", "sold", "ordered", "demand"},
+    "users": {"user", "employee", "staff"},
+    "activity_logs": {"activity", "log", "audit", "history", "action", "change", "changed"},
+    "anomalies": {"anomaly", "alert", "unusual", "outlier", "spike", "drop"},
+    "inventory_history": {"stock", "level", "levels", "was", "previous", "past", "checkpoint"},
+}
+
+_TYPE_NAMES = [
+    (Boolean, "boolean"),
+    (Integer, "int"),
+    (Float, "float"),
+    (Numeric, "decimal"),
+    (DateTime, "datetime"),
+    (Text, "text"),
+    (String, "string"),
+]
+
+_sample_values: Dict[str, List[str]] = {}
+_samples_lock = threading.Lock()
+
+
+def _type_name(column) -> str:
+    for sql_type, name in _TYPE_NAMES:
+        if isinstance(column.type, sql_type):
+            return name
+    return str(column.type).lower()
+
+
+def _build_catalog() -> Dict[str, dict]:
+    """
+    Describe every mapped table from the SQLAlchemy metadata in app/models.py
+    """
+    catalog = {}
+    for table in Base.metadata.sorted_tables:
+        if table.name in SCHEMA_EXCLUDED_TABLES or table.info.get("derived"):
+            continue
+        columns = []
+        foreign_tables = set()
+        keywords = {table.name} | TABLE_SYNONYMS.get(table.name, set())
+        for column in table.columns:
+            notes = []
+            if column.primary_key:
+                notes.append("pk")
+            elif column.unique:
+                notes.append("unique")
+            elif column.index:
+                notes.append("indexed")
+            for foreign_key in column.foreign_keys:
+                notes.append(f"fk {foreign_key.target_fullname}")
+                foreign_tables.add(foreign_key.column.table.name)
+            columns.append({"name": column.name, "type": _type_name(column), "notes": notes})
+            if not column.foreign_keys:
+                keywords |= set(tokenize(column.name.replace("_", " ")))
+        catalog[table.name] = {
+            "columns": columns,
+            "foreign_tables": foreign_tables,
+            "keywords": frozenset(keywords - {"id"}),
+        }
+    return catalog
+
+
+# Built once at import from the model metadata
+SCHEMA_CATALOG = _build_catalog()
+
+
+def table_names() -> Set[str]:
+    return set(SCHEMA_CATALOG)
+
+
+def load_sample_values(db: Session) -> Dict[str, List[str]]:
+    """
+    Sample distinct values of the configured low-cardinality columns. Columns
+    with more than SCHEMA_SAMPLE_MAX_VALUES values are skipped.
+    """
+    samples = {}
+    for qualified_name in SCHEMA_SAMPLE_COLUMNS:
+        table_name, _, column_name = qualified_name.partition(".")
+        table = Base.metadata.tables.get(table_name)
+        if table is None or column_name not in table.columns or table_name not in SCHEMA_CATALOG:
+            print(f"Skipping unknown schema sample column: {qualified_name}")
+            continue
+        column = table.columns[column_name]
+        statement = (
+            select(column).where(column.isnot(None)).distinct()
+            .limit(SCHEMA_SAMPLE_MAX_VALUES + 1)
+        )
+        values = [str(value) for value in db.execute(statement).scalars()]
+        if values and len(values) <= SCHEMA_SAMPLE_MAX_VALUES:
+            samples[qualified_name] = sorted(values)
+
+    with _samples_lock:
+        _sample_values.clear()
+        _sample_values.update(samples)
+    _render_tables.cache_clear()
+    return samples
+
+
+def warm_up() -> None:
+    """
+    Load sample values at application startup. Failures only mean prompts go
+    out without them.
+    """
+    db = ReadSessionLocal()
+    try:
+        samples = load_sample_values(db)
+        print(f"Schema context ready: {len(SCHEMA_CATALOG)} tables, {len(samples)} sampled columns")
+    except Exception as e:
+        print(f"Could not sample schema values: {str(e)}")
+    finally:
+        db.close()
+
+
+def select_tables(query_text: str) -> FrozenSet[str]:
+    """
+    Pick the tables a question is about by lexical overlap with table and column
+    names, adding any table that links two picked tables (e.g. order_items
+    between orders and inventory). Returns every table if nothing matches.
+    """
+    tokens = set(tokenize(query_text)) - STOPWORDS
+    picked = {name for name, entry in SCHEMA_CATALOG.items() if tokens & entry["keywords"]}
+    if not picked:
+        return frozenset(SCHEMA_CATALOG)
+
+    for name, entry in SCHEMA_CATALOG.items():
+        if name not in picked and len(entry["foreign_tables"] & picked) >= 2:
+            picked.add(name)
+    return frozenset(picked)
+
+
+@lru_cache(maxsize=256)
+def _render_tables(tables: FrozenSet[str]) -> str:
+    lines = ["Tables:"]
+    for name in SCHEMA_CATALOG:
+        if name not in tables:
+            continue
+        column_descriptions = []
+        for column in SCHEMA_CATALOG[name]["columns"]:
+            description = f"{column['name']} {column['type']}"
+            if column["notes"]:
+                description += " " + " ".join(column["notes"])
+            values = _sample_values.get(f"{name}.{column['name']}")
+            if values:
+                description += " values: " + "|".join(values)
+            column_descriptions.append(description)
+        lines.append(f"{name}({', '.join(column_descriptions)})")
+    return "\n".join(lines)
+
+
+def get_prompt_schema(query_text: Optional[str] = None) -> str:
+    """
+    Compact schema description for the LLM prompt, limited to the tables
+    relevant to query_text when one is given
+    """
+    tables = select_tables(query_text) if query_text else frozenset(SCHEMA_CATALOG)
+    return _render_tables(tables)
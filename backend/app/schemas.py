@@ -1,6 +1,6 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import List, Optional, Dict, Any
-from datetime import datetime
+from datetime import date, datetime
 
 # Token schemas
 class Token(BaseModel):
@@ -18,6 +18,12 @@ class UserBase(BaseModel):
 class UserCreate(UserBase):
     password: str
 
+class UserUpdate(BaseModel):
+    email: Optional[EmailStr] = None
+    full_name: Optional[str] = None
+    password: Optional[str] = None
+    is_active: Optional[bool] = None
+
 class User(UserBase):
     id: int
     is_active: bool
@@ -99,15 +105,89 @@ class OrderUpdate(BaseModel):
     status: Optional[str] = None
     supplier_id: Optional[int] = None
 
-class Order(OrderBase):
+class OrderSummary(OrderBase):
     id: int
     order_date: datetime
     total_amount: float
-    order_items: List[OrderItem] = []
 
     class Config:
         orm_mode = True
 
+class Order(OrderSummary):
+    order_items: List[OrderItem] = []
+
+class OrderBulkCreate(BaseModel):
+    orders: List[OrderCreate]
+
+class StockShortage(BaseModel):
+    inventory_id: int
+    requested: int
+    available: Optional[int] = None
+
+class OrderRejection(BaseModel):
+    index: int
+    shortages: List[StockShortage]
+
+class OrderBulkResult(BaseModel):
+    created: List[OrderSummary]
+    rejected: List[OrderRejection]
+
+# CSV import schemas
+class ImportRowError(BaseModel):
+    line: int
+    error: str
+
+class ImportResult(BaseModel):
+    entity_type: str
+    imported: int
+    failed: int
+    errors: List[ImportRowError]
+    errors_truncated: bool = False
+
+# Dashboard schemas
+class InventoryKpis(BaseModel):
+    item_count: int
+    total_quantity: int
+    stock_value: float
+    low_stock_count: int
+    low_stock_threshold: int
+
+class StockBucket(BaseModel):
+    category: Optional[str] = None
+    location: Optional[str] = None
+    item_count: int
+    total_quantity: int
+    stock_value: float
+    low_stock_count: int
+
+class OrderStatusKpis(BaseModel):
+    status: Optional[str] = None
+    order_count: int
+    total_value: float
+
+class OrderKpis(BaseModel):
+    order_count: int
+    total_value: float
+    by_status: List[OrderStatusKpis]
+
+class SupplierSpend(BaseModel):
+    supplier_id: int
+    name: Optional[str] = None
+    order_count: int
+    total_spend: float
+
+class SupplierCounts(BaseModel):
+    total: int
+    active: int
+
+class DashboardSummary(BaseModel):
+    inventory: InventoryKpis
+    stock_by_category: List[StockBucket]
+    stock_by_location: List[StockBucket]
+    orders: OrderKpis
+    top_suppliers: List[SupplierSpend]
+    suppliers: SupplierCounts
+
 # Activity Log schemas
 class ActivityLogBase(BaseModel):
     action: str
@@ -116,7 +196,11 @@ class ActivityLogBase(BaseModel):
     details: Optional[str] = None
 
 class ActivityLogCreate(ActivityLogBase):
-    pass
+    # Client entries are written by the buffered audit writer, so they are
+    # checked against the activity_logs columns up front
+    action: str = Field(min_length=1, max_length=100)
+    entity_type: str = Field(min_length=1, max_length=50)
+    entity_id: int = Field(ge=-2147483648, le=2147483647)
 
 class ActivityLog(ActivityLogBase):
     id: int
@@ -133,9 +217,133 @@ class NLPQuery(BaseModel):
 class NLQueryCreate(BaseModel):
     query_text: str
 
+class NLBatchQueryCreate(BaseModel):
+    query_texts: List[str]
+
 class NLPQueryResult(BaseModel):
     success: bool
     query: str
     sql: Optional[str] = None
+    cached: Optional[bool] = None
     results: Optional[List[Dict[str, Any]]] = None
-    error: Optional[str] = None
\ No newline at end of file
+    error: Optional[str] = None
+
+# Demand forecast schemas
+class ItemForecast(BaseModel):
+    inventory_id: int
+    product_name: Optional[str] = None
+    category: Optional[str] = None
+    current_stock: int
+    forecast_demand: float
+    forecast_lower: float
+    forecast_upper: float
+    lead_time_demand: float
+    safety_stock: float
+    reorder_point: float
+    reorder_now: bool
+    recommended_order_quantity: int
+    history_days: int
+    periods: Optional[List[float]] = None
+
+class ForecastResult(BaseModel):
+    generated_at: datetime
+    fitted_through: date
+    horizon: int
+    period_type: str
+    lead_time_days: int
+    forecasts: List[ItemForecast]
+
+# Supplier recommendation schemas
+class SupplierMetricsSummary(BaseModel):
+    order_count: int
+    cancellation_rate: float
+    units: int
+    spend: float
+    price_index: Optional[float] = None
+    avg_fulfilment_hours: Optional[float] = None
+    last_order_date: Optional[datetime] = None
+
+class SupplierScores(BaseModel):
+    price: Optional[float] = None
+    volume: Optional[float] = None
+    reliability: Optional[float] = None
+    delivery: Optional[float] = None
+    overall: float
+
+class SupplierRecommendation(BaseModel):
+    supplier_id: int
+    name: Optional[str] = None
+    contact_name: Optional[str] = None
+    email: Optional[str] = None
+    phone: Optional[str] = None
+    metrics: SupplierMetricsSummary
+    scores: SupplierScores
+    recommendation: str
+
+class SupplierRecommendationResult(BaseModel):
+    category: Optional[str] = None
+    weights: Dict[str, float]
+    refreshed_at: Optional[datetime] = None
+    recommendations: List[SupplierRecommendation]
+
+# Anomaly schemas
+class Anomaly(BaseModel):
+    id: int
+    detected_at: datetime
+    anomaly_type: str
+    severity: str
+    inventory_id: Optional[int] = None
+    supplier_id: Optional[int] = None
+    order_id: Optional[int] = None
+    observed: Optional[float] = None
+    expected: Optional[float] = None
+    score: Optional[float] = None
+    message: Optional[str] = None
+
+    class Config:
+        orm_mode = True
+
+# Report schemas
+class ReportPeriod(BaseModel):
+    name: str
+    start: datetime
+    end: datetime
+
+class Report(BaseModel):
+    report_type: str
+    period: ReportPeriod
+    filters: Dict[str, Any]
+    generated_at: datetime
+    cached: bool
+    summary: Dict[str, Any]
+    rows: List[Dict[str, Any]]
+    insights: List[str]
+
+class ReportJob(BaseModel):
+    job_id: str
+    status: str
+    format: str
+    filename: str
+    error: Optional[str] = None
+
+# Inventory history schemas
+class StockLevel(BaseModel):
+    inventory_id: int
+    location: Optional[str] = None
+    at: datetime
+    quantity: Optional[int] = None
+    tracked_since: Optional[datetime] = None
+
+class StockPoint(BaseModel):
+    timestamp: datetime
+    quantity: int
+
+class StockCurve(BaseModel):
+    inventory_id: int
+    location: Optional[str] = None
+    start: datetime
+    end: datetime
+    tracked_since: Optional[datetime] = None
+    opening_quantity: Optional[int] = None
+    closing_quantity: int
+    points: List[StockPoint]
@@ -0,0 +1,119 @@
+import json
+import os
+from typing import Iterable, Optional
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import SqlglotError
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+
+from .database import engine
+
+# Load environment variables
+load_dotenv()
+
+# Limits applied to generated SQL before it reaches the database
+NLQ_DEFAULT_LIMIT = int(os.getenv("NLQ_DEFAULT_LIMIT", "100"))
+NLQ_MAX_LIMIT = int(os.getenv("NLQ_MAX_LIMIT", "10000"))
+NLQ_MAX_PLAN_COST = float(os.getenv("NLQ_MAX_PLAN_COST", "100000"))
+NLQ_MAX_PLAN_ROWS = float(os.getenv("NLQ_MAX_PLAN_ROWS", "1000000"))
+
+# SQLAlchemy dialect name -> sqlglot dialect name
+_SQLGLOT_DIALECTS = {"postgresql": "postgres", "sqlite": "sqlite", "mysql": "mysql"}
+
+# Statement types that must never appear anywhere inside a generated query
+_FORBIDDEN_EXPRESSIONS = (exp.Insert, exp.Update, exp.Delete, exp.Merge, exp.Drop, exp.Create, exp.Command)
+
+
+class SQLValidationError(ValueError):
+    """Raised when generated SQL is unsafe or too expensive to run"""
+
+
+def get_sql_dialect() -> Optional[str]:
+    return _SQLGLOT_DIALECTS.get(engine.dialect.name)
+
+
+def validate_sql(sql_query: str, allowed_tables: Iterable[str], dialect: Optional[str] = None) -> str:
+    """
+    Parse a generated query and return a normalized, safe version of it.
+
+    Rejects anything that is not a single read-only SELECT (or set operation of
+    SELECTs), rejects tables outside allowed_tables, and adds a LIMIT when one is
+    missing or clamps one that exceeds NLQ_MAX_LIMIT.
+    """
+    dialect = dialect or get_sql_dialect()
+    allowed = {table.lower() for table in allowed_tables}
+
+    try:
+        statements = [statement for statement in sqlglot.parse(sql_query, read=dialect) if statement is not None]
+    except SqlglotError as e:
+        raise SQLValidationError(f"Could not parse SQL: {str(e)}")
+
+    if len(statements) != 1:
+        raise SQLValidationError(f"Expected exactly one SQL statement, got {len(statements)}")
+
+    statement = statements[0]
+    if not isinstance(statement, exp.Query):
+        raise SQLValidationError(f"Only SELECT statements are allowed, got {statement.key.upper()}")
+
+    forbidden = statement.find(*_FORBIDDEN_EXPRESSIONS)
+    if forbidden is not None:
+        raise SQLValidationError(f"{forbidden.key.upper()} is not allowed inside a query")
+
+    for select in statement.find_all(exp.Select):
+        if select.args.get("into") is not None:
+            raise SQLValidationError("SELECT ... INTO is not allowed")
+        if select.args.get("locks"):
+            raise SQLValidationError("Locking clauses are not allowed")
+
+    # Names defined by WITH clauses are not real tables
+    cte_names = {cte.alias_or_name.lower() for cte in statement.find_all(exp.CTE)}
+    for table in statement.find_all(exp.Table):
+        name = table.name.lower()
+        if name in cte_names:
+            continue
+        if name not in allowed:
+            raise SQLValidationError(f"Table '{table.name}' is not allowed")
+
+    # Bound the result size at the database rather than after the fact
+    limit = statement.args.get("limit")
+    if limit is None:
+        statement = statement.limit(NLQ_DEFAULT_LIMIT)
+    else:
+        limit_value = limit.expression
+        if not isinstance(limit_value, exp.Literal) or not limit_value.is_int:
+            raise SQLValidationError("LIMIT must be an integer literal")
+        if int(limit_value.name) > NLQ_MAX_LIMIT:
+            statement = statement.limit(NLQ_MAX_LIMIT)
+
+    return statement.sql(dialect=dialect) + ";"
+
+
+def check_query_cost(db: Session, sql_query: str) -> Optional[dict]:
+    """
+    Run EXPLAIN on a validated query and refuse plans whose estimated cost or
+    row count is above NLQ_MAX_PLAN_COST / NLQ_MAX_PLAN_ROWS.
+
+    Only PostgreSQL exposes planner estimates; on other databases this is a no-op
+    and returns None.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return None
+
+    plan_output = db.execute(text("EXPLAIN (FORMAT JSON) " + sql_query.rstrip().rstrip(";"))).scalar()
+    if isinstance(plan_output, str):
+        plan_output = json.loads(plan_output)
+    plan = plan_output[0]["Plan"]
+
+    estimate = {"total_cost": plan.get("Total Cost", 0.0), "plan_rows": plan.get("Plan Rows", 0)}
+    if estimate["total_cost"] > NLQ_MAX_PLAN_COST:
+        raise SQLValidationError(
+            f"Query plan cost {estimate['total_cost']:.0f} exceeds the limit of {NLQ_MAX_PLAN_COST:.0f}"
+        )
+    if estimate["plan_rows"] > NLQ_MAX_PLAN_ROWS:
+        raise SQLValidationError(
+            f"Query plan estimates {estimate['plan_rows']:.0f} rows, above the limit of {NLQ_MAX_PLAN_ROWS:.0f}"
+        )
+    return estimate
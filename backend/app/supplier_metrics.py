@@ -0,0 +1,300 @@
+import asyncio
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import case, extract, func, insert, literal, select, union_all
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+
+from . import audit_partitions, crud, models
+from .database import Base, SessionLocal, engine
+
+# Load environment variables
+load_dotenv()
+
+# Seconds between background recomputes of the supplier_metrics table
+SUPPLIER_METRICS_REFRESH_SECONDS = int(os.getenv("SUPPLIER_METRICS_REFRESH_SECONDS", "900"))
+# Default weights of the ranking criteria; callers may override any of them
+SUPPLIER_WEIGHTS = {
+    "price": float(os.getenv("SUPPLIER_WEIGHT_PRICE", "0.3")),
+    "volume": float(os.getenv("SUPPLIER_WEIGHT_VOLUME", "0.2")),
+    "reliability": float(os.getenv("SUPPLIER_WEIGHT_RELIABILITY", "0.3")),
+    "delivery": float(os.getenv("SUPPLIER_WEIGHT_DELIVERY", "0.2")),
+}
+
+CANCELLED_STATUS = "cancelled"
+COMPLETED_STATUS = "completed"
+# Category value of each supplier's all-category row ('' is items without a category)
+ALL_CATEGORIES = "*"
+
+_refresh_lock = threading.Lock()
+_refresh_task: Optional[asyncio.Task] = None
+
+
+def _hours_between(later, earlier, dialect_name: str):
+    if dialect_name == "sqlite":
+        return (func.julianday(later) - func.julianday(earlier)) * 24.0
+    return extract("epoch", later - earlier) / 3600.0
+
+
+def _metrics_select(db: Session, refreshed_at: datetime):
+    """
+    One statement computing every supplier's metrics per category and across
+    all categories. Lines are first grouped per (order, category) so order
+    counts and fulfilment times are per order, then per supplier.
+    """
+    dialect_name = db.get_bind().dialect.name
+    not_cancelled = func.coalesce(models.Order.status, "") != CANCELLED_STATUS
+
+    # Average price paid for each item across all suppliers, the baseline for price_index
+    item_prices = (
+        select(
+            models.OrderItem.inventory_id.label("inventory_id"),
+            func.avg(models.OrderItem.unit_price).label("average_price"),
+        )
+        .join(models.Order, models.Order.id == models.OrderItem.order_id)
+        .where(not_cancelled)
+        .group_by(models.OrderItem.inventory_id)
+        .subquery()
+    )
+
+    # When each order first moved to completed, from the status change audit
+    # trail, including entries already moved into monthly archive tables
+    status_changes = audit_partitions.log_entity(db, lambda source: [
+        source.c.entity_type == "order",
+        source.c.action == crud.ORDER_STATUS_CHANGE_ACTION,
+        # details is "<old status> -> <new status>"
+        source.c.details.like(f"% -> {COMPLETED_STATUS}"),
+    ])
+    completions = (
+        select(
+            status_changes.entity_id.label("order_id"),
+            func.min(status_changes.timestamp).label("completed_at"),
+        )
+        .group_by(status_changes.entity_id)
+        .subquery()
+    )
+
+    def grouped(category, by_category: bool):
+        live_quantity = case((not_cancelled, models.OrderItem.quantity), else_=0)
+        relative_price = models.OrderItem.unit_price / func.nullif(item_prices.c.average_price, 0)
+        per_order = (
+            select(
+                models.Order.supplier_id.label("supplier_id"),
+                category.label("category"),
+                models.Order.id.label("order_id"),
+                func.max(case((models.Order.status == CANCELLED_STATUS, 1), else_=0)).label("cancelled"),
+                func.max(models.Order.order_date).label("order_date"),
+                func.max(_hours_between(completions.c.completed_at, models.Order.order_date, dialect_name)).label("fulfilment_hours"),
+                func.coalesce(func.sum(live_quantity), 0).label("units"),
+                func.coalesce(func.sum(live_quantity * models.OrderItem.unit_price), 0.0).label("spend"),
+                func.sum(live_quantity * relative_price).label("relative_units"),
+            )
+            .select_from(models.OrderItem)
+            .join(models.Order, models.Order.id == models.OrderItem.order_id)
+            .join(models.Inventory, models.Inventory.id == models.OrderItem.inventory_id)
+            .outerjoin(item_prices, item_prices.c.inventory_id == models.OrderItem.inventory_id)
+            .outerjoin(completions, completions.c.order_id == models.Order.id)
+            .where(models.Order.supplier_id.isnot(None))
+            .group_by(models.Order.supplier_id, models.Order.id, *([category] if by_category else []))
+            .subquery()
+        )
+        completed = per_order.c.fulfilment_hours.isnot(None)
+        return (
+            select(
+                per_order.c.category,
+                per_order.c.supplier_id,
+                func.count(),
+                func.sum(per_order.c.cancelled),
+                func.sum(per_order.c.units),
+                func.sum(per_order.c.spend),
+                func.sum(per_order.c.relative_units) / func.nullif(func.sum(per_order.c.units), 0),
+                func.sum(case((completed, 1), else_=0)),
+                func.avg(per_order.c.fulfilment_hours),
+                func.max(per_order.c.order_date),
+                literal(refreshed_at),
+            )
+            .group_by(per_order.c.supplier_id, per_order.c.category)
+        )
+
+    return union_all(
+        grouped(func.coalesce(models.Inventory.category, ""), by_category=True),
+        grouped(literal(ALL_CATEGORIES), by_category=False),
+    )
+
+
+def refresh(db: Session):
+    """
+    Recompute supplier_metrics from orders, order_items and the order status
+    audit trail with a single INSERT ... SELECT
+    """
+    table = models.SupplierMetrics.__table__
+    with _refresh_lock:
+        try:
+            db.execute(table.delete())
+            db.execute(insert(table).from_select(
+                ["category", "supplier_id", "order_count", "cancelled_count", "units", "spend", "price_index",
+                 "completed_count", "avg_fulfilment_hours", "last_order_date", "refreshed_at"],
+                _metrics_select(db, datetime.utcnow())
+            ))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+
+def refresh_safely():
+    db = SessionLocal()
+    try:
+        refresh(db)
+    except Exception as e:
+        print(f"Could not refresh supplier metrics: {str(e)}")
+    finally:
+        db.close()
+
+
+def warm_up() -> None:
+    """
+    Create the supplier_metrics table if missing and fill it on first start
+    """
+    db = SessionLocal()
+    try:
+        Base.metadata.create_all(bind=engine, tables=[models.SupplierMetrics.__table__])
+        if db.query(models.SupplierMetrics).first() is None:
+            refresh(db)
+            print("Supplier metrics computed")
+    except Exception as e:
+        print(f"Could not prepare supplier metrics: {str(e)}")
+    finally:
+        db.close()
+
+
+async def _refresh_periodically():
+    while True:
+        await asyncio.sleep(SUPPLIER_METRICS_REFRESH_SECONDS)
+        await run_in_threadpool(refresh_safely)
+
+
+def start_refresher():
+    global _refresh_task
+    if _refresh_task is None and SUPPLIER_METRICS_REFRESH_SECONDS > 0:
+        _refresh_task = asyncio.get_running_loop().create_task(_refresh_periodically())
+
+
+def stop_refresher():
+    global _refresh_task
+    if _refresh_task is not None:
+        _refresh_task.cancel()
+        _refresh_task = None
+
+
+def _resolve_weights(weights: Optional[Dict[str, Optional[float]]]) -> Dict[str, float]:
+    resolved = dict(SUPPLIER_WEIGHTS)
+    for name, value in (weights or {}).items():
+        if name not in resolved:
+            raise ValueError(f"Unknown criterion '{name}'. Supported: {', '.join(resolved)}")
+        if value is not None:
+            if value < 0:
+                raise ValueError(f"Weight for '{name}' must not be negative")
+            resolved[name] = value
+    if sum(resolved.values()) <= 0:
+        raise ValueError("At least one weight must be positive")
+    return resolved
+
+
+def _scaled(value: Optional[float], low: float, high: float, lower_is_better: bool) -> Optional[float]:
+    if value is None:
+        return None
+    if high == low:
+        return 100.0
+    position = (value - low) / (high - low)
+    return 100.0 * (1 - position if lower_is_better else position)
+
+
+def _recommendation(score: float) -> str:
+    if score > 80:
+        return "Highly Recommended"
+    if score > 60:
+        return "Recommended"
+    return "Consider Alternatives"
+
+
+def get_recommendations(db: Session, category: Optional[str] = None,
+                        weights: Optional[Dict[str, Optional[float]]] = None,
+                        active_only: bool = True, limit: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Rank suppliers for a category (or overall) from the precomputed metrics.
+
+    Each criterion is scored 0-100 against the other candidates: price from
+    price_index (cheapest scores 100), volume from spend relative to the
+    largest, reliability from the cancellation rate and delivery from the
+    average hours to completion. The overall score is the weighted mean of
+    the criteria a supplier has data for.
+
+    Read-only (the session may be bound to a replica): until warm_up or the
+    background refresher has filled supplier_metrics the ranking is empty and
+    refreshed_at is None.
+    """
+    weights = _resolve_weights(weights)
+    refreshed_at = db.query(func.max(models.SupplierMetrics.refreshed_at)).scalar()
+    if refreshed_at is None:
+        return {"category": category, "weights": weights, "refreshed_at": None, "recommendations": []}
+
+    query = (
+        db.query(models.SupplierMetrics, models.Supplier)
+        .join(models.Supplier, models.Supplier.id == models.SupplierMetrics.supplier_id)
+        .filter(models.SupplierMetrics.category == (category if category is not None else ALL_CATEGORIES))
+        .filter(models.SupplierMetrics.order_count > 0)
+    )
+    if active_only:
+        query = query.filter(models.Supplier.is_active.is_(True))
+    rows = query.all()
+
+    prices = [metrics.price_index for metrics, _ in rows if metrics.price_index is not None]
+    hours = [metrics.avg_fulfilment_hours for metrics, _ in rows if metrics.avg_fulfilment_hours is not None]
+    largest_spend = max((metrics.spend for metrics, _ in rows), default=0.0)
+
+    recommendations = []
+    for metrics, supplier in rows:
+        scores = {
+            "price": _scaled(metrics.price_index, min(prices, default=0), max(prices, default=0), True),
+            "volume": 100.0 * metrics.spend / largest_spend if largest_spend > 0 else None,
+            "reliability": 100.0 * (1 - metrics.cancelled_count / metrics.order_count),
+            "delivery": _scaled(metrics.avg_fulfilment_hours, min(hours, default=0), max(hours, default=0), True),
+        }
+        # Criteria without data are left out and the remaining weights rescaled
+        weighted = [(scores[name], weight) for name, weight in weights.items() if scores[name] is not None and weight > 0]
+        total_weight = sum(weight for _, weight in weighted)
+        overall = sum(score * weight for score, weight in weighted) / total_weight if total_weight else 0.0
+        recommendations.append({
+            "supplier_id": supplier.id,
+            "name": supplier.name,
+            "contact_name": supplier.contact_name,
+            "email": supplier.email,
+            "phone": supplier.phone,
+            "metrics": {
+                "order_count": metrics.order_count,
+                "cancellation_rate": round(metrics.cancelled_count / metrics.order_count, 4),
+                "units": metrics.units,
+                "spend": round(metrics.spend, 2),
+                "price_index": round(metrics.price_index, 4) if metrics.price_index is not None else None,
+                "avg_fulfilment_hours": round(metrics.avg_fulfilment_hours, 2) if metrics.avg_fulfilment_hours is not None else None,
+                "last_order_date": metrics.last_order_date,
+            },
+            "scores": {
+                **{name: round(score, 1) if score is not None else None for name, score in scores.items()},
+                "overall": round(overall, 1),
+            },
+            "recommendation": _recommendation(overall),
+        })
+
+    recommendations.sort(key=lambda entry: entry["scores"]["overall"], reverse=True)
+    return {
+        "category": category,
+        "weights": weights,
+        "refreshed_at": refreshed_at,
+        "recommendations": recommendations[:limit] if limit else recommendations,
+    }
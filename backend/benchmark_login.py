@@ -0,0 +1,114 @@
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from dotenv import load_dotenv
+from passlib.context import CryptContext
+
+# Load environment variables from .env file
+load_dotenv()
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))
+    return values[index]
+
+def benchmark_hashing(rounds_list, workers, iterations):
+    """Measure raw bcrypt verifications per second for each cost, using the same thread count as the API"""
+    print(f"\n===== bcrypt verify throughput ({workers} threads, {iterations} verifications per cost) =====\n")
+    for rounds in rounds_list:
+        context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds)
+        hashed = context.hash("benchmark-password")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            start = time.perf_counter()
+            results = list(executor.map(lambda _: context.verify("benchmark-password", hashed), range(iterations)))
+            elapsed = time.perf_counter() - start
+        assert all(results)
+        print(f"rounds={rounds:<3} {iterations / elapsed:8.1f} verifications/s  ({elapsed * workers / iterations * 1000:.1f} ms per verification)")
+
+async def benchmark_endpoint(url, email, password, total, concurrency, probe_url):
+    """
+    Fire `total` logins at /token with `concurrency` in flight and report
+    logins per second and latency. If probe_url is given, a cheap endpoint is
+    polled meanwhile to show whether logins stall other requests.
+    """
+    latencies = []
+    probe_latencies = []
+    failures = 0
+    remaining = iter(range(total))
+    done = asyncio.Event()
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        async def login_worker():
+            nonlocal failures
+            for _ in remaining:
+                start = time.perf_counter()
+                try:
+                    response = await client.post(url, data={"username": email, "password": password})
+                    if response.status_code != 200:
+                        failures += 1
+                except httpx.HTTPError:
+                    failures += 1
+                latencies.append(time.perf_counter() - start)
+
+        async def probe_worker():
+            while not done.is_set():
+                start = time.perf_counter()
+                try:
+                    await client.get(probe_url)
+                except httpx.HTTPError:
+                    pass
+                probe_latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.05)
+
+        probe_task = asyncio.create_task(probe_worker()) if probe_url else None
+        start = time.perf_counter()
+        await asyncio.gather(*(login_worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        if probe_task:
+            await probe_task
+
+    latencies.sort()
+    print(f"\n===== /token throughput ({total} logins, concurrency {concurrency}) =====\n")
+    print(f"Logins per second: {total / elapsed:.1f}")
+    print(f"Failures: {failures}")
+    print(f"Latency ms  p50={percentile(latencies, 0.5) * 1000:.1f}  p95={percentile(latencies, 0.95) * 1000:.1f}  "
+          f"p99={percentile(latencies, 0.99) * 1000:.1f}  mean={statistics.mean(latencies) * 1000:.1f}")
+    if probe_latencies:
+        probe_latencies.sort()
+        print(f"Probe {probe_url} during the run: p50={percentile(probe_latencies, 0.5) * 1000:.1f} ms  "
+              f"max={probe_latencies[-1] * 1000:.1f} ms")
+    return failures == 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Login throughput benchmark")
+    parser.add_argument("--url", default="http://localhost:8000/token", help="Token endpoint of a running API")
+    parser.add_argument("--email", default=os.getenv("BENCHMARK_EMAIL", "admin@example.com"))
+    parser.add_argument("--password", default=os.getenv("BENCHMARK_PASSWORD", "admin"))
+    parser.add_argument("--requests", type=int, default=200, help="Total logins to send")
+    parser.add_argument("--concurrency", type=int, default=20, help="Logins in flight at once")
+    parser.add_argument("--probe-url", default="http://localhost:8000/docs",
+                        help="Cheap endpoint polled during the run to detect event loop stalls ('' to disable)")
+    parser.add_argument("--hash-only", action="store_true", help="Only measure local bcrypt throughput, no server needed")
+    parser.add_argument("--rounds", default=os.getenv("BCRYPT_ROUNDS", "12"),
+                        help="Comma separated bcrypt costs for --hash-only, e.g. 10,11,12")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("AUTH_HASH_WORKERS", str(os.cpu_count() or 4))),
+                        help="Hashing threads for --hash-only")
+    args = parser.parse_args()
+
+    if args.hash_only:
+        benchmark_hashing([int(rounds) for rounds in args.rounds.split(",")], args.workers, args.requests)
+        sys.exit(0)
+
+    success = asyncio.run(benchmark_endpoint(args.url, args.email, args.password, args.requests,
+                                             args.concurrency, args.probe_url or None))
+    sys.exit(0 if success else 1)
@@ -1,19 +1,19 @@
-from fastapi import FastAPI, HTTPException, Depends, status, Form
+from fastapi import FastAPI, HTTPException, Depends, status, Query, Request, Response, File, UploadFile
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import text
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, JSONResponse
 from sqlalchemy.orm import Session
 import os
 from dotenv import load_dotenv
-from typing import List, Dict, Any, Optional
+from typing import List, Optional, Union
 from datetime import datetime, timedelta
-import base64
-from openai import AzureOpenAI
 
 # Import app modules
-from app import models, schemas, crud
-from app.database import get_db
-from app.auth import authenticate_user, create_access_token, get_current_active_user, ACCESS_TOKEN_EXPIRE_MINUTES
+from app import models, schemas, crud, query_cache, llm, nlp_to_sql, schema_context, csv_import, csv_export, dashboard, forecast, supplier_metrics, anomalies, reports, audit, audit_partitions, inventory_history
+from app.database import get_db, get_read_db, ASYNC_DATABASE_ENABLED, dispose_async_engine
+from app.pagination import InvalidCursorError, paged_response
+from app.auth import authenticate_user_async, create_access_token, get_current_active_user, shutdown_hash_pool, ACCESS_TOKEN_EXPIRE_MINUTES
 
 # Initialize FastAPI app
 app = FastAPI(title="Supply Chain Management API")
@@ -25,262 +25,140 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allow all methods
     allow_headers=["*"],  # Allow all headers
+    expose_headers=["X-Next-Cursor"],  # Let the frontend read pagination cursors
 )
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Azure OpenAI client
-try:
-    # Get Azure OpenAI configuration from environment variables
-    azure_api_key = os.getenv("AZURE_OPENAI_API_KEY", "Get This From Azure")
-    azure_endpoint = os.getenv("AZURE_OPENAI_ENDPOINT", "https://test-aipractice-openai.openai.azure.com/")
-    azure_deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME", "gpt-35-turbo-16k")
-    azure_api_version = os.getenv("AZURE_OPENAI_API_VERSION", "2023-05-15")  # Updated to a stable version
-
-    client = AzureOpenAI(
-        api_key=azure_api_key,
-        azure_endpoint=azure_endpoint,
-        api_version=azure_api_version
-    )
-    print("Azure OpenAI client initialized successfully")
-except Exception as e:
-    print(f"Error initializing Azure OpenAI client: {str(e)}")
-    print("API calls will likely fail without a valid Azure OpenAI configuration")
-
-# Database schema information for context
-DB_SCHEMA = """
-Tables:
-1. inventory
-   - id (int, primary key)
-   - product_name (string, indexed)
-   - description (string)
-   - quantity (int)
-   - unit_price (float)
-   - category (string, indexed)
-   - location (string)
-   - last_updated (datetime)
-
-2. suppliers
-   - id (int, primary key)
-   - name (string, indexed)
-   - contact_name (string)
-   - email (string)
-   - phone (string)
-   - address (string)
-   - is_active (boolean)
-
-3. orders
-   - id (int, primary key)
-   - order_date (datetime)
-   - status (string, indexed) - values: pending, completed, cancelled
-   - total_amount (float)
-   - supplier_id (int, foreign key to suppliers.id)
-
-4. order_items
-   - id (int, primary key)
-   - order_id (int, foreign key to orders.id)
-   - inventory_id (int, foreign key to inventory.id)
-   - quantity (int)
-   - unit_price (float)
-
-5. users
-   - id (int, primary key)
-   - email (string, unique, indexed)
-   - hashed_password (string)
-   - full_name (string)
-   - is_active (boolean)
-
-6. activity_logs
-   - id (int, primary key)
-   - user_id (int, foreign key to users.id)
-   - action (string)
-   - entity_type (string) - values: inventory, order, supplier
-   - entity_id (int)
-   - details (text)
-   - timestamp (datetime)
-"""
-
-def generate_sql_from_text(query_text: str) -> str:
+# Maximum number of questions accepted by /ai/search/batch
+NLQ_BATCH_MAX_QUERIES = int(os.getenv("NLQ_BATCH_MAX_QUERIES", "50"))
+
+@app.on_event("startup")
+async def startup():
+    # Build the shared LLM clients and open a pooled connection before traffic arrives
+    await llm.warm_up()
+    # Sample low-cardinality column values for the NL-to-SQL prompt context
+    await run_in_threadpool(schema_context.warm_up)
+    # Create and fill the dashboard KPI tables on first start
+    await run_in_threadpool(dashboard.warm_up)
+    await run_in_threadpool(supplier_metrics.warm_up)
+    # Replay recent orders into the rolling statistics anomaly checks compare against
+    await run_in_threadpool(anomalies.warm_up)
+    # Audit query indexes, upcoming partitions and retention
+    await run_in_threadpool(audit_partitions.warm_up)
+    # Stock history starts from a checkpoint of current quantities
+    await run_in_threadpool(inventory_history.warm_up)
+    supplier_metrics.start_refresher()
+    audit_partitions.start_maintainer()
+    inventory_history.start_checkpointer()
+    # Batch audit trail entries into multi-row inserts off the request path
+    audit.start_writer()
+
+@app.on_event("shutdown")
+async def shutdown():
+    supplier_metrics.stop_refresher()
+    audit_partitions.stop_maintainer()
+    inventory_history.stop_checkpointer()
+    reports.shutdown_render_pool()
+    await audit.stop_writer()
+    await llm.close()
+    shutdown_hash_pool()
+    await dispose_async_engine()
+
+@app.exception_handler(InvalidCursorError)
+async def invalid_cursor_handler(request: Request, exc: InvalidCursorError):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+# AI-powered search endpoint (Natural Language to SQL)
+@app.post("/ai/search/", response_model=dict)
+async def ai_search(query: schemas.NLQueryCreate, stream: bool = False, db: Session = Depends(get_read_db), current_user: models.User = Depends(get_current_active_user)):
     """
-    Convert natural language query to SQL using Azure OpenAI API
-    If API call fails, use a rule-based fallback approach
+    Process natural language query and return SQL results.
+    With ?stream=true the rows are streamed as NDJSON instead of buffered.
     """
+    if not stream:
+        result = await nlp_to_sql.process_natural_language_query_async(db, query.query_text)
+        return result
     
-    try:
-        # Prepare the prompt for OpenAI
-        system_message = f"""You are a SQL expert. Convert the following natural language query into a SQL query for a supply chain management system.
-Use the following database schema information:
-
-{DB_SCHEMA}
-
-Only return the SQL query without any explanations or markdown formatting.
-The query must be a SELECT statement for security reasons."""
-        
-        user_message = f"Convert to SQL: {query_text}"
-        
-        # Check if Azure OpenAI API key is available
-        if not azure_api_key or azure_api_key == "your-azure-openai-api-key":
-            print("Azure OpenAI API key not properly configured, using rule-based fallback")
-            return generate_fallback_sql_query(query_text)
-        
-        # Generate SQL using Azure OpenAI API
-        print("Generating SQL using Azure OpenAI API")
-        
+    db.close()
+    sql_query, cached, cacheable = await nlp_to_sql.resolve_sql_async(query.query_text)
+    if not cached:
         try:
-            # Make API call to Azure OpenAI
-            response = client.chat.completions.create(
-                model=azure_deployment,  # Use deployment_name for Azure OpenAI
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": user_message}
-                ],
-                temperature=0.1,  # Lower temperature for more deterministic outputs
-                max_tokens=500,
-                top_p=0.95,
-                frequency_penalty=0,
-                presence_penalty=0,
-                stop=None,  
-                stream=False
-            )
-            
-            # Extract the SQL query from the response
-            sql_query = response.choices[0].message.content.strip()
-            print(f"Generated SQL query: {sql_query}")
-            
-            # Clean up any additional text that might be included
-            # Look for SQL keywords to identify the start of the query
-            sql_keywords = ["SELECT", "select"]
-            for keyword in sql_keywords:
-                if keyword in sql_query:
-                    sql_query = sql_query[sql_query.find(keyword):]
-                    break
-            
-            # Add semicolon if missing
-            if not sql_query.endswith(";"):
-                sql_query += ";"
-            
-            print(f"SQL query extracted (length: {len(sql_query)}): {sql_query}")
-        except Exception as api_error:
-            print(f"Azure OpenAI API call failed with error: {str(api_error)}, using rule-based fallback")
-            return generate_fallback_sql_query(query_text)
-        
-        # Validate the SQL query
-        if not sql_query or len(sql_query) < 10:  # Basic length check
-            print("Extracted SQL query is too short or empty, using rule-based fallback")
-            return generate_fallback_sql_query(query_text)
-        
-        # Basic validation to ensure it's a SELECT query (for safety)
-        if not sql_query.lower().startswith("select"):
-            print(f"Query doesn't start with SELECT: {sql_query}, using rule-based fallback")
-            return generate_fallback_sql_query(query_text)
-        
-        return sql_query
+            await run_in_threadpool(nlp_to_sql.check_sql_query_cost, sql_query)
+        except Exception as e:
+            return {"success": False, "query": query.query_text, "error": str(e)}
+    if cacheable:
+        query_cache.cache_sql(query.query_text, sql_query)
     
-    except Exception as e:
-        print(f"Error in generate_sql_from_text: {str(e)}, using rule-based fallback")
-        return generate_fallback_sql_query(query_text)
+    # A sync generator is iterated in the threadpool, keeping cursor reads off the event loop
+    return StreamingResponse(
+        nlp_to_sql.stream_sql_query(query.query_text, sql_query),
+        media_type="application/x-ndjson"
+    )
 
-def generate_fallback_sql_query(query_text: str) -> str:
-    """
-    Generate a simple SQL query based on keywords in the natural language query
-    This is a fallback mechanism when the LLM is not available
-    """
-    query_lower = query_text.lower()
-    
-    # Default query - return a limited set of inventory items
-    default_query = "SELECT * FROM inventory LIMIT 10;"
-    
-    # Check for specific entity types in the query
-    if any(word in query_lower for word in ["inventory", "product", "item", "stock"]):
-        if "low" in query_lower or "out of" in query_lower:
-            return "SELECT * FROM inventory WHERE quantity < 10 ORDER BY quantity ASC;"
-        elif "expensive" in query_lower or "highest price" in query_lower:
-            return "SELECT * FROM inventory ORDER BY unit_price DESC LIMIT 10;"
-        elif "cheap" in query_lower or "lowest price" in query_lower:
-            return "SELECT * FROM inventory ORDER BY unit_price ASC LIMIT 10;"
-        else:
-            return "SELECT * FROM inventory LIMIT 20;"
-    
-    elif any(word in query_lower for word in ["supplier", "vendor", "provider"]):
-        if "active" in query_lower:
-            return "SELECT * FROM suppliers WHERE is_active = TRUE;"
-        else:
-            return "SELECT * FROM suppliers LIMIT 20;"
-    
-    elif any(word in query_lower for word in ["order", "purchase"]):
-        if "pending" in query_lower:
-            return "SELECT * FROM orders WHERE status = 'pending';"
-        elif "completed" in query_lower:
-            return "SELECT * FROM orders WHERE status = 'completed';"
-        elif "cancelled" in query_lower or "canceled" in query_lower:
-            return "SELECT * FROM orders WHERE status = 'cancelled';"
-        else:
-            return "SELECT * FROM orders LIMIT 20;"
-    
-    elif any(word in query_lower for word in ["user", "account"]):
-        return "SELECT id, email, full_name, is_active FROM users LIMIT 20;"
-    
-    # If we can't determine the intent, return a default query
-    print(f"Could not determine specific intent from query: '{query_text}', using default query")
-    return default_query
+@app.post("/ai/search/batch", response_model=dict)
+async def ai_search_batch(batch: schemas.NLBatchQueryCreate, db: Session = Depends(get_read_db), current_user: models.User = Depends(get_current_active_user)):
+    """Process many natural language queries in one request, results keyed by question"""
+    if len(batch.query_texts) > NLQ_BATCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"A batch may contain at most {NLQ_BATCH_MAX_QUERIES} queries"
+        )
+    return await nlp_to_sql.process_natural_language_batch_async(db, batch.query_texts)
 
-def execute_sql_query(db: Session, sql_query: str) -> List[Dict[str, Any]]:
+@app.get("/ai/search/cache-stats", response_model=dict)
+def ai_search_cache_stats(current_user: models.User = Depends(get_current_active_user)):
+    """Hit/miss counters for the natural language query caches"""
+    return query_cache.get_cache_stats()
+
+# Demand forecasting endpoints
+@app.get("/ai/forecast", response_model=schemas.ForecastResult, response_model_exclude_none=True)
+def demand_forecast(inventory_id: Optional[List[int]] = Query(None), category: Optional[str] = None, horizon: int = 30, period_type: str = "day", lead_time_days: Optional[int] = None, include_periods: bool = True, db: Session = Depends(get_read_db), current_user: models.User = Depends(get_current_active_user)):
     """
-    Execute the generated SQL query and return the results
+    Demand forecast and recommended reorder quantity per inventory item,
+    for `horizon` periods of `period_type` (day, week or month)
     """
     try:
-        # Execute the query
-        print("execute_sql_query : "+ sql_query)
-        result = db.execute(text(sql_query))
-        
-        print("SQL query executed successfully, processing results...")
-        # Convert the result to a list of dictionaries
-        column_names = result.keys()
-        rows = result.fetchall()
-        
-        # Format the results
-        formatted_results = [
-            {column: value for column, value in zip(column_names, row)}
-            for row in rows
-        ]
-        
-        return formatted_results
-    
-    except Exception as e:
-        raise Exception(f"Error executing SQL query: {str(e)}")
-
-def process_natural_language_query(db: Session, query_text: str) -> Dict[str, Any]:
+        return forecast.get_forecasts(db, inventory_ids=inventory_id, category=category, horizon=horizon, period_type=period_type, lead_time_days=lead_time_days, include_periods=include_periods)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/ai/forecast/cache-stats", response_model=dict)
+def demand_forecast_cache_stats(current_user: models.User = Depends(get_current_active_user)):
+    """Size and refresh counters of the fitted forecast models"""
+    return forecast.forecast_cache.get_stats()
+
+# Supplier recommendation endpoints
+@app.get("/ai/suppliers/recommendations", response_model=schemas.SupplierRecommendationResult)
+def supplier_recommendations(category: Optional[str] = None, price_weight: Optional[float] = None, volume_weight: Optional[float] = None, reliability_weight: Optional[float] = None, delivery_weight: Optional[float] = None, active_only: bool = True, limit: Optional[int] = None, db: Session = Depends(get_read_db), current_user: models.User = Depends(get_current_active_user)):
     """
-    Process a natural language query by converting it to SQL and executing it
+    Suppliers ranked by weighted price, volume, reliability and delivery
+    scores, overall or for one inventory category
     """
-    print("process_natural_language_query: " + query_text)
+    weights = {"price": price_weight, "volume": volume_weight, "reliability": reliability_weight, "delivery": delivery_weight}
     try:
-        # Generate SQL from natural language
-        sql_query = generate_sql_from_text(query_text)
-        # Execute the SQL query
-        results = execute_sql_query(db, sql_query)
-        
-        return {
-            "success": True,
-            "query": query_text,
-            "sql": sql_query,
-            "results": results
-        }
-    
-    except Exception as e:
-        return {
-            "success": False,
-            "query": query_text,
-            "error": str(e)
-        }
-
-# AI-powered search endpoint (Natural Language to SQL)
-@app.post("/ai/search/", response_model=dict)
-def ai_search(query: schemas.NLQueryCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
-    """Process natural language query and return SQL results"""
-    result = process_natural_language_query(db, query.query_text)
-    return result
+        return supplier_metrics.get_recommendations(db, category=category, weights=weights, active_only=active_only, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/ai/suppliers/metrics/refresh", response_model=dict)
+def refresh_supplier_metrics(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
+    """Recompute the supplier metrics table now instead of waiting for the next scheduled refresh"""
+    supplier_metrics.refresh(db)
+    return {"success": True, "refreshed_at": datetime.utcnow().isoformat()}
+
+# Anomaly detection endpoints
+@app.get("/ai/anomalies", response_model=List[schemas.Anomaly])
+def read_anomalies(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, sort_by: str = "id", order: str = Query("desc", pattern="^(asc|desc)$"), anomaly_type: Optional[str] = None, severity: Optional[str] = None, inventory_id: Optional[int] = None, since: Optional[datetime] = None, db: Session = Depends(get_read_db), current_user: models.User = Depends(get_current_active_user)):
+    """
+    Anomalies flagged as orders and stock updates were written, newest first.
+    Nothing is recomputed here; detection happens on the write path.
+    """
+    if anomaly_type is not None and anomaly_type not in anomalies.ANOMALY_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unknown anomaly_type. Supported: {', '.join(anomalies.ANOMALY_TYPES)}")
+    page = anomalies.get_anomalies(db, skip=skip, limit=limit, cursor=cursor, sort_by=sort_by, descending=order == "desc", anomaly_type=anomaly_type, severity=severity, inventory_id=inventory_id, since=since)
+    return paged_response(response, page)
 
 # Health check endpoint
 @app.get("/health")
@@ -290,10 +168,69 @@ def health_check(current_user: models.User = Depends(get_current_active_user)):
         "message": "Health check successful"
     }
 
+# Dashboard endpoints
+@app.get("/dashboard/summary", response_model=schemas.DashboardSummary, response_model_exclude_none=True)
+def dashboard_summary(db: Session = Depends(get_read_db), current_user: models.User = Depends(get_current_active_user)):
+    """Precomputed KPIs for the dashboard, read from the aggregate tables"""
+    return dashboard.get_summary(db)
+
+@app.post("/dashboard/rebuild", response_model=schemas.DashboardSummary, response_model_exclude_none=True)
+def dashboard_rebuild(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
+    """Recompute the KPI tables from scratch, e.g. after changing LOW_STOCK_THRESHOLD"""
+    dashboard.rebuild(db)
+    return dashboard.get_summary(db)
+
+# Report endpoints
+@app.get("/reports/{report_type}", response_model=schemas.Report)
+def read_report(report_type: str, period: str = "last_30_days", start: Optional[datetime] = None, end: Optional[datetime] = None, category: Optional[str] = None, supplier_id: Optional[int] = None, location: Optional[str] = None, db: Session = Depends(get_read_db), current_user: models.User = Depends(get_current_active_user)):
+    """
+    Inventory turns, fill rate, spend by supplier or order cycle time for a
+    period (last_<n>_days, month_to_date, last_month, year_to_date or custom
+    with start and end), optionally filtered by category, supplier or location
+    """
+    if report_type not in reports.REPORT_TYPES:
+        raise HTTPException(status_code=404, detail=f"Unknown report type '{report_type}'")
+    filters = {"category": category, "supplier_id": supplier_id, "location": location}
+    try:
+        return reports.build_report(db, report_type, period=period, start=start, end=end, filters=filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/reports/{report_type}/render", response_model=schemas.ReportJob, status_code=status.HTTP_202_ACCEPTED)
+def render_report(report_type: str, format: str = Query("csv", pattern="^(csv|pdf)$"), period: str = "last_30_days", start: Optional[datetime] = None, end: Optional[datetime] = None, category: Optional[str] = None, supplier_id: Optional[int] = None, location: Optional[str] = None, current_user: models.User = Depends(get_current_active_user)):
+    """Render a report to CSV or PDF in the background; poll the job and download it when done"""
+    if report_type not in reports.REPORT_TYPES:
+        raise HTTPException(status_code=404, detail=f"Unknown report type '{report_type}'")
+    filters = {"category": category, "supplier_id": supplier_id, "location": location}
+    try:
+        return reports.submit_render(report_type, format, period=period, start=start, end=end, filters=filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/reports/jobs/{job_id}", response_model=schemas.ReportJob)
+def read_report_job(job_id: str, current_user: models.User = Depends(get_current_active_user)):
+    job = reports.get_render_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    return job
+
+@app.get("/reports/jobs/{job_id}/download")
+def download_report(job_id: str, current_user: models.User = Depends(get_current_active_user)):
+    job = reports.get_render_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=job["error"] or f"Report is still {job['status']}")
+    return Response(
+        content=job["content"],
+        media_type=reports.RENDER_FORMATS[job["format"]],
+        headers={"Content-Disposition": f'attachment; filename="{job["filename"]}"'}
+    )
+
 # Authentication endpoints
 @app.post("/token", response_model=schemas.Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user_async(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -321,16 +258,28 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
         )
     return crud.create_user(db=db, user=user)
 
+@app.put("/users/{user_id}", response_model=schemas.User)
+def update_user(user_id: int, user: schemas.UserUpdate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
+    # There are no admin roles; users may only change their own account
+    if current_user.id != user_id:
+        raise HTTPException(status_code=403, detail="Not allowed to update another user")
+    db_user = crud.get_user(db, user_id=user_id)
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    if user.email is not None and user.email != db_user.email and crud.get_user_by_email(db, email=user.email):
+        raise HTTPException(status_code=400, detail="Email already registered")
+    return crud.update_user(db=db, user_id=user_id, user=user, actor_id=current_user.id)
+
 @app.get("/users/", response_model=List[schemas.User])
-def read_users(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
-    users = crud.get_users(db, skip=skip, limit=limit)
-    return users
+def read_users(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, sort_by: str = "id", order: str = Query("asc", pattern="^(asc|desc)$"), db: Session = Depends(get_read_db), current_user: models.User = Depends(get_current_active_user)):
+    page = crud.get_users(db, skip=skip, limit=limit, cursor=cursor, sort_by=sort_by, descending=order == "desc")
+    return paged_response(response, page)
 
 # Inventory endpoints
 @app.get("/inventory/", response_model=List[schemas.Inventory])
-def read_inventory(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
-    inventory = crud.get_inventory(db, skip=skip, limit=limit)
-    return inventory
+def read_inventory(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, sort_by: str = "id", order: str = Query("asc", pattern="^(asc|desc)$"), category: Optional[str] = None, location: Optional[str] = None, db: Session = Depends(get_read_db), current_user: models.User = Depends(get_current_active_user)):
+    page = crud.get_inventory(db, skip=skip, limit=limit, cursor=cursor, sort_by=sort_by, descending=order == "desc", category=category, location=location)
+    return paged_response(response, page)
 
 @app.get("/inventory/{inventory_id}", response_model=schemas.Inventory)
 def read_inventory_item(inventory_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
@@ -339,22 +288,40 @@ def read_inventory_item(inventory_id: int, db: Session = Depends(get_db), curren
         raise HTTPException(status_code=404, detail="Inventory item not found")
     return db_inventory
 
+@app.get("/inventory/{inventory_id}/stock", response_model=schemas.StockLevel)
+def read_stock_at(inventory_id: int, at: datetime, location: Optional[str] = None, db: Session = Depends(get_read_db), current_user: models.User = Depends(get_current_active_user)):
+    """Stock of an item at a point in time, at one location or across all of them"""
+    return inventory_history.get_stock_at(db, inventory_id, at, location=location)
+
+@app.get("/inventory/{inventory_id}/stock-history", response_model=schemas.StockCurve)
+def read_stock_history(inventory_id: int, start: datetime, end: Optional[datetime] = None, location: Optional[str] = None, bucket: Optional[str] = None, db: Session = Depends(get_read_db), current_user: models.User = Depends(get_current_active_user)):
+    """Stock of an item over a time range, per change or per hour/day bucket"""
+    try:
+        return inventory_history.get_stock_curve(db, inventory_id, start, end or datetime.utcnow(), location=location, bucket=bucket)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/inventory/history/checkpoint", response_model=dict)
+def checkpoint_inventory_history(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
+    """Checkpoint current stock now instead of waiting for the next scheduled run"""
+    return {"success": True, "checkpoints": inventory_history.checkpoint(db)}
+
 @app.post("/inventory/", response_model=schemas.Inventory, status_code=status.HTTP_201_CREATED)
 def create_inventory_item(inventory: schemas.InventoryCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
-    return crud.create_inventory_item(db=db, inventory=inventory)
+    return crud.create_inventory_item(db=db, inventory=inventory, user_id=current_user.id)
 
 @app.put("/inventory/{inventory_id}", response_model=schemas.Inventory)
 def update_inventory_item(inventory_id: int, inventory: schemas.InventoryUpdate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
     db_inventory = crud.get_inventory_item(db, inventory_id=inventory_id)
     if db_inventory is None:
         raise HTTPException(status_code=404, detail="Inventory item not found")
-    return crud.update_inventory_item(db=db, inventory_id=inventory_id, inventory=inventory)
+    return crud.update_inventory_item(db=db, inventory_id=inventory_id, inventory=inventory, user_id=current_user.id)
 
 # Supplier endpoints
 @app.get("/suppliers/", response_model=List[schemas.Supplier])
-def read_suppliers(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
-    suppliers = crud.get_suppliers(db, skip=skip, limit=limit)
-    return suppliers
+def read_suppliers(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, sort_by: str = "id", order: str = Query("asc", pattern="^(asc|desc)$"), db: Session = Depends(get_read_db), current_user: models.User = Depends(get_current_active_user)):
+    page = crud.get_suppliers(db, skip=skip, limit=limit, cursor=cursor, sort_by=sort_by, descending=order == "desc")
+    return paged_response(response, page)
 
 @app.get("/suppliers/{supplier_id}", response_model=schemas.Supplier)
 def read_supplier(supplier_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
@@ -365,48 +332,114 @@ def read_supplier(supplier_id: int, db: Session = Depends(get_db), current_user:
 
 @app.post("/suppliers/", response_model=schemas.Supplier, status_code=status.HTTP_201_CREATED)
 def create_supplier(supplier: schemas.SupplierCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
-    return crud.create_supplier(db=db, supplier=supplier)
+    return crud.create_supplier(db=db, supplier=supplier, user_id=current_user.id)
 
 @app.put("/suppliers/{supplier_id}", response_model=schemas.Supplier)
 def update_supplier(supplier_id: int, supplier: schemas.SupplierUpdate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
     db_supplier = crud.get_supplier(db, supplier_id=supplier_id)
     if db_supplier is None:
         raise HTTPException(status_code=404, detail="Supplier not found")
-    return crud.update_supplier(db=db, supplier_id=supplier_id, supplier=supplier)
+    return crud.update_supplier(db=db, supplier_id=supplier_id, supplier=supplier, user_id=current_user.id)
 
 # Order endpoints
-@app.get("/orders/", response_model=List[schemas.Order])
-def read_orders(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
-    orders = crud.get_orders(db, skip=skip, limit=limit)
-    return orders
-
-@app.get("/orders/{order_id}", response_model=schemas.Order)
-def read_order(order_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
-    db_order = crud.get_order(db, order_id=order_id)
+@app.get("/orders/", response_model=Union[List[schemas.Order], List[schemas.OrderSummary]])
+def read_orders(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, sort_by: str = "id", order: str = Query("asc", pattern="^(asc|desc)$"), status: Optional[str] = None, supplier_id: Optional[int] = None, include_items: bool = True, db: Session = Depends(get_read_db), current_user: models.User = Depends(get_current_active_user)):
+    page = crud.get_orders(db, skip=skip, limit=limit, cursor=cursor, sort_by=sort_by, descending=order == "desc", status=status, supplier_id=supplier_id, include_items=include_items)
+    if not include_items:
+        # Summary view: serialize without touching order_items at all
+        page.items = [schemas.OrderSummary.model_validate(db_order, from_attributes=True) for db_order in page.items]
+    return paged_response(response, page)
+
+@app.get("/orders/{order_id}", response_model=Union[schemas.Order, schemas.OrderSummary])
+def read_order(order_id: int, include_items: bool = True, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
+    db_order = crud.get_order(db, order_id=order_id, include_items=include_items)
     if db_order is None:
         raise HTTPException(status_code=404, detail="Order not found")
+    if not include_items:
+        return schemas.OrderSummary.model_validate(db_order, from_attributes=True)
     return db_order
 
 @app.post("/orders/", response_model=schemas.Order, status_code=status.HTTP_201_CREATED)
 def create_order(order: schemas.OrderCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
-    return crud.create_order(db=db, order=order)
+    try:
+        return crud.create_order(db=db, order=order, user_id=current_user.id)
+    except crud.InsufficientStockError as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "shortages": e.shortages})
+
+@app.post("/orders/bulk", response_model=schemas.OrderBulkResult, status_code=status.HTTP_201_CREATED)
+def create_orders_bulk(payload: schemas.OrderBulkCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
+    if not payload.orders:
+        raise HTTPException(status_code=400, detail="orders must not be empty")
+    if len(payload.orders) > crud.ORDERS_BULK_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {crud.ORDERS_BULK_MAX} orders per request")
+    try:
+        order_ids, rejected = crud.create_orders_bulk(db=db, orders=payload.orders, user_id=current_user.id)
+    except crud.InsufficientStockError as e:
+        # Stock changed between the locked read and the update (no row locks on this database)
+        raise HTTPException(status_code=409, detail={"message": str(e), "shortages": e.shortages})
+    created = [
+        schemas.OrderSummary.model_validate(db_order, from_attributes=True)
+        for db_order in crud.get_orders_by_ids(db, order_ids)
+    ]
+    return {"created": created, "rejected": rejected}
 
 @app.put("/orders/{order_id}", response_model=schemas.Order)
 def update_order(order_id: int, order: schemas.OrderUpdate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
     db_order = crud.get_order(db, order_id=order_id)
     if db_order is None:
         raise HTTPException(status_code=404, detail="Order not found")
-    return crud.update_order(db=db, order_id=order_id, order=order)
+    return crud.update_order(db=db, order_id=order_id, order=order, user_id=current_user.id)
+
+# Activity log (audit trail) endpoints
+@app.get("/activity-logs/", response_model=List[schemas.ActivityLog])
+def read_activity_logs(response: Response, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, order: str = Query("desc", pattern="^(asc|desc)$"), entity_type: Optional[str] = None, entity_id: Optional[int] = None, user_id: Optional[int] = None, action: Optional[str] = None, since: Optional[datetime] = None, until: Optional[datetime] = None, db: Session = Depends(get_read_db), current_user: models.User = Depends(get_current_active_user)):
+    """
+    Audit entries by time, e.g. the history of one entity (entity_type and
+    entity_id) or one user's actions between since and until
+    """
+    page = crud.get_activity_logs(db, skip=skip, limit=limit, cursor=cursor, descending=order == "desc", entity_type=entity_type, entity_id=entity_id, user_id=user_id, action=action, since=since, until=until)
+    return paged_response(response, page)
+
+@app.post("/activity-logs/maintenance", response_model=dict)
+def maintain_activity_logs(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
+    """Create upcoming partitions and drop expired ones now instead of waiting for the daily run"""
+    return audit_partitions.maintain(db)
 
 # CSV import/export endpoints (TR3.1)
-@app.post("/import/{entity_type}/", status_code=status.HTTP_201_CREATED)
-def import_csv(entity_type: str, file: bytes, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
-    # Implementation would handle different entity types (inventory, orders, suppliers)
-    # and process the CSV file accordingly
-    return {"message": f"Successfully imported {entity_type} data"}
+@app.post("/import/{entity_type}/", response_model=schemas.ImportResult, status_code=status.HTTP_201_CREATED)
+def import_csv(entity_type: str, file: UploadFile = File(...), db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
+    if entity_type not in csv_import.ENTITY_TYPES:
+        raise HTTPException(status_code=404, detail=f"Unsupported entity type '{entity_type}'")
+    try:
+        # The upload is spooled to disk by the framework and read back as a stream
+        return csv_import.import_csv(db, entity_type, file.file, user_id=current_user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Query parameters of /export that are not column filters
+EXPORT_RESERVED_PARAMS = {"format", "gzip", "columns", "since", "until"}
 
 @app.get("/export/{entity_type}/")
-def export_csv(entity_type: str, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
-    # Implementation would query the database for the requested entity type
-    # and return the data as a CSV file
-    return {"message": f"Successfully exported {entity_type} data"}
\ No newline at end of file
+def export_csv(entity_type: str, request: Request, format: str = Query("csv", pattern="^(csv|parquet)$"), gzip: bool = False, columns: Optional[str] = None, since: Optional[datetime] = None, until: Optional[datetime] = None, current_user: models.User = Depends(get_current_active_user)):
+    if entity_type not in csv_export.EXPORT_SOURCES:
+        raise HTTPException(status_code=404, detail=f"Unsupported entity type '{entity_type}'")
+    # Any other query parameter filters on the column of the same name, e.g. ?status=pending&status=completed
+    filters = {
+        key: request.query_params.getlist(key)
+        for key in request.query_params.keys() if key not in EXPORT_RESERVED_PARAMS
+    }
+    selected_columns = [name.strip() for name in columns.split(",") if name.strip()] if columns else None
+    try:
+        export = csv_export.prepare_export(entity_type, format, gzip, selected_columns, filters, since, until)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        export.chunks,
+        media_type=export.media_type,
+        headers={"Content-Disposition": f'attachment; filename="{export.filename}"'}
+    )
+
+# Serve the CRUD endpoints from the async engine when configured
+if ASYNC_DATABASE_ENABLED:
+    from app import async_routes
+    async_routes.install(app)
@@ -0,0 +1,48 @@
+import os
+import sys
+import tempfile
+
+# Point the app at a throwaway SQLite database before any app module is imported
+_DB_DIR = tempfile.mkdtemp(prefix="supply_chain_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DB_DIR, 'test.db')}"
+os.environ.setdefault("AZURE_OPENAI_API_KEY", "test-key")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from sqlalchemy import event
+
+from app import models  # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def schema():
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def statements():
+    """
+    SQL statements executed on the engine while the test runs, whitespace
+    collapsed; clear() it to count from a later point
+    """
+    executed = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        executed.append(" ".join(statement.split()))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    yield executed
+    event.remove(engine, "before_cursor_execute", capture)
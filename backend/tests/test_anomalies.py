@@ -0,0 +1,34 @@
+import pytest
+
+from app import crud, models, query_cache, schemas
+from app.query_cache import ResultCache
+
+
+@pytest.fixture
+def anomaly_cache():
+    cache = ResultCache(maxsize=10, ttl_seconds=60)
+    query_cache.register_cache(cache)
+    cache.set_for_tables("anomaly-query", [], ["anomalies"])
+    yield cache
+    query_cache.unregister_cache(cache)
+
+
+def _item(db, quantity):
+    return crud.create_inventory_item(db, schemas.InventoryCreate(
+        product_name="Gasket", quantity=quantity, unit_price=2.0, category="Parts", location="Warehouse D"
+    ))
+
+
+def test_detected_anomaly_invalidates_cached_anomaly_reads(db, anomaly_cache):
+    item = _item(db, 500)
+    crud.update_inventory_item(db, item.id, schemas.InventoryUpdate(quantity=0))
+
+    assert db.query(models.Anomaly).filter(models.Anomaly.inventory_id == item.id).count() == 1
+    assert anomaly_cache.get("anomaly-query") is None
+
+
+def test_change_without_anomaly_keeps_cached_anomaly_reads(db, anomaly_cache):
+    item = _item(db, 500)
+    crud.update_inventory_item(db, item.id, schemas.InventoryUpdate(quantity=510))
+
+    assert anomaly_cache.get("anomaly-query") == []
@@ -0,0 +1,129 @@
+import asyncio
+import threading
+
+import pytest
+from pydantic import ValidationError
+from sqlalchemy import exc
+
+from app import audit, crud, models, query_cache, schemas
+from app.query_cache import ResultCache
+
+
+@pytest.fixture
+def audit_cache():
+    cache = ResultCache(maxsize=10, ttl_seconds=60)
+    query_cache.register_cache(cache)
+    cache.set_for_tables("audit-query", [], ["activity_logs"])
+    yield cache
+    query_cache.unregister_cache(cache)
+
+
+def test_entry_in_caller_transaction_invalidates_after_commit(db, audit_cache):
+    audit.record("update", "inventory", 1, "quantity=5", must_persist=True, db=db)
+    assert audit_cache.get("audit-query") == []
+    db.commit()
+    assert audit_cache.get("audit-query") is None
+
+
+def test_rolled_back_entry_is_not_written(db, audit_cache):
+    audit.record("update", "inventory", 1, "rolled back", must_persist=True, db=db)
+    db.rollback()
+    assert db.query(models.ActivityLog).filter(models.ActivityLog.details == "rolled back").count() == 0
+
+
+def test_order_status_change_is_persisted_with_the_order(db, audit_cache):
+    supplier = models.Supplier(name="Audit Co", email="audit@example.com", is_active=True)
+    db.add(supplier)
+    db.commit()
+    order = crud.create_order(db, schemas.OrderCreate(supplier_id=supplier.id, items=[]))
+    audit_cache.set_for_tables("audit-query", [], ["activity_logs"])
+
+    crud.update_order(db, order.id, schemas.OrderUpdate(status="completed"))
+
+    assert audit_cache.get("audit-query") is None
+    entry = db.query(models.ActivityLog).filter(
+        models.ActivityLog.action == crud.ORDER_STATUS_CHANGE_ACTION, models.ActivityLog.entity_id == order.id
+    ).one()
+    assert entry.details == "pending -> completed"
+
+
+@pytest.fixture
+def queued(monkeypatch):
+    # Pretend a background writer is running so record() only queues
+    monkeypatch.setattr(audit, "_writer_task", object())
+
+
+def test_flush_drops_only_the_rejected_entry(db, monkeypatch, queued):
+    write = audit._write
+
+    def reject_bad(rows):
+        if any(row["details"] == "bad" for row in rows):
+            raise exc.DataError("INSERT INTO activity_logs", {}, Exception("value too long"))
+        write(rows)
+
+    monkeypatch.setattr(audit, "_write", reject_bad)
+    for details in ("good 1", "bad", "good 2", "good 3"):
+        audit.record("update", "flush-test", 1, details)
+
+    assert audit.flush() == 3
+    assert audit.pending() == 0
+    stored = db.query(models.ActivityLog.details).filter(models.ActivityLog.entity_type == "flush-test").all()
+    assert sorted(details for details, in stored) == ["good 1", "good 2", "good 3"]
+
+
+def test_flush_retries_connection_failures_a_bounded_number_of_times(monkeypatch, queued):
+    def unreachable(rows):
+        raise exc.OperationalError("INSERT INTO activity_logs", {}, Exception("connection refused"))
+
+    monkeypatch.setattr(audit, "_write", unreachable)
+    monkeypatch.setattr(audit, "AUDIT_MAX_FLUSH_ATTEMPTS", 2)
+    audit.record("update", "flush-test", 1, "retried")
+
+    assert audit.flush() == 0
+    assert audit.pending() == 1
+    assert audit.flush() == 0
+    assert audit.pending() == 0
+
+
+def test_activity_log_create_rejects_values_the_columns_cannot_hold():
+    with pytest.raises(ValidationError):
+        schemas.ActivityLogCreate(action="x" * 101, entity_type="order", entity_id=1)
+    with pytest.raises(ValidationError):
+        schemas.ActivityLogCreate(action="update", entity_type="order", entity_id=2 ** 31)
+
+
+def test_async_crud_writes_audit_entries_off_the_event_loop(monkeypatch):
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+    from app import crud_async
+    from app.database import DATABASE_URL
+
+    write = audit._write
+    writer_threads = []
+
+    def tracked(rows):
+        writer_threads.append(threading.get_ident())
+        write(rows)
+
+    monkeypatch.setattr(audit, "_write", tracked)
+
+    async def create():
+        async_engine = create_async_engine(DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://"))
+        try:
+            async with AsyncSession(async_engine, expire_on_commit=False) as session:
+                supplier = await crud_async.create_supplier(
+                    session, schemas.SupplierCreate(name="Async Co", email="async@example.com")
+                )
+            loop_thread = threading.get_ident()
+            for _ in range(100):
+                if writer_threads:
+                    break
+                await asyncio.sleep(0.01)
+            return supplier, loop_thread
+        finally:
+            await async_engine.dispose()
+
+    supplier, loop_thread = asyncio.run(create())
+
+    assert writer_threads and loop_thread not in writer_threads
+    assert audit.pending() == 0
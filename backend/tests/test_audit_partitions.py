@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from app import audit_partitions, crud, csv_export, models, reports, supplier_metrics
+
+
+def test_archived_status_changes_still_feed_metrics_reports_and_exports(db, monkeypatch):
+    placed = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0) - timedelta(days=400)
+    completed = placed + timedelta(hours=36)
+    supplier = models.Supplier(name="Archived Co", email="archived@example.com", is_active=True)
+    item = models.Inventory(product_name="Rivet", quantity=100, unit_price=0.1, category="Parts", location="Warehouse E")
+    db.add_all([supplier, item])
+    db.flush()
+    order = models.Order(status="completed", total_amount=1.0, supplier_id=supplier.id, order_date=placed)
+    order.order_items = [models.OrderItem(inventory_id=item.id, quantity=10, unit_price=0.1)]
+    db.add(order)
+    db.flush()
+    db.add(models.ActivityLog(action=crud.ORDER_STATUS_CHANGE_ACTION, entity_type="order", entity_id=order.id,
+                              details="pending -> completed", timestamp=completed))
+    db.commit()
+
+    monkeypatch.setattr(audit_partitions, "ACTIVITY_LOG_HOT_MONTHS", 1)
+    result = audit_partitions.maintain(db)
+    archive = audit_partitions.partition_name(completed)
+    assert archive in result["created"]
+    assert db.query(models.ActivityLog).filter(models.ActivityLog.timestamp == completed).count() == 0
+    assert db.execute(text(f"SELECT COUNT(*) FROM {archive}")).scalar() == 1
+
+    supplier_metrics.refresh(db)
+    metrics = db.query(models.SupplierMetrics).filter(
+        models.SupplierMetrics.supplier_id == supplier.id, models.SupplierMetrics.category == supplier_metrics.ALL_CATEGORIES
+    ).one()
+    assert metrics.avg_fulfilment_hours == 36
+
+    report = reports.build_report(db, "order_cycle_time", "custom", start=placed, end=placed + timedelta(days=1),
+                                  filters={"supplier_id": supplier.id})
+    assert report["rows"][0]["average_hours"] == 36
+
+    statement, _ = csv_export.build_statement("activity_logs", filters={"entity_id": [str(order.id)]},
+                                              until=placed + timedelta(days=30))
+    assert [row.details for row in db.execute(statement)] == ["pending -> completed"]
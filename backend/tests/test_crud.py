@@ -0,0 +1,57 @@
+from app import crud, models, schemas
+
+
+def _order_selects(statements):
+    return [statement for statement in statements if statement.startswith("SELECT") and "FROM orders" in statement]
+
+
+def test_bulk_order_audit_does_not_reload_orders(db, statements):
+    supplier = models.Supplier(name="Bulk Co", email="bulk@example.com", is_active=True)
+    item = models.Inventory(product_name="Bolt", quantity=500, unit_price=0.5, category="Parts", location="Warehouse B")
+    db.add_all([supplier, item])
+    db.commit()
+    orders = [
+        schemas.OrderCreate(supplier_id=supplier.id, items=[schemas.OrderItemCreate(inventory_id=item.id, quantity=2, unit_price=0.5)])
+        for _ in range(20)
+    ]
+
+    statements.clear()
+    order_ids, rejected = crud.create_orders_bulk(db, orders)
+    order_selects = _order_selects(statements)
+
+    assert len(order_ids) == 20
+    assert rejected == []
+    assert order_selects == []
+    logged = db.query(models.ActivityLog).filter(
+        models.ActivityLog.entity_type == "order", models.ActivityLog.entity_id.in_(order_ids)
+    ).all()
+    assert sorted(log.entity_id for log in logged) == sorted(order_ids)
+    assert all(log.details == "status=pending, total_amount=1.0" for log in logged)
+
+
+def _order_status_counts(db):
+    return {row.status: row.order_count for row in db.query(models.KpiOrderStatus)}
+
+
+def test_update_order_counts_kpis_from_the_locked_row(db):
+    from app.database import SessionLocal
+
+    supplier = models.Supplier(name="Stale Co", email="stale@example.com", is_active=True)
+    db.add(supplier)
+    db.commit()
+    order = crud.create_order(db, schemas.OrderCreate(supplier_id=supplier.id, items=[]))
+    before = _order_status_counts(db)
+
+    # This session keeps the order as "pending" while another one completes it
+    stale = crud.get_order(db, order.id)
+    other = SessionLocal()
+    try:
+        crud.update_order(other, order.id, schemas.OrderUpdate(status="completed"))
+    finally:
+        other.close()
+    crud.update_order(db, stale.id, schemas.OrderUpdate(status="cancelled"))
+
+    after = _order_status_counts(db)
+    assert after.get("pending", 0) - before.get("pending", 0) == -1
+    assert after.get("completed", 0) - before.get("completed", 0) == 0
+    assert after.get("cancelled", 0) - before.get("cancelled", 0) == 1
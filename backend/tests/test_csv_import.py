@@ -0,0 +1,23 @@
+import io
+
+from app import audit, csv_import, models
+
+
+def test_each_committed_batch_is_audited_with_the_importing_user(db, monkeypatch):
+    recorded = []
+    monkeypatch.setattr(audit, "record", lambda *args, **kwargs: recorded.append((args, kwargs)))
+    monkeypatch.setattr(csv_import, "IMPORT_BATCH_SIZE", 2)
+    existing = models.Supplier(name="Import Co", email="import@example.com", is_active=True)
+    db.add(existing)
+    db.commit()
+    upload = io.BytesIO(
+        f"id,name,email\n{existing.id},Import Co Renamed,import@example.com\n,New One,one@example.com\n,New Two,two@example.com\n".encode()
+    )
+
+    report = csv_import.import_csv(db, "suppliers", upload, user_id=7)
+
+    assert report["imported"] == 3
+    assert recorded == [
+        (("import", "suppliers", None, "inserted=1, upserted=1"), {"user_id": 7}),
+        (("import", "suppliers", None, "inserted=1, upserted=0"), {"user_id": 7}),
+    ]
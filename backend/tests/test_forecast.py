@@ -0,0 +1,49 @@
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from app import forecast, models
+
+
+def test_demand_matrix_scatters_rows_by_sku_and_day():
+    start = date(2024, 1, 1)
+    rows = [
+        (7, "2024-01-01", 2),
+        (7, date(2024, 1, 3), 5),
+        (7, "2024-01-03", 1),
+        (3, "2024-01-02", 4),
+        (99, "2024-01-02", 8),   # no model
+        (3, "2023-12-31", 6),    # before the window
+        (3, "2024-01-05", 6),    # after the window
+    ]
+    matrix = forecast._demand_matrix(forecast._demand_columns(rows), start, 4, {3: 0, 7: 1}, 2)
+    assert matrix.tolist() == [[0, 4, 0, 0], [2, 0, 6, 0]]
+
+
+def test_demand_matrix_of_no_rows_is_zero():
+    matrix = forecast._demand_matrix(forecast._demand_columns([]), date(2024, 1, 1), 3, {1: 0}, 1)
+    assert not matrix.any()
+
+
+def test_reinstated_order_refits_a_sku_without_a_model(db):
+    supplier = models.Supplier(name="Forecast Co", email="forecast@example.com", is_active=True)
+    item = models.Inventory(product_name="Spring", quantity=50, unit_price=0.2, category="Parts", location="Warehouse F")
+    db.add_all([supplier, item])
+    db.flush()
+    order = models.Order(status="cancelled", total_amount=1.0, supplier_id=supplier.id,
+                         order_date=datetime.utcnow() - timedelta(days=3))
+    order.order_items = [models.OrderItem(inventory_id=item.id, quantity=5, unit_price=0.2)]
+    db.add(order)
+    db.commit()
+
+    cache = forecast.ForecastCache()
+    _, _, _, observations = cache.predict(db, [item.id], 7)
+    assert observations.tolist() == [0]
+
+    order.status = "pending"
+    db.commit()
+    cache.invalidate([item.id, None])
+    _, daily, _, observations = cache.predict(db, [item.id], 7)
+
+    assert observations[0] > 0
+    assert np.all(daily >= 0) and daily.sum() > 0
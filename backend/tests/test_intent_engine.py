@@ -0,0 +1,47 @@
+import pytest
+
+from app.intent_engine import INTENT_ROUTER_MIN_CONFIDENCE, match_intent
+
+
+@pytest.mark.parametrize("question, intent", [
+    ("show low stock items", "low_stock"),
+    ("list pending orders", "order_list"),
+    ("list the priciest items", "expensive_inventory"),
+])
+def test_routes_known_questions(question, intent):
+    match = match_intent(question)
+    assert match is not None
+    assert match.intent == intent
+    assert match.confidence >= INTENT_ROUTER_MIN_CONFIDENCE
+
+
+def test_how_many_orders_counts():
+    match = match_intent("how many orders are pending")
+    assert match.intent == "order_count"
+    assert match.sql.startswith("SELECT COUNT(*)")
+    assert "status = 'pending'" in match.sql
+    assert match.confidence >= INTENT_ROUTER_MIN_CONFIDENCE
+
+
+def test_how_many_items_counts():
+    match = match_intent("how many items do we have")
+    assert match.intent == "inventory_count"
+    assert match.sql.startswith("SELECT COUNT(*)")
+    assert "LIMIT" not in match.sql
+    assert match.confidence >= INTENT_ROUTER_MIN_CONFIDENCE
+
+
+def test_item_id_filters_inventory():
+    match = match_intent("show me stock of item 4")
+    assert match.intent == "inventory_list"
+    assert "id = 4" in match.sql
+    assert match.confidence >= INTENT_ROUTER_MIN_CONFIDENCE
+
+
+@pytest.mark.parametrize("question", [
+    "how much did we spend on orders",
+    "show me stock of warehouse 4",
+])
+def test_unexplained_words_fall_below_threshold(question):
+    match = match_intent(question)
+    assert match is None or match.confidence < INTENT_ROUTER_MIN_CONFIDENCE
@@ -0,0 +1,79 @@
+import pytest
+
+from app import crud, models, schemas
+from app.pagination import InvalidCursorError, decode_cursor, encode_cursor
+
+
+@pytest.fixture(scope="module", autouse=True)
+def listing_rows():
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    supplier = models.Supplier(name="Acme", email="acme@example.com", is_active=True)
+    db.add(supplier)
+    db.flush()
+    items = [
+        models.Inventory(product_name=f"Part {i}", quantity=i, unit_price=1.0 + i, category="Parts", location="Warehouse A")
+        for i in range(40)
+    ]
+    db.add_all(items)
+    db.flush()
+    for i in range(40):
+        order = models.Order(status="pending", total_amount=10.0 * i, supplier_id=supplier.id)
+        order.order_items = [
+            models.OrderItem(inventory_id=items[i].id, quantity=1, unit_price=1.0),
+            models.OrderItem(inventory_id=items[(i + 1) % 40].id, quantity=2, unit_price=2.0),
+        ]
+        db.add(order)
+    db.commit()
+    supplier_id = supplier.id
+    db.close()
+    yield supplier_id
+
+
+def _orders_page(db, statements, supplier_id, limit, cursor=None):
+    statements.clear()
+    page = crud.get_orders(db, limit=limit, cursor=cursor, supplier_id=supplier_id)
+    # Serialising touches every relationship the response exposes
+    [schemas.Order.model_validate(order, from_attributes=True) for order in page.items]
+    db.expunge_all()
+    return page, len(statements)
+
+
+def test_order_listing_statement_count_does_not_grow_with_page_size(db, statements, listing_rows):
+    small_page, small = _orders_page(db, statements, listing_rows, 10)
+    large_page, large = _orders_page(db, statements, listing_rows, 30)
+    assert len(small_page.items) == 10
+    assert len(large_page.items) == 30
+    assert all(len(order.order_items) == 2 for order in large_page.items)
+    # The page query plus one IN query for all of its items
+    assert small == large == 2
+
+
+def test_order_listing_statement_count_is_the_same_past_the_first_page(db, statements, listing_rows):
+    first_page, first = _orders_page(db, statements, listing_rows, 10)
+    _, next_count = _orders_page(db, statements, listing_rows, 10, cursor=first_page.next_cursor)
+    assert next_count == first
+
+
+def test_inventory_listing_statement_count_does_not_grow_with_page_size(db, statements):
+    counts = []
+    for limit in (10, 30):
+        statements.clear()
+        page = crud.get_inventory(db, limit=limit)
+        [schemas.Inventory.model_validate(item, from_attributes=True) for item in page.items]
+        db.expunge_all()
+        counts.append(len(statements))
+    assert counts[0] == counts[1]
+
+
+@pytest.mark.parametrize("bad_id", ["1 OR 1=1", 1.5, None, True, [1]])
+def test_decode_cursor_rejects_non_integer_ids(bad_id):
+    cursor = encode_cursor({"s": "id", "d": 0, "v": 1, "id": bad_id})
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor)
+
+
+def test_decode_cursor_round_trips():
+    payload = {"s": "order_date", "d": 1, "v": "2024-01-01T00:00:00", "id": 7}
+    assert decode_cursor(encode_cursor(payload)) == payload
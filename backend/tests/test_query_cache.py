@@ -0,0 +1,56 @@
+import time
+
+from app.query_cache import ResultCache, extract_tables
+
+
+def test_extract_tables_handles_comma_joins_and_subqueries():
+    sql = (
+        "SELECT s.name, o.total_amount FROM suppliers s, orders o "
+        "WHERE o.supplier_id = s.id AND o.id IN (SELECT order_id FROM order_items)"
+    )
+    assert extract_tables(sql) == {"suppliers", "orders", "order_items"}
+
+
+def test_extract_tables_skips_cte_names():
+    sql = "WITH recent AS (SELECT * FROM Orders) SELECT * FROM recent JOIN suppliers ON suppliers.id = recent.supplier_id"
+    assert extract_tables(sql) == {"orders", "suppliers"}
+
+
+def test_extract_tables_of_unparseable_sql_is_empty():
+    assert extract_tables("SELECT FROM WHERE (") == set()
+
+
+def test_invalidation_drops_entries_reading_the_table():
+    cache = ResultCache(maxsize=10, ttl_seconds=60)
+    cache.set_result("SELECT * FROM inventory, orders", [{"id": 1}])
+    cache.set_result("SELECT * FROM suppliers", [{"id": 2}])
+    cache.invalidate_tables(["orders"])
+    assert cache.get("SELECT * FROM inventory, orders") is None
+    assert cache.get("SELECT * FROM suppliers") == [{"id": 2}]
+    assert set(cache._keys_by_table) == {"suppliers"}
+
+
+def test_lru_eviction_prunes_the_table_index():
+    cache = ResultCache(maxsize=2, ttl_seconds=60)
+    for item_id in range(5):
+        cache.set_for_tables(f"item-{item_id}", item_id, [f"table_{item_id}"])
+    assert cache.keys() == ["item-3", "item-4"]
+    assert set(cache._keys_by_table) == {"table_3", "table_4"}
+    assert set(cache._tables_by_key) == {"item-3", "item-4"}
+
+
+def test_expiry_prunes_the_table_index():
+    cache = ResultCache(maxsize=10, ttl_seconds=60)
+    cache.set_for_tables("stale", 1, ["inventory"])
+    cache._entries["stale"] = (time.monotonic() - 1, 1)
+    assert cache.get("stale") is None
+    assert cache._keys_by_table == {}
+    assert cache._tables_by_key == {}
+
+
+def test_resetting_a_key_replaces_its_tables():
+    cache = ResultCache(maxsize=10, ttl_seconds=60)
+    cache.set_for_tables("report", 1, ["orders"])
+    cache.set_for_tables("report", 2, ["inventory"])
+    cache.invalidate_tables(["orders"])
+    assert cache.get("report") == 2
@@ -0,0 +1,30 @@
+from app import models, supplier_metrics
+
+
+def test_recommendations_never_write(db, statements):
+    db.query(models.SupplierMetrics).delete()
+    db.commit()
+    statements.clear()
+
+    result = supplier_metrics.get_recommendations(db)
+
+    assert result["recommendations"] == []
+    assert result["refreshed_at"] is None
+    assert [statement for statement in statements if not statement.startswith("SELECT")] == []
+
+
+def test_recommendations_read_the_refreshed_metrics(db):
+    supplier = models.Supplier(name="Ranked Co", email="ranked@example.com", is_active=True)
+    item = models.Inventory(product_name="Washer", quantity=10, unit_price=1.0, category="Parts", location="Warehouse C")
+    db.add_all([supplier, item])
+    db.flush()
+    order = models.Order(status="pending", total_amount=2.0, supplier_id=supplier.id)
+    order.order_items = [models.OrderItem(inventory_id=item.id, quantity=2, unit_price=1.0)]
+    db.add(order)
+    db.commit()
+
+    supplier_metrics.refresh(db)
+    result = supplier_metrics.get_recommendations(db)
+
+    assert result["refreshed_at"] is not None
+    assert supplier.id in [entry["supplier_id"] for entry in result["recommendations"]]
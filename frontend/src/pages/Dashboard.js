@@ -166,6 +166,14 @@ const orderAPI = {
   },
 };
 
+// Dashboard API
+const dashboardAPI = {
+  getSummary: async () => {
+    const response = await api.get('/dashboard/summary');
+    return response.data;
+  }
+};
+
 // AI Search API
 const aiAPI = {
   search: async (query) => {
@@ -236,16 +244,20 @@ const Dashboard = () => {
   useEffect(() => {
     const fetchDashboardData = async () => {
       try {
-        // Fetch dashboard data from API
-        // This is a placeholder - implement actual data fetching
+        // All KPIs come precomputed from one request
+        const summary = await dashboardAPI.getSummary();
+        const pending = summary.orders.by_status.find((entry) => entry.status === 'pending');
         const data = {
-          inventorySummary: { total: 120, lowStock: 15 },
-          ordersSummary: { total: 45, pending: 12 },
-          suppliersSummary: { total: 28, active: 22 },
-          recentAlerts: [
-            { id: 1, message: 'Low stock alert: Product A', severity: 'warning' },
-            { id: 2, message: 'Order #1234 delayed', severity: 'error' },
-          ]
+          inventorySummary: { total: summary.inventory.item_count, lowStock: summary.inventory.low_stock_count },
+          ordersSummary: { total: summary.orders.order_count, pending: pending ? pending.order_count : 0 },
+          suppliersSummary: { total: summary.suppliers.total, active: summary.suppliers.active },
+          recentAlerts: summary.stock_by_category
+            .filter((entry) => entry.low_stock_count > 0)
+            .map((entry, index) => ({
+              id: index + 1,
+              message: `Low stock alert: ${entry.low_stock_count} item(s) in ${entry.category || 'Uncategorized'}`,
+              severity: 'warning',
+            })),
         };
         
         setDashboardData(data);
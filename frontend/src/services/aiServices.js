@@ -1,5 +1,11 @@
 import axios from 'axios';
-import { inventoryAPI, supplierAPI } from './api';
+import { reportAPI } from './api';
+
+// Report types of the old client-side reports mapped to the backend ones
+const REPORT_TYPE_ALIASES = {
+  inventory: 'inventory_turns',
+  supplier: 'spend_by_supplier',
+};
 
 // Base URL for AI services
 const AI_SERVICE_URL = 'http://localhost:8000/ai';
@@ -40,29 +46,31 @@ export const aiServices = {
    */
   getDemandForecast: async (params) => {
     try {
-      // In a real implementation, this would call the backend AI service
-      // For now, we'll simulate with a mock implementation
-      
-      // Get historical inventory data
-      const inventoryData = await inventoryAPI.getAll();
-      
-      // Mock forecast calculation
-      const forecast = inventoryData.map(item => ({
-        productId: item.id,
-        productName: item.product_name,
-        currentStock: item.quantity,
-        forecastedDemand: Math.round(item.quantity * (0.8 + Math.random() * 0.4)), // Random forecast between 80-120% of current
-        recommendedOrder: Math.max(0, Math.round(item.quantity * 0.2 * (1 + Math.random()))),
-        confidence: Math.round(70 + Math.random() * 25), // Random confidence between 70-95%
-      }));
+      const response = await aiApi.get('/forecast', {
+        params: {
+          inventory_id: params.productId,
+          horizon: params.forecastPeriod || 30,
+          period_type: params.periodType || 'day',
+          lead_time_days: params.leadTimeDays,
+        },
+      });
+      const data = response.data;
       
       return {
-        timestamp: new Date().toISOString(),
-        forecastPeriod: params.forecastPeriod || 30,
-        periodType: params.periodType || 'day',
-        forecasts: params.productId 
-          ? forecast.filter(f => f.productId === params.productId)
-          : forecast
+        timestamp: data.generated_at,
+        forecastPeriod: data.horizon,
+        periodType: data.period_type,
+        forecasts: data.forecasts.map(item => ({
+          productId: item.inventory_id,
+          productName: item.product_name,
+          currentStock: item.current_stock,
+          forecastedDemand: Math.round(item.forecast_demand),
+          forecastRange: [item.forecast_lower, item.forecast_upper],
+          periods: item.periods,
+          reorderPoint: item.reorder_point,
+          reorderNow: item.reorder_now,
+          recommendedOrder: item.recommended_order_quantity,
+        }))
       };
     } catch (error) {
       console.error('Error in demand forecasting:', error);
@@ -74,51 +82,45 @@ export const aiServices = {
    * Supplier Recommendation - Suggests optimal suppliers based on various metrics
    * @param {Object} params - Parameters for recommendation
    * @param {string} params.productCategory - Product category to find suppliers for
-   * @param {Array} params.criteria - Criteria for ranking suppliers (price, quality, delivery)
+   * @param {Object} params.criteria - Weights for ranking suppliers (price, volume, quality, reliability, delivery)
    * @returns {Promise<Array>} Ranked list of recommended suppliers
    */
   getSupplierRecommendations: async (params) => {
     try {
-      // Get all suppliers
-      const suppliers = await supplierAPI.getAll();
-      
-      // Calculate recommendation scores (mock implementation)
-      const recommendations = suppliers.map(supplier => {
-        // Generate mock scores for different criteria
-        const priceScore = Math.round(60 + Math.random() * 40); // 60-100
-        const qualityScore = Math.round(supplier.rating * 20); // Based on rating
-        const deliveryScore = Math.round(50 + Math.random() * 50); // 50-100
-        const reliabilityScore = Math.round(supplier.performance_score); // Use performance score
-        
-        // Calculate weighted score based on criteria
-        const criteria = params.criteria || { price: 0.3, quality: 0.3, delivery: 0.2, reliability: 0.2 };
-        const weightedScore = (
-          (priceScore * (criteria.price || 0.25)) +
-          (qualityScore * (criteria.quality || 0.25)) +
-          (deliveryScore * (criteria.delivery || 0.25)) +
-          (reliabilityScore * (criteria.reliability || 0.25))
-        );
-        
-        return {
-          supplierId: supplier.id,
-          supplierName: supplier.name,
-          contactPerson: supplier.contact_name,
-          email: supplier.email,
-          phone: supplier.phone,
-          scores: {
-            price: priceScore,
-            quality: qualityScore,
-            delivery: deliveryScore,
-            reliability: reliabilityScore,
-            overall: Math.round(weightedScore)
-          },
-          recommendation: weightedScore > 80 ? 'Highly Recommended' : 
-                         weightedScore > 60 ? 'Recommended' : 'Consider Alternatives'
-        };
+      // Weights may be given as { price, volume, quality, reliability, delivery }; omitted ones use
+      // server defaults. Order history has no separate quality signal, so quality counts towards
+      // reliability (cancellation rate).
+      const criteria = params.criteria || {};
+      const reliability = criteria.reliability === undefined && criteria.quality === undefined
+        ? undefined
+        : (criteria.reliability || 0) + (criteria.quality || 0);
+      const response = await aiApi.get('/suppliers/recommendations', {
+        params: {
+          category: params.productCategory && params.productCategory !== 'all' ? params.productCategory : undefined,
+          price_weight: criteria.price,
+          volume_weight: criteria.volume,
+          reliability_weight: reliability,
+          delivery_weight: criteria.delivery,
+        },
       });
       
-      // Sort by overall score
-      return recommendations.sort((a, b) => b.scores.overall - a.scores.overall);
+      return response.data.recommendations.map(supplier => ({
+        supplierId: supplier.supplier_id,
+        supplierName: supplier.name,
+        contactPerson: supplier.contact_name,
+        email: supplier.email,
+        phone: supplier.phone,
+        metrics: supplier.metrics,
+        scores: {
+          price: Math.round(supplier.scores.price ?? 0),
+          volume: Math.round(supplier.scores.volume ?? 0),
+          quality: Math.round(supplier.scores.reliability ?? 0),
+          reliability: Math.round(supplier.scores.reliability ?? 0),
+          delivery: Math.round(supplier.scores.delivery ?? 0),
+          overall: Math.round(supplier.scores.overall)
+        },
+        recommendation: supplier.recommendation
+      }));
     } catch (error) {
       console.error('Error in supplier recommendations:', error);
       throw error;
@@ -131,45 +133,23 @@ export const aiServices = {
    */
   detectAnomalies: async () => {
     try {
-      // Get inventory and orders data
-      const inventory = await inventoryAPI.getAll();
-      
-      // Mock anomaly detection
-      const anomalies = [];
-      
-      // Check for low stock anomalies
-      inventory.forEach(item => {
-        if (item.quantity < 10) {
-          anomalies.push({
-            type: 'low_stock',
-            severity: item.quantity < 5 ? 'high' : 'medium',
-            item: {
-              id: item.id,
-              name: item.product_name,
-              currentStock: item.quantity
-            },
-            message: `Low stock alert: ${item.product_name} has only ${item.quantity} units remaining.`,
-            timestamp: new Date().toISOString()
-          });
-        }
-        
-        // Check for potential pricing anomalies
-        if (item.unit_price > 1000) {
-          anomalies.push({
-            type: 'price_anomaly',
-            severity: 'medium',
-            item: {
-              id: item.id,
-              name: item.product_name,
-              price: item.unit_price
-            },
-            message: `Price anomaly detected: ${item.product_name} has an unusually high price of $${item.unit_price}.`,
-            timestamp: new Date().toISOString()
-          });
-        }
-      });
+      // Anomalies are detected on the server as orders and stock updates are written
+      const response = await aiApi.get('/anomalies', { params: { limit: 100 } });
       
-      return anomalies;
+      return response.data.map(anomaly => ({
+        id: anomaly.id,
+        type: anomaly.anomaly_type,
+        severity: anomaly.severity,
+        item: {
+          id: anomaly.inventory_id,
+          observed: anomaly.observed,
+          expected: anomaly.expected
+        },
+        orderId: anomaly.order_id,
+        supplierId: anomaly.supplier_id,
+        message: anomaly.message,
+        timestamp: anomaly.detected_at
+      }));
     } catch (error) {
       console.error('Error in anomaly detection:', error);
       throw error;
@@ -177,51 +157,28 @@ export const aiServices = {
   },
   
   /**
-   * Automated Report Generation - Generates insights from supply chain data
+   * Automated Report Generation - KPI report computed by the backend
    * @param {Object} params - Report parameters
-   * @param {string} params.reportType - Type of report (inventory, supplier, order)
-   * @param {string} params.period - Time period for the report
+   * @param {string} params.reportType - Type of report (inventory_turns, fill_rate, spend_by_supplier, order_cycle_time; inventory and supplier map to the first and third)
+   * @param {string} params.period - Time period for the report (e.g. last_30_days, month_to_date)
    * @returns {Promise<Object>} Generated report with insights
    */
   generateReport: async (params) => {
     try {
-      // Get relevant data based on report type
-      let data;
-      switch (params.reportType) {
-        case 'inventory':
-          data = await inventoryAPI.getAll();
-          break;
-        case 'supplier':
-          data = await supplierAPI.getAll();
-          break;
-        default:
-          throw new Error('Invalid report type');
-      }
-      
-      // Generate mock insights
-      const insights = [
-        'Inventory levels for Category A products have decreased by 15% over the last month.',
-        'Supplier performance has improved by 7% on average.',
-        'Order fulfillment rate is at 94%, which is 3% higher than the previous period.',
-        'Three products are predicted to go out of stock within the next 7 days.',
-        'Average delivery time has decreased from 5.2 days to 4.8 days.'
-      ];
-      
-      // Select random insights
-      const selectedInsights = [];
-      for (let i = 0; i < 3; i++) {
-        const randomIndex = Math.floor(Math.random() * insights.length);
-        selectedInsights.push(insights[randomIndex]);
-        insights.splice(randomIndex, 1);
-      }
-      
+      const reportType = REPORT_TYPE_ALIASES[params.reportType] || params.reportType;
+      const report = await reportAPI.get(reportType, {
+        period: params.period || 'last_30_days',
+        category: params.category,
+        supplier_id: params.supplierId,
+        location: params.location
+      });
       return {
-        reportType: params.reportType,
-        period: params.period || 'last 30 days',
-        generatedAt: new Date().toISOString(),
-        summary: `This AI-generated report provides an analysis of ${params.reportType} data over the ${params.period || 'last 30 days'}.`,
-        insights: selectedInsights,
-        data: data.slice(0, 5) // Include sample of data
+        reportType: report.report_type,
+        period: report.period,
+        generatedAt: report.generated_at,
+        summary: report.summary,
+        insights: report.insights,
+        data: report.rows
       };
     } catch (error) {
       console.error('Error generating report:', error);
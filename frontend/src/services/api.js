@@ -81,6 +81,11 @@ export const inventoryAPI = {
     const response = await api.get('/inventory/');
     return response.data;
   },
+  // Keyset pagination: pass the previous page's nextCursor to fetch the next one
+  getPage: async (params = {}) => {
+    const response = await api.get('/inventory/', { params });
+    return { items: response.data, nextCursor: response.headers['x-next-cursor'] || null };
+  },
   getById: async (id) => {
     const response = await api.get(`/inventory/${id}`);
     return response.data;
@@ -104,6 +109,11 @@ export const supplierAPI = {
     const response = await api.get('/suppliers/');
     return response.data;
   },
+  // Keyset pagination: pass the previous page's nextCursor to fetch the next one
+  getPage: async (params = {}) => {
+    const response = await api.get('/suppliers/', { params });
+    return { items: response.data, nextCursor: response.headers['x-next-cursor'] || null };
+  },
   getById: async (id) => {
     const response = await api.get(`/suppliers/${id}`);
     return response.data;
@@ -127,6 +137,11 @@ export const orderAPI = {
     const response = await api.get('/orders/');
     return response.data;
   },
+  // Keyset pagination: pass the previous page's nextCursor to fetch the next one
+  getPage: async (params = {}) => {
+    const response = await api.get('/orders/', { params });
+    return { items: response.data, nextCursor: response.headers['x-next-cursor'] || null };
+  },
   getById: async (id) => {
     const response = await api.get(`/orders/${id}`);
     return response.data;
@@ -139,4 +154,24 @@ export const orderAPI = {
     const response = await api.put(`/orders/${id}`, data);
     return response.data;
   },
-};
\ No newline at end of file
+};
+
+export const reportAPI = {
+  get: async (reportType, params = {}) => {
+    const response = await api.get(`/reports/${reportType}`, { params });
+    return response.data;
+  },
+  // Starts a background CSV/PDF render; poll getJob until status is done, then download
+  render: async (reportType, format = 'csv', params = {}) => {
+    const response = await api.post(`/reports/${reportType}/render`, null, { params: { ...params, format } });
+    return response.data;
+  },
+  getJob: async (jobId) => {
+    const response = await api.get(`/reports/jobs/${jobId}`);
+    return response.data;
+  },
+  download: async (jobId) => {
+    const response = await api.get(`/reports/jobs/${jobId}/download`, { responseType: 'blob' });
+    return response.data;
+  },
+};
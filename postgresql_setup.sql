@@ -43,6 +43,7 @@ CREATE TABLE inventory (
 -- Create indexes on inventory
 CREATE INDEX idx_inventory_product_name ON inventory(product_name);
 CREATE INDEX idx_inventory_category ON inventory(category);
+CREATE INDEX idx_inventory_location ON inventory(location);
 
 -- Suppliers table
 CREATE TABLE suppliers (
@@ -67,8 +68,10 @@ CREATE TABLE orders (
     supplier_id INTEGER REFERENCES suppliers(id)
 );
 
--- Create index on order status
+-- Create indexes on orders
 CREATE INDEX idx_orders_status ON orders(status);
+CREATE INDEX idx_orders_order_date ON orders(order_date);
+CREATE INDEX idx_orders_supplier_id ON orders(supplier_id);
 
 -- Order Items table
 CREATE TABLE order_items (
@@ -79,15 +82,115 @@ CREATE TABLE order_items (
     unit_price DECIMAL(10, 2) NOT NULL
 );
 
--- Activity Logs table
+-- Activity Logs table, range-partitioned by month on timestamp. The API
+-- creates upcoming partitions and drops expired ones (app/audit_partitions.py)
 CREATE TABLE activity_logs (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     user_id INTEGER REFERENCES users(id),
     action VARCHAR(100) NOT NULL,
     entity_type VARCHAR(50) NOT NULL,  -- inventory, order, supplier
     entity_id INTEGER NOT NULL,
     details TEXT,
-    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
+
+-- This month and the next two; later months are added by the API
+DO $$
+DECLARE
+    month_start DATE;
+BEGIN
+    FOR i IN 0..2 LOOP
+        month_start := (date_trunc('month', now()) + make_interval(months => i))::DATE;
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF activity_logs FOR VALUES FROM (%L) TO (%L)',
+            'activity_logs_' || to_char(month_start, 'YYYYMM'),
+            month_start,
+            (month_start + INTERVAL '1 month')::DATE
+        );
+    END LOOP;
+END $$;
+
+-- Catches rows outside every monthly partition if maintenance stops running
+CREATE TABLE activity_logs_default PARTITION OF activity_logs DEFAULT;
+
+-- History of one entity, and one user's actions in a time range
+CREATE INDEX ix_activity_logs_entity_history ON activity_logs(entity_type, entity_id, timestamp);
+CREATE INDEX ix_activity_logs_user_time ON activity_logs(user_id, timestamp);
+CREATE INDEX ix_activity_logs_timestamp ON activity_logs(timestamp);
+
+-- Anomalies flagged by the API as orders and stock updates are written
+CREATE TABLE anomalies (
+    id SERIAL PRIMARY KEY,
+    detected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    anomaly_type VARCHAR(50) NOT NULL,  -- order_quantity, unit_price, burn_rate, stockout_risk, sudden_drop
+    severity VARCHAR(20) NOT NULL,  -- medium, high
+    inventory_id INTEGER REFERENCES inventory(id),
+    supplier_id INTEGER REFERENCES suppliers(id),
+    order_id INTEGER REFERENCES orders(id),
+    observed DOUBLE PRECISION,
+    expected DOUBLE PRECISION,
+    score DOUBLE PRECISION,
+    message TEXT
+);
+
+CREATE INDEX idx_anomalies_detected_at ON anomalies(detected_at);
+CREATE INDEX idx_anomalies_anomaly_type ON anomalies(anomaly_type);
+CREATE INDEX idx_anomalies_inventory_id ON anomalies(inventory_id);
+
+-- Append-only stock history: a delta row per stock change plus periodic
+-- checkpoint rows with the absolute quantity (maintained by the API)
+CREATE TABLE inventory_history (
+    id SERIAL PRIMARY KEY,
+    inventory_id INTEGER NOT NULL REFERENCES inventory(id),
+    location VARCHAR NOT NULL DEFAULT '',  -- '' for items without a location
+    recorded_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    is_checkpoint BOOLEAN NOT NULL DEFAULT FALSE,
+    delta INTEGER NOT NULL DEFAULT 0,
+    quantity INTEGER,  -- stock at recorded_at, on checkpoints only
+    reason VARCHAR(20),  -- create, adjustment, move, order, checkpoint
+    order_id INTEGER REFERENCES orders(id)
+);
+
+CREATE INDEX ix_inventory_history_lookup ON inventory_history(inventory_id, location, is_checkpoint, recorded_at);
+
+-- Dashboard KPI tables (derived; maintained by the API, rebuilt with POST /dashboard/rebuild)
+CREATE TABLE kpi_inventory (
+    category VARCHAR NOT NULL,  -- '' for items without a category
+    location VARCHAR NOT NULL,  -- '' for items without a location
+    item_count INTEGER NOT NULL DEFAULT 0,
+    total_quantity INTEGER NOT NULL DEFAULT 0,
+    stock_value DOUBLE PRECISION NOT NULL DEFAULT 0,
+    low_stock_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (category, location)
+);
+
+CREATE TABLE kpi_order_status (
+    status VARCHAR PRIMARY KEY,
+    order_count INTEGER NOT NULL DEFAULT 0,
+    total_value DOUBLE PRECISION NOT NULL DEFAULT 0
+);
+
+CREATE TABLE kpi_supplier_spend (
+    supplier_id INTEGER PRIMARY KEY,
+    order_count INTEGER NOT NULL DEFAULT 0,
+    total_spend DOUBLE PRECISION NOT NULL DEFAULT 0
+);
+
+-- Supplier scoring metrics (derived; recomputed periodically by the API)
+CREATE TABLE supplier_metrics (
+    category VARCHAR NOT NULL,  -- '*' for all categories, '' for items without a category
+    supplier_id INTEGER NOT NULL,
+    order_count INTEGER NOT NULL DEFAULT 0,
+    cancelled_count INTEGER NOT NULL DEFAULT 0,
+    units INTEGER NOT NULL DEFAULT 0,
+    spend DOUBLE PRECISION NOT NULL DEFAULT 0,
+    price_index DOUBLE PRECISION,
+    completed_count INTEGER NOT NULL DEFAULT 0,
+    avg_fulfilment_hours DOUBLE PRECISION,
+    last_order_date TIMESTAMP,
+    refreshed_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (category, supplier_id)
 );
 
 -- Sample data insertion